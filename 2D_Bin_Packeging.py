@@ -32,11 +32,12 @@ Summary of sheet sizes used:
 """
 
 import csv
-from typing import List, Dict
-from collections import Counter
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-from rectpack import newPacker
+from typing import List, Dict, Optional
+from Instrumentation import phase, timed
+from PackingCore import group_parts, pack_groups, expand_placements, plan_statistics
+from IncrementalReoptimizer import reoptimize
+from RemnantInventory import RemnantInventory, pack_with_remnants
+from RuinRecreate import ruin_recreate
 
 # Define file paths
 glass_data_file = 'data/glass_data.csv'
@@ -68,8 +69,12 @@ def expand_parts(glass_parts: List[Dict]) -> List[Dict]:
     return expanded_parts
 
 # Layout Optimization using rectpack
-def calculate_layout_with_rectpack(parts: List[Dict], stock_sizes: List[Dict], gap: int):
-    packer = newPacker(rotation=True)
+@timed('calculate_layout_with_rectpack')
+def calculate_layout_with_rectpack(parts: List[Dict], stock_sizes: List[Dict], gap: int, **packer_options):
+    from rectpack import newPacker
+
+    # packer_options go straight to newPacker (pack_algo, bin_algo, sort_algo, mode)
+    packer = newPacker(rotation=True, **packer_options)
 
     # Add parts to the packer
     for part in parts:
@@ -104,15 +109,20 @@ def group_sheets_by_layout(optimized_layout):
         layout_signature = frozenset((p['part']['length'], p['part']['height'], p['rotated']) 
                                      for p in sheet['placements'])
         
+        # Sheets from the grouped packer already carry their repeat count
+        repeat = sheet.get('repeat', 1)
         if layout_signature in sheet_groups:
-            sheet_groups[layout_signature]['count'] += 1
+            sheet_groups[layout_signature]['count'] += repeat
         else:
-            sheet_groups[layout_signature] = {'sheet': sheet, 'count': 1}
+            sheet_groups[layout_signature] = {'sheet': sheet, 'count': repeat}
     
     return [(group['sheet'], group['count']) for group in sheet_groups.values()]
 
 def plot_sheet_layout(sheet_size, placements, sheet_count):
     """Plot a single sheet layout with dynamic bin size labels."""
+    import matplotlib.patches as patches
+    import matplotlib.pyplot as plt
+
     sheet_width, sheet_height = sheet_size
     fig, ax = plt.subplots(figsize=(12, 8))
     
@@ -159,37 +169,84 @@ def visualize_optimized_layout(optimized_layout):
         plot_sheet_layout(sheet['size'], sheet['placements'], count)
 
 # Main Optimization with Print and Visualization
-def optimize_glass_cutting_with_visuals(glass_data_file: str, stock_sizes_file: str, gap: int):
-    glass_parts = load_glass_data(glass_data_file)
-    stock_sizes = load_stock_sizes(stock_sizes_file)
-
-    # Expand parts based on quantity
-    expanded_parts = expand_parts(glass_parts)
-
-    # Sort parts by area in descending order
-    expanded_parts.sort(key=lambda x: x['length'] * x['height'], reverse=True)
-
-    optimized_layout = calculate_layout_with_rectpack(expanded_parts, stock_sizes, gap)
-
-    # Calculate statistics
-    total_glass_area_m2 = sum(part['length'] * part['height'] for part in expanded_parts) / 1_000_000
-    total_sheet_area_m2 = sum(sheet['size'][0] * sheet['size'][1] for sheet in optimized_layout) / 1_000_000
-    used_area_percentage = (total_glass_area_m2 / total_sheet_area_m2) * 100
-    wastage_percentage = 100 - used_area_percentage
-    sheet_counter = Counter((sheet['size'][0], sheet['size'][1]) for sheet in optimized_layout)
+def optimize_glass_cutting_with_visuals(glass_data_file: str, stock_sizes_file: str, gap: int, grouped: bool = False,
+                                        inventory: Optional[RemnantInventory] = None, improve_time: float = 0.0):
+    """With an `inventory`, the grouped packer fills stored remnants first, and the
+    offcuts of the finished plan are recorded for later jobs. A positive
+    `improve_time` spends that many seconds on ruin and recreate after rectpack."""
+    with phase('load'):
+        glass_parts = load_glass_data(glass_data_file)
+        stock_sizes = load_stock_sizes(stock_sizes_file)
+
+    if grouped:
+        # Pack quantity groups as tiled blocks and only expand for plotting
+        if inventory is not None:
+            packed_sheets = pack_with_remnants(group_parts(glass_parts), stock_sizes, inventory, gap,
+                                               job=glass_data_file)
+            print(f"Remnants reused: {sum('remnant' in sheet for sheet in packed_sheets)}")
+        else:
+            packed_sheets = pack_groups(group_parts(glass_parts), stock_sizes, gap)
+        with phase('stats'):
+            stats = plan_statistics(packed_sheets)
+        with phase('expand'):
+            optimized_layout = list(expand_placements(packed_sheets, gap))
+    else:
+        with phase('expand'):
+            # Expand parts based on quantity
+            expanded_parts = expand_parts(glass_parts)
+
+        with phase('sort'):
+            # Sort parts by area in descending order
+            expanded_parts.sort(key=lambda x: x['length'] * x['height'], reverse=True)
+
+        optimized_layout = calculate_layout_with_rectpack(expanded_parts, stock_sizes, gap)
+        if improve_time > 0:
+            result = ruin_recreate(optimized_layout, stock_sizes, gap, time_limit=improve_time)
+            print(f"Ruin and recreate: {result.sheets_before} -> {result.sheets_after} sheets "
+                  f"in {result.iterations} moves")
+            optimized_layout = result.sheets
+        with phase('stats'):
+            glass_area_mm2 = sum(part['length'] * part['height'] * part['qty'] for part in glass_parts)
+            stats = plan_statistics(optimized_layout, glass_area_mm2)
+        if inventory is not None:
+            inventory.record_plan(optimized_layout, gap, source=glass_data_file)
+
+    print_statistics(stats)
 
-    # Display results
-    print(f"Total stock area: {total_sheet_area_m2:.3f} sq m")
-    print(f"Total glass area: {total_glass_area_m2:.3f} sq m")
-    print(f"Total sheets used: {len(optimized_layout)}")
-    print(f"Used area percentage: {used_area_percentage:.2f}%")
-    print(f"Wastage percentage: {wastage_percentage:.2f}%")
+    # Visualize the layout
+    with phase('render'):
+        visualize_optimized_layout(optimized_layout)
+    return optimized_layout
+
+# Re-plan after an order change, keeping every sheet the change does not touch
+def reoptimize_glass_cutting_with_visuals(previous_layout: List[Dict], delta: List[Dict], stock_sizes_file: str,
+                                          gap: int, frozen=(), neighbours: int = 1):
+    """`delta` rows are {'location', 'length', 'height', 'qty'} with a signed qty (see order_delta);
+    `frozen` lists indices of sheets in `previous_layout` that are already cut."""
+    stock_sizes = load_stock_sizes(stock_sizes_file)
+    result = reoptimize(previous_layout, delta, stock_sizes, gap, frozen=frozen, neighbours=neighbours)
+    stats = plan_statistics(result.sheets)
+
+    print(f"Kept {result.kept} sheets, repacked {result.ripped} into {result.repacked} "
+          f"in {result.elapsed * 1000:.1f} ms")
+    for row in result.surplus:
+        print(f"  Already cut, no longer needed: {row['location']} x {row['qty']}")
+    print_statistics(stats)
+
+    with phase('render'):
+        visualize_optimized_layout(result.sheets)
+    return result.sheets
+
+def print_statistics(stats: Dict):
+    print(f"Total stock area: {stats['total_sheet_area_m2']:.3f} sq m")
+    print(f"Total glass area: {stats['total_glass_area_m2']:.3f} sq m")
+    print(f"Total sheets used: {stats['total_sheets']}")
+    print(f"Used area percentage: {stats['used_area_percentage']:.2f}%")
+    print(f"Wastage percentage: {stats['wastage_percentage']:.2f}%")
     print("\nSummary of sheet sizes used:")
-    for (length, width), qty in sheet_counter.items():
+    for (length, width), qty in stats['sheet_counter'].items():
         print(f"  {length}mm x {width}mm: {qty} pcs")
 
-    # Visualize the layout
-    visualize_optimized_layout(optimized_layout)
-
 # Run the function
-optimize_glass_cutting_with_visuals(glass_data_file, stock_sizes_file, gap)
+if __name__ == "__main__":
+    optimize_glass_cutting_with_visuals(glass_data_file, stock_sizes_file, gap)
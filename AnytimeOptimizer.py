@@ -0,0 +1,248 @@
+"""Time-budgeted packing that has a plan early and keeps improving it.
+
+optimize() starts from the grouped block packer, which takes a few
+milliseconds on a typical order and a few hundred on a thousand mixed
+pieces, and then spends the rest of the budget on improvements:
+
+1. the fast constructive packers (skyline, guillotine), keeping the best plan;
+2. one exact re-pack of the worst-filled sheets (ExactPacker.improve_tail);
+3. local search until the deadline. It takes a few of the worst-filled
+   sheets, shuffles their pieces a little around area order and re-packs
+   them with a randomly chosen engine. A move is kept when it uses less
+   stock area, or the same area with the pieces concentrated on fewer,
+   fuller sheets, which sets up the next saving.
+
+Every plan with less stock area than the last one goes to `on_improvement`.
+The callback returns False to stop early ("good enough"). Nothing runs past
+the deadline except the step already in progress. The constructive packers
+and the exact tail re-pack are given the deadline and give up when it
+passes; a constructive packer checks it between stock sheet trials, so it
+overshoots by at most one trial. Every other step is a few milliseconds. The
+grouped block packer always runs to completion, so the run never ends before
+it does, however small the budget.
+"""
+import argparse
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from GuillotineEngine import FIT_RULES, GuillotineSheet, pack_guillotine
+from Instrumentation import tally, timed
+from PackingCore import expand_placements, group_parts, pack_groups, plan_piece_count, plan_statistics, \
+    sheet_piece_area
+from SkylineEngine import SKYLINE_RULES, SkylineSheet, pack_skyline
+
+
+@dataclass
+class PackingJob:
+    glass_parts: List[Dict]
+    stock_sizes: List[Dict]
+    gap: int = 0
+
+
+@dataclass
+class Improvement:
+    sheets: List[Dict]
+    stats: Dict
+    elapsed: float  # seconds since optimize() started
+    source: str     # packer or move that produced the plan
+
+
+@dataclass
+class AnytimeResult:
+    sheets: List[Dict]
+    stats: Dict
+    elapsed: float
+    stopped: str    # 'budget' or 'callback'
+    history: List[Tuple[float, str, float]] = field(default_factory=list)  # (elapsed, source, waste %)
+    moves: int = 0
+
+
+def _stock_area(sheets: List[Dict]) -> int:
+    return sum(sheet['size'][0] * sheet['size'][1] * sheet.get('repeat', 1) for sheet in sheets)
+
+
+def _physical_sheets(sheets: List[Dict], gap: int) -> List[Dict]:
+    """One per-piece sheet dict per physical sheet, so sheets can be replaced one at a time."""
+    plan = []
+    for sheet in sheets:
+        if 'blocks' in sheet:
+            sheet = next(expand_placements([sheet], gap))
+        single = {'size': tuple(sheet['size']), 'placements': list(sheet['placements']), 'repeat': 1}
+        plan.extend(dict(single) for _ in range(sheet.get('repeat', 1)))
+    return plan
+
+
+def _utilization(sheet: Dict) -> float:
+    return sheet_piece_area(sheet) / (sheet['size'][0] * sheet['size'][1])
+
+
+def pack_in_order(parts: List[Dict], stock_sizes: List[Dict], gap: int,
+                  new_sheet: Callable[[int, int], object]) -> Optional[List[Dict]]:
+    """Pack pieces in the given order, choosing the fullest stock size for each new sheet.
+
+    `new_sheet(length, width)` builds an engine sheet with insert(part),
+    used_area and to_sheet(), such as SkylineSheet or GuillotineSheet.
+    Returns None when the stock runs out.
+    """
+    stock_left = [stock.get('qty', math.inf) for stock in stock_sizes]
+    sheets = []
+    while parts:
+        best = None
+        for s, stock in enumerate(stock_sizes):
+            if stock_left[s] <= 0:
+                continue
+            sheet = new_sheet(stock['length'], stock['width'])
+            placed = [i for i, part in enumerate(parts) if sheet.insert(part) is not None]
+            utilization = sheet.used_area / (stock['length'] * stock['width'])
+            if placed and (best is None or utilization > best[0]):
+                best = (utilization, s, sheet, placed)
+        if best is None:
+            return None
+        _, s, sheet, placed = best
+        stock_left[s] -= 1
+        placed_set = set(placed)
+        parts = [part for i, part in enumerate(parts) if i not in placed_set]
+        sheets.append(sheet.to_sheet())
+    return sheets
+
+
+def _engines(gap: int) -> List[Tuple[str, Callable[[int, int], object]]]:
+    engines = [(f'skyline_{rule}', lambda l, w, rule=rule: SkylineSheet(l, w, gap, rule)) for rule in SKYLINE_RULES]
+    engines += [(f'guillotine_{rule}', lambda l, w, rule=rule: GuillotineSheet(l, w, gap, rule))
+                for rule in FIT_RULES if rule != 'worst_area']
+    return engines
+
+
+def _constructive(job: PackingJob, deadline: float) -> List[Tuple[str, Callable[[], List[Dict]]]]:
+    parts, stock, gap = job.glass_parts, job.stock_sizes, job.gap
+    runs = [(f'skyline_{rule}_{sort}',
+             lambda rule=rule, sort=sort: pack_skyline(parts, stock, gap, rule, True, sort, deadline=deadline))
+            for sort in ('area', 'height') for rule in SKYLINE_RULES]
+    runs.append(('guillotine_best_short_side', lambda: pack_guillotine(parts, stock, gap, deadline=deadline)))
+    return runs
+
+
+def _repack_worst(plan: List[Dict], job: PackingJob, rng: random.Random,
+                  max_sheets: int) -> Optional[Tuple[List[Dict], str]]:
+    """One local search move; returns the changed plan if it is not worse, else None."""
+    order = sorted(range(len(plan)), key=lambda i: _utilization(plan[i]))
+    k = rng.randint(2, max(2, min(max_sheets, len(plan))))
+    taken = rng.sample(order[:min(len(plan), 2 * k)], min(k, len(plan)))
+    taken_set = set(taken)
+    kept = [sheet for i, sheet in enumerate(plan) if i not in taken_set]
+    pool = [placement['part'] for i in taken for placement in plan[i]['placements']]
+    pool.sort(key=lambda p: p['length'] * p['height'] * rng.uniform(0.7, 1.3), reverse=True)
+
+    used: Dict[Tuple[int, int], int] = {}
+    for sheet in kept:
+        used[sheet['size']] = used.get(sheet['size'], 0) + 1
+    stock_left = [dict(s, qty=s.get('qty', math.inf) - used.get((s['length'], s['width']), 0))
+                  for s in job.stock_sizes]
+    name, new_sheet = rng.choice(_engines(job.gap))
+    new = pack_in_order(pool, stock_left, job.gap, new_sheet)
+    if new is None:
+        return None
+    before = [plan[i] for i in taken]
+    old_key = (_stock_area(before), -sum(_utilization(s) ** 2 for s in before))
+    new_key = (_stock_area(new), -sum(_utilization(s) ** 2 for s in new))
+    if new_key > old_key:
+        return None
+    return kept + [dict(sheet, repeat=1) for sheet in new], f'repack_{len(taken)}_{name}'
+
+
+@timed('anytime_optimize')
+def optimize(job: PackingJob, time_budget: float = 5.0,
+             on_improvement: Optional[Callable[[Improvement], Optional[bool]]] = None,
+             seed: int = 0, max_sheets: int = 6, tail_time: float = 1.0) -> AnytimeResult:
+    """Best plan found within `time_budget` seconds, streaming each improvement to `on_improvement`.
+
+    The first plan is the grouped block packer's, so a feasible answer is
+    reported as soon as that packer finishes, even past a shorter budget.
+    `on_improvement` returning False stops the search. Raises ValueError if
+    the stock cannot hold the order.
+    """
+    start = time.perf_counter()
+    deadline = start + time_budget
+    demand = sum(p['qty'] for p in job.glass_parts)
+    rng = random.Random(seed)
+    best: Dict = {'sheets': None, 'area': math.inf}
+    history: List[Tuple[float, str, float]] = []
+    stopped = 'budget'
+
+    def offer(sheets: Optional[List[Dict]], source: str) -> bool:
+        """Record a plan if it beats the best one; False when the callback asks to stop."""
+        if not sheets or plan_piece_count(sheets) != demand or _stock_area(sheets) >= best['area']:
+            return True
+        best['sheets'], best['area'] = sheets, _stock_area(sheets)
+        stats = plan_statistics(sheets)
+        elapsed = time.perf_counter() - start
+        history.append((elapsed, source, stats['wastage_percentage']))
+        tally('anytime_improvements')
+        if on_improvement is not None and on_improvement(Improvement(sheets, stats, elapsed, source)) is False:
+            return False
+        return True
+
+    # A feasible plan first; pack_groups raises if the stock cannot hold the order
+    if not offer(pack_groups(group_parts(job.glass_parts), job.stock_sizes, job.gap), 'grouped_blocks'):
+        stopped = 'callback'
+    for name, run in _constructive(job, deadline):
+        if stopped == 'callback' or time.perf_counter() >= deadline:
+            break
+        try:
+            sheets = run()
+        except TimeoutError:
+            break
+        except ValueError:
+            continue
+        if not offer(sheets, name):
+            stopped = 'callback'
+
+    plan = _physical_sheets(best['sheets'], job.gap)
+    if stopped != 'callback' and time.perf_counter() < deadline and tail_time > 0:
+        from ExactPacker import improve_tail
+        tail = improve_tail(plan, job.stock_sizes, job.gap,
+                            time_limit=min(tail_time, deadline - time.perf_counter()))
+        plan = _physical_sheets(tail.sheets, job.gap)
+        if not offer(plan, 'exact_tail'):
+            stopped = 'callback'
+
+    moves = 0
+    while stopped != 'callback' and time.perf_counter() < deadline and len(plan) > 1:
+        moves += 1
+        move = _repack_worst(plan, job, rng, max_sheets)
+        if move is None:
+            continue
+        plan, source = move
+        if not offer(plan, source):
+            stopped = 'callback'
+    tally('anytime_moves', moves)
+    return AnytimeResult(best['sheets'], plan_statistics(best['sheets']), time.perf_counter() - start, stopped,
+                         history, moves)
+
+
+def main():
+    from Benchmark import glass_instance, repo_instance
+
+    parser = argparse.ArgumentParser(description="Anytime packing: plan quality against elapsed time.")
+    parser.add_argument('--budget', type=float, default=5.0)
+    parser.add_argument('--seeds', type=int, default=2)
+    parser.add_argument('--target-waste', type=float, help="Stop once waste is at or below this percentage")
+    args = parser.parse_args()
+
+    for instance in [repo_instance()] + [glass_instance(seed) for seed in range(args.seeds)]:
+        def report(improvement: Improvement) -> bool:
+            print(f"  {improvement.elapsed * 1000:8.1f} ms  {improvement.stats['total_sheets']:>4} sheets "
+                  f"{improvement.stats['wastage_percentage']:6.2f}% waste  ({improvement.source})")
+            return args.target_waste is None or improvement.stats['wastage_percentage'] > args.target_waste
+
+        print(f"{instance.name} ({args.budget:g}s budget)")
+        result = optimize(PackingJob(instance.glass_parts, instance.stock_sizes, instance.gap), args.budget,
+                          report)
+        print(f"  stopped by {result.stopped} after {result.elapsed:.2f}s and {result.moves} moves")
+
+
+if __name__ == "__main__":
+    main()
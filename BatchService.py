@@ -0,0 +1,559 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Seconds a job may overrun its time budget before its worker is killed
+TIMEOUT_GRACE = 5.0
+FINISHED = ('done', 'failed', 'timeout', 'cancelled')
+
+
+@dataclass
+class JobSpec:
+    job_id: str
+    parts_file: str
+    stock_file: str
+    gap: int = 0
+    algorithm: str = 'grouped_blocks'
+    time_budget: float = 60.0
+    render: bool = False
+
+    @classmethod
+    def from_dict(cls, data: Dict, default_id: str = '') -> 'JobSpec':
+        unknown = set(data) - set(cls.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {sorted(unknown)}")
+        for name in ('parts_file', 'stock_file'):
+            if not data.get(name):
+                raise ValueError(f"Job is missing {name!r}")
+        data = dict(data)
+        data.setdefault('job_id', default_id or os.path.splitext(os.path.basename(data['parts_file']))[0])
+        spec = cls(**data)
+        if spec.algorithm not in algorithm_names():
+            raise ValueError(f"Unknown algorithm {spec.algorithm!r}; expected one of {algorithm_names()}")
+        return spec
+
+
+@dataclass
+class JobStatus:
+    spec: JobSpec
+    state: str = 'queued'
+    progress: str = ''
+    submitted: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    result: Optional[Dict] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+# --- Job execution (runs inside the worker processes) ---
+
+def algorithm_names() -> List[str]:
+    from PortfolioRunner import default_strategies
+    return sorted(['anytime', 'cutting_stock', 'portfolio'] + [name for name, _, _ in default_strategies()])
+
+
+def load_job_inputs(spec: JobSpec) -> Tuple[List[Dict], List[Dict]]:
+    from pack import load_job
+    return load_job(spec.parts_file, spec.stock_file)
+
+
+def pack_spec(spec: JobSpec, glass_parts: List[Dict], stock_sizes: List[Dict],
+          progress: Callable[[str], None] = lambda message: None, max_workers: Optional[int] = None):
+    """(PlacementTable, stats, complete, algorithm actually used) for one job.
+
+    max_workers caps the portfolio's process pool (default: every core).
+    """
+    from PackingCore import group_parts, plan_piece_count
+    from PlacementStore import PlacementTable
+    from PortfolioRunner import default_strategies, run_portfolio, run_strategy
+
+    demand = sum(p['qty'] for p in glass_parts)
+    if spec.algorithm == 'cutting_stock':
+        from CuttingStockSolver import solve_cutting_stock
+        plan = solve_cutting_stock(group_parts(glass_parts), stock_sizes, spec.gap, time_limit=spec.time_budget)
+        return (PlacementTable.from_sheets(plan.sheets, spec.gap), plan.stats,
+                plan_piece_count(plan.sheets) == demand, spec.algorithm)
+    if spec.algorithm == 'anytime':
+        from AnytimeOptimizer import PackingJob, optimize
+        result = optimize(PackingJob(glass_parts, stock_sizes, spec.gap), time_budget=spec.time_budget,
+                          on_improvement=lambda improvement: progress(
+                              f"{improvement.stats['total_sheets']} sheets, "
+                              f"{improvement.stats['wastage_percentage']:.2f}% waste ({improvement.source})"))
+        return (PlacementTable.from_sheets(result.sheets, spec.gap), result.stats,
+                plan_piece_count(result.sheets) == demand, spec.algorithm)
+    if spec.algorithm == 'portfolio':
+        portfolio = run_portfolio(glass_parts, stock_sizes, spec.gap, time_budget=spec.time_budget,
+                                  max_workers=max_workers)
+        if portfolio.best is None:
+            raise RuntimeError("No portfolio strategy produced a complete plan")
+        best = portfolio.best
+    else:
+        name, kind, options = next(s for s in default_strategies() if s[0] == spec.algorithm)
+        best = run_strategy(name, kind, options, glass_parts, stock_sizes, spec.gap)
+        if best.error:
+            raise RuntimeError(best.error)
+    return best.placements, best.stats, best.complete, best.name
+
+
+def run_job(spec: JobSpec, output_dir: str, progress: Callable[[str], None] = lambda message: None,
+            max_workers: Optional[int] = None) -> Dict:
+    """Load, pack and write one job; returns the summary stored in the job status.
+
+    Writes plan.json (per-piece sheets plus statistics) and, with spec.render,
+    report.pdf into output_dir/<job_id>.
+    """
+    start = time.perf_counter()
+    progress('loading')
+    glass_parts, stock_sizes = load_job_inputs(spec)
+    progress(f'packing {sum(p["qty"] for p in glass_parts)} pieces with {spec.algorithm}')
+    table, stats, complete, used = pack_spec(spec, glass_parts, stock_sizes, progress, max_workers)
+    if not complete:
+        raise RuntimeError(f"{used} left pieces unplaced")
+
+    progress('writing')
+    job_dir = os.path.join(output_dir, spec.job_id)
+    os.makedirs(job_dir, exist_ok=True)
+    summary = {
+        'algorithm': used,
+        'total_sheets': stats['total_sheets'],
+        'used_area_percentage': stats['used_area_percentage'],
+        'wastage_percentage': stats['wastage_percentage'],
+        'sheet_counter': {f"{l}x{w}": qty for (l, w), qty in stats['sheet_counter'].items()},
+        'files': [os.path.join(job_dir, 'plan.json')],
+    }
+    with open(summary['files'][0], 'w') as f:
+        json.dump({'job': asdict(spec), 'summary': summary, 'sheets': table.to_sheets()}, f)
+    if spec.render:
+        from LayoutRenderer import render_pdf
+        summary['files'].append(render_pdf(table, os.path.join(job_dir, 'report.pdf'), workers=1, summary=[
+            f"Job {spec.job_id}", f"Algorithm: {used}", f"Sheets: {stats['total_sheets']}",
+            f"Wastage: {stats['wastage_percentage']:.2f}%"]))
+    summary['elapsed'] = time.perf_counter() - start
+    return summary
+
+
+def _worker_main(index: int, inbox, outbox, output_dir: str, pool_size: int):
+    """Long-lived worker: import the packers once, then run jobs until told to stop.
+
+    The worker leads its own process group, so killing it also takes down
+    the portfolio processes it started.
+    """
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+    import PortfolioRunner  # noqa: F401  (warm the import cache before the first job)
+    while True:
+        spec = inbox.get()
+        if spec is None:
+            return
+        outbox.put((index, spec.job_id, 'running', None))
+        try:
+            result = run_job(spec, output_dir, lambda message: outbox.put((index, spec.job_id, 'progress', message)),
+                             pool_size)
+            outbox.put((index, spec.job_id, 'done', result))
+        except Exception as e:
+            outbox.put((index, spec.job_id, 'failed', f"{type(e).__name__}: {e}\n{traceback.format_exc(limit=3)}"))
+
+
+# --- Scheduling (parent process) ---
+
+def _terminate(process):
+    """Terminate a worker together with its process group."""
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except (AttributeError, ProcessLookupError, PermissionError):
+        # No process groups on this platform, or the worker has not made its own yet
+        process.terminate()
+
+
+class _Worker:
+    def __init__(self, index: int, context, outbox, output_dir: str, pool_size: int):
+        self.index = index
+        self.inbox = context.Queue()
+        self.process = context.Process(target=_worker_main, args=(index, self.inbox, outbox, output_dir, pool_size),
+                                       name=f"batch-worker-{index}")
+        self.process.start()
+        self.job_id: Optional[str] = None
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class BatchScheduler:
+    """Runs job specs on a pool of persistent worker processes.
+
+    Workers import the packers once and take one job at a time, so per-job cost
+    is the packing itself. A job that overruns time_budget + TIMEOUT_GRACE has
+    its worker terminated and replaced. The cores are shared out between the
+    workers, so a portfolio job runs on pool_size processes. Status changes
+    and progress messages are pushed to every queue returned by subscribe().
+    """
+
+    def __init__(self, output_dir: str, workers: Optional[int] = None):
+        self.output_dir = output_dir
+        self.n_workers = workers or os.cpu_count() or 1
+        self.pool_size = max(1, (os.cpu_count() or 1) // self.n_workers)
+        self.jobs: Dict[str, JobStatus] = {}
+        self._pending: List[str] = []
+        self._workers: List[_Worker] = []
+        self._subscribers: List[asyncio.Queue] = []
+        self._context = multiprocessing.get_context('spawn')
+        self._outbox = self._context.Queue()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reader: Optional[threading.Thread] = None
+        self._changed: Optional[asyncio.Condition] = None
+
+    async def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Condition()
+        self._workers = [_Worker(i, self._context, self._outbox, self.output_dir, self.pool_size)
+                         for i in range(self.n_workers)]
+        self._reader = threading.Thread(target=self._read_outbox, name="batch-outbox", daemon=True)
+        self._reader.start()
+
+    async def close(self):
+        for worker in self._workers:
+            if worker.job_id is not None:
+                _terminate(worker.process)
+            else:
+                worker.inbox.put(None)
+        for worker in self._workers:
+            await self._loop.run_in_executor(None, worker.process.join, TIMEOUT_GRACE)
+            if worker.process.is_alive():
+                _terminate(worker.process)
+                await self._loop.run_in_executor(None, worker.process.join)
+        self._outbox.put(None)
+
+    def _read_outbox(self):
+        while True:
+            message = self._outbox.get()
+            if message is None:
+                return
+            self._loop.call_soon_threadsafe(self._on_message, *message)
+
+    def subscribe(self) -> asyncio.Queue:
+        events: asyncio.Queue = asyncio.Queue()
+        self._subscribers.append(events)
+        return events
+
+    def unsubscribe(self, events: asyncio.Queue):
+        if events in self._subscribers:
+            self._subscribers.remove(events)
+
+    def _publish(self, status: JobStatus, message: str = ''):
+        event = {'job_id': status.spec.job_id, 'state': status.state, 'progress': message or status.progress,
+                 'time': time.time()}
+        if status.state in FINISHED:
+            event['result'], event['error'] = status.result, status.error
+        for events in self._subscribers:
+            events.put_nowait(event)
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    def submit(self, spec: JobSpec) -> JobStatus:
+        if spec.job_id in self.jobs and self.jobs[spec.job_id].state not in FINISHED:
+            raise ValueError(f"Job {spec.job_id!r} is already {self.jobs[spec.job_id].state}")
+        status = self.jobs[spec.job_id] = JobStatus(spec)
+        self._pending.append(spec.job_id)
+        self._publish(status)
+        self._dispatch()
+        return status
+
+    def cancel(self, job_id: str) -> JobStatus:
+        status = self.jobs[job_id]
+        if status.state == 'queued':
+            self._pending.remove(job_id)
+            self._finish(status, 'cancelled')
+        elif status.state == 'running':
+            self._kill(job_id, 'cancelled')
+        return status
+
+    def _dispatch(self):
+        for worker in self._workers:
+            if not self._pending:
+                return
+            if worker.job_id is None:
+                status = self.jobs[self._pending.pop(0)]
+                worker.job_id = status.spec.job_id
+                status.state, status.started = 'running', time.time()
+                worker.inbox.put(status.spec)
+                worker.timer = self._loop.call_later(status.spec.time_budget + TIMEOUT_GRACE,
+                                                     self._kill, status.spec.job_id, 'timeout')
+                self._publish(status, 'dispatched')
+
+    def _worker_for(self, job_id: str) -> Optional[_Worker]:
+        return next((w for w in self._workers if w.job_id == job_id), None)
+
+    def _kill(self, job_id: str, state: str):
+        """Terminate the worker running job_id (and its process group) and replace it with a fresh one."""
+        worker = self._worker_for(job_id)
+        if worker is None:
+            return
+        _terminate(worker.process)
+        if worker.timer:
+            worker.timer.cancel()
+        self._workers[worker.index] = _Worker(worker.index, self._context, self._outbox, self.output_dir,
+                                              self.pool_size)
+        self._finish(self.jobs[job_id], state, error=f"killed after {time.time() - self.jobs[job_id].started:.1f}s"
+                     if state == 'timeout' else None)
+        self._dispatch()
+
+    def _finish(self, status: JobStatus, state: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        status.state, status.finished, status.result, status.error = state, time.time(), result, error
+        self._publish(status)
+        self._loop.create_task(self._notify())
+
+    def _on_message(self, index: int, job_id: str, kind: str, payload):
+        worker = self._workers[index]
+        status = self.jobs.get(job_id)
+        # Messages from a worker that was killed for this job arrive late; ignore them
+        if status is None or worker.job_id != job_id or status.state != 'running':
+            return
+        if kind == 'progress':
+            status.progress = payload
+            self._publish(status)
+            return
+        if kind == 'running':
+            return
+        worker.job_id = None
+        if worker.timer:
+            worker.timer.cancel()
+        self._finish(status, 'done' if kind == 'done' else 'failed',
+                     result=payload if kind == 'done' else None, error=payload if kind == 'failed' else None)
+        self._dispatch()
+
+    async def wait(self, job_ids: Optional[List[str]] = None) -> List[JobStatus]:
+        """Block until the given jobs (default: all submitted) have finished."""
+        job_ids = list(self.jobs) if job_ids is None else job_ids
+        async with self._changed:
+            await self._changed.wait_for(lambda: all(self.jobs[j].state in FINISHED for j in job_ids))
+        return [self.jobs[j] for j in job_ids]
+
+
+# --- Job files ---
+
+def load_job_file(path: str) -> List[JobSpec]:
+    """Job specs from a JSON list or a JSON-lines file; relative paths are taken from the file's directory."""
+    with open(path) as f:
+        text = f.read()
+    stripped = text.lstrip()
+    rows = json.loads(text) if stripped.startswith('[') else [json.loads(line) for line in text.splitlines()
+                                                              if line.strip()]
+    base = os.path.dirname(os.path.abspath(path))
+    specs = []
+    for i, row in enumerate(rows, 1):
+        row = dict(row)
+        for name in ('parts_file', 'stock_file'):
+            if row.get(name) and not os.path.isabs(row[name]):
+                row[name] = os.path.join(base, row[name])
+        specs.append(JobSpec.from_dict(row, default_id=f"job-{i}"))
+    duplicates = {s.job_id for s in specs if sum(t.job_id == s.job_id for t in specs) > 1}
+    if duplicates:
+        raise ValueError(f"Duplicate job ids: {sorted(duplicates)}")
+    return specs
+
+
+# --- HTTP service ---
+
+class _HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+_REASONS = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            409: 'Conflict'}
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Tuple[str, str, bytes]:
+    request_line = (await reader.readline()).decode('latin-1').strip()
+    if not request_line:
+        raise ConnectionError("empty request")
+    method, target, _ = request_line.split(' ', 2)
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode('latin-1')
+        if line in ('\r\n', '\n', ''):
+            break
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return method.upper(), target.split('?', 1)[0], body
+
+
+def _response(status: int, payload, content_type: str = 'application/json') -> bytes:
+    body = json.dumps(payload, default=str).encode() if content_type == 'application/json' else payload
+    return (f"HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n").encode() + body
+
+
+async def _stream_events(scheduler: BatchScheduler, writer: asyncio.StreamWriter):
+    """Server-sent events: one `data:` line per status change until the client goes away."""
+    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                 b"Connection: close\r\n\r\n")
+    events = scheduler.subscribe()
+    try:
+        for status in scheduler.jobs.values():
+            writer.write(f"data: {json.dumps({'job_id': status.spec.job_id, 'state': status.state})}\n\n".encode())
+        await writer.drain()
+        while True:
+            event = await events.get()
+            writer.write(f"data: {json.dumps(event, default=str)}\n\n".encode())
+            await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        scheduler.unsubscribe(events)
+
+
+async def _route(scheduler: BatchScheduler, method: str, path: str, body: bytes):
+    parts = [p for p in path.split('/') if p]
+    if parts == ['jobs'] and method == 'GET':
+        return 200, [status.to_dict() for status in scheduler.jobs.values()]
+    if parts == ['jobs'] and method == 'POST':
+        try:
+            data = json.loads(body or b'null')
+            rows = data if isinstance(data, list) else [data]
+            specs = [JobSpec.from_dict(row, default_id=f"job-{len(scheduler.jobs) + i}")
+                     for i, row in enumerate(rows, 1)]
+        except (ValueError, TypeError) as e:
+            raise _HttpError(400, str(e))
+        try:
+            return 202, [scheduler.submit(spec).to_dict() for spec in specs]
+        except ValueError as e:
+            raise _HttpError(409, str(e))
+    if len(parts) == 2 and parts[0] == 'jobs':
+        if parts[1] not in scheduler.jobs:
+            raise _HttpError(404, f"No job {parts[1]!r}")
+        if method == 'GET':
+            return 200, scheduler.jobs[parts[1]].to_dict()
+        if method == 'DELETE':
+            return 200, scheduler.cancel(parts[1]).to_dict()
+        raise _HttpError(405, f"{method} not allowed on {path}")
+    if parts == ['algorithms'] and method == 'GET':
+        return 200, algorithm_names()
+    raise _HttpError(404, f"No route for {method} {path}")
+
+
+async def serve(scheduler: BatchScheduler, host: str = '127.0.0.1', port: int = 8765) -> asyncio.AbstractServer:
+    """Local HTTP front end: POST/GET /jobs, GET/DELETE /jobs/<id>, GET /events, GET /algorithms."""
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            method, path, body = await _read_request(reader)
+            if method == 'GET' and path == '/events':
+                await _stream_events(scheduler, writer)
+                return
+            try:
+                status, payload = await _route(scheduler, method, path, body)
+            except _HttpError as e:
+                status, payload = e.status, {'error': str(e)}
+            writer.write(_response(status, payload))
+            await writer.drain()
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+# --- CLI ---
+
+def _print_event(event: Dict):
+    line = f"[{time.strftime('%H:%M:%S')}] {event['job_id']:<20} {event['state']:<9} {event['progress']}"
+    if event['state'] == 'done':
+        result = event['result']
+        line += f" -> {result['total_sheets']} sheets, {result['wastage_percentage']:.2f}% waste in {result['elapsed']:.2f}s"
+    elif event['state'] in ('failed', 'timeout'):
+        line += f" -> {(event['error'] or '').splitlines()[0][:160]}"
+    print(line, flush=True)
+
+
+async def run_batch(specs: List[JobSpec], output_dir: str, workers: Optional[int] = None,
+                    on_event: Callable[[Dict], None] = _print_event) -> List[JobStatus]:
+    """Solve every spec on a worker pool, reporting progress, and write summary.json."""
+    scheduler = BatchScheduler(output_dir, workers)
+    await scheduler.start()
+    events = scheduler.subscribe()
+
+    async def report():
+        while True:
+            on_event(await events.get())
+
+    reporter = asyncio.create_task(report())
+    try:
+        for spec in specs:
+            scheduler.submit(spec)
+        statuses = await scheduler.wait()
+        await asyncio.sleep(0)
+    finally:
+        reporter.cancel()
+        await scheduler.close()
+    while not events.empty():
+        on_event(events.get_nowait())
+    with open(os.path.join(output_dir, 'summary.json'), 'w') as f:
+        json.dump([status.to_dict() for status in statuses], f, indent=2, default=str)
+    return statuses
+
+
+async def _serve_forever(output_dir: str, workers: Optional[int], host: str, port: int):
+    scheduler = BatchScheduler(output_dir, workers)
+    await scheduler.start()
+    server = await serve(scheduler, host, port)
+    print(f"Batch service on http://{host}:{port} with {scheduler.n_workers} workers, writing to {output_dir}",
+          flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await scheduler.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve many cut-list jobs concurrently.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help="Solve every job in a JSON / JSON-lines job file")
+    run.add_argument('jobs', help="Job file: list of {job_id, parts_file, stock_file, gap, algorithm, time_budget, render}")
+    serve_cmd = commands.add_parser('serve', help="Accept jobs over HTTP")
+    serve_cmd.add_argument('--host', default='127.0.0.1')
+    serve_cmd.add_argument('--port', type=int, default=8765)
+    commands.add_parser('algorithms', help="List the algorithm names a job may use")
+    for command in (run, serve_cmd):
+        command.add_argument('--output', default='output/batch', help="Directory for per-job results")
+        command.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    if args.command == 'algorithms':
+        print("\n".join(algorithm_names()))
+    elif args.command == 'run':
+        try:
+            specs = load_job_file(args.jobs)
+        except (OSError, ValueError) as e:
+            parser.error(f"{args.jobs}: {e}")
+        start = time.perf_counter()
+        statuses = asyncio.run(run_batch(specs, args.output, args.workers))
+        done = sum(status.state == 'done' for status in statuses)
+        print(f"{done}/{len(statuses)} jobs solved in {time.perf_counter() - start:.2f}s; "
+              f"summary in {os.path.join(args.output, 'summary.json')}")
+        sys.exit(0 if done == len(statuses) else 1)
+    else:
+        try:
+            asyncio.run(_serve_forever(args.output, args.workers, args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+import argparse
+import importlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from GuillotineEngine import is_guillotine, pack_guillotine
+from PackingCore import group_parts, pack_groups
+from PlacementStore import PlacementTable
+
+# Stock sizes (mm) used to build random stock mixes
+GLASS_STOCK = [(3300, 2100), (3300, 2438), (2438, 2100), (3210, 2250), (3660, 2440)]
+PLYWOOD_STOCK = [(2440, 1220), (2500, 1250), (3050, 1525)]
+
+# Berkey & Wang (1987) classes: (item side range, bin side)
+BERKEY_WANG = {
+    'I': ((1, 10), 10),
+    'II': ((1, 10), 30),
+    'III': ((1, 35), 40),
+    'IV': ((1, 35), 100),
+    'V': ((1, 100), 100),
+    'VI': ((1, 100), 300),
+}
+
+
+@dataclass
+class Instance:
+    name: str
+    glass_parts: List[Dict]
+    stock_sizes: List[Dict]
+    gap: int = 0
+
+    @property
+    def demand(self) -> int:
+        return sum(p['qty'] for p in self.glass_parts)
+
+
+@dataclass
+class BenchmarkRecord:
+    instance: str
+    packer: str
+    time_s: float = 0.0
+    peak_mb: Optional[float] = None
+    sheets: Optional[int] = None
+    waste_pct: Optional[float] = None
+    pieces: int = 0
+    complete: bool = False
+    valid: bool = False
+    guillotine: Optional[bool] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class BenchmarkReport:
+    records: List[BenchmarkRecord] = field(default_factory=list)
+    environment: Dict = field(default_factory=dict)
+
+    def to_json(self) -> Dict:
+        return {'environment': self.environment, 'records': [asdict(r) for r in self.records]}
+
+    @classmethod
+    def from_json(cls, data: Dict) -> 'BenchmarkReport':
+        return cls([BenchmarkRecord(**r) for r in data['records']], data.get('environment', {}))
+
+
+def glass_instance(seed: int, n_types: int = 30, n_stock: int = 2, max_qty: int = 12, gap: int = 0) -> Instance:
+    """Curtain-wall style order: large panels, skewed quantities, a random stock mix."""
+    rng = random.Random(seed)
+    stock = rng.sample(GLASS_STOCK, n_stock)
+    max_length, max_height = max(s[0] for s in stock), min(s[1] for s in stock)
+    parts = []
+    for i in range(n_types):
+        length = rng.randint(30, max_length // 10) * 10
+        height = rng.randint(30, max_height // 10) * 10
+        qty = min(max_qty, int(rng.paretovariate(1.2)))
+        parts.append({'location': f"G{seed}-{i}", 'length': length, 'height': height, 'qty': qty})
+    demand = sum(p['qty'] for p in parts)
+    stock_sizes = [{'length': l, 'width': w, 'qty': demand} for l, w in stock]
+    return Instance(f"glass-s{seed}-n{n_types}", parts, stock_sizes, gap)
+
+
+def plywood_instance(seed: int, n_types: int = 40, gap: int = 3) -> Instance:
+    """Cabinet-style cut list: many small panels with a saw kerf."""
+    rng = random.Random(seed)
+    l, w = rng.choice(PLYWOOD_STOCK)
+    parts = [{'location': f"P{seed}-{i}", 'length': rng.randint(100, 1200), 'height': rng.randint(60, 600),
+              'qty': rng.randint(1, 8)} for i in range(n_types)]
+    demand = sum(p['qty'] for p in parts)
+    return Instance(f"plywood-s{seed}-n{n_types}", parts, [{'length': l, 'width': w, 'qty': demand}], gap)
+
+
+def berkey_wang_instance(cls: str, n: int, seed: int) -> Instance:
+    """Berkey-Wang 2BP class I-VI: n items with uniform sides, square bins."""
+    (lo, hi), side = BERKEY_WANG[cls]
+    rng = random.Random(f"{cls}-{n}-{seed}")
+    items = [{'location': f"{cls}-{i}", 'length': rng.randint(lo, hi), 'height': rng.randint(lo, hi), 'qty': 1}
+             for i in range(n)]
+    # Identical items become one quantity row
+    parts = [{'location': g.location, 'length': g.length, 'height': g.height, 'qty': g.qty} for g in group_parts(items)]
+    return Instance(f"bw{cls}-n{n}-s{seed}", parts, [{'length': side, 'width': side, 'qty': n}], 0)
+
+
+def repo_instance() -> Instance:
+    from CutListIngest import read_table
+    parts = [{'location': r.label, 'length': int(r.length), 'height': int(r.height), 'qty': r.qty}
+             for r in read_table('data/glass_data.csv')]
+    stock = [{'length': int(r.length), 'width': int(r.height), 'qty': r.qty}
+             for r in read_table('data/glass_sheet_size.csv')]
+    return Instance('repo-glass_data', parts, stock, 0)
+
+
+def suite(name: str) -> List[Instance]:
+    if name == 'quick':
+        return ([repo_instance(), glass_instance(0), plywood_instance(0)]
+                + [berkey_wang_instance(cls, 20, 0) for cls in BERKEY_WANG])
+    if name == 'full':
+        return ([repo_instance()]
+                + [glass_instance(seed, n) for seed in range(3) for n in (20, 60)]
+                + [plywood_instance(seed, n) for seed in range(3) for n in (40, 120)]
+                + [berkey_wang_instance(cls, n, seed) for cls in BERKEY_WANG
+                   for n in (20, 40, 60, 80, 100) for seed in range(2)])
+    raise ValueError(f"Unknown suite {name!r}; expected 'quick' or 'full'")
+
+
+def _expand(instance: Instance) -> List[Dict]:
+    parts = [{'location': p['location'], 'length': p['length'], 'height': p['height']}
+             for p in instance.glass_parts for _ in range(p['qty'])]
+    parts.sort(key=lambda p: p['length'] * p['height'], reverse=True)
+    return parts
+
+
+def _run_grouped(instance: Instance) -> PlacementTable:
+    return PlacementTable.from_sheets(pack_groups(group_parts(instance.glass_parts), instance.stock_sizes,
+                                                  instance.gap), instance.gap)
+
+
+def _run_calculate_layout(instance: Instance, rule: Optional[str] = None) -> PlacementTable:
+    from Glass_Cut_list_optimizer import calculate_layout
+    return PlacementTable.from_sheets(calculate_layout(_expand(instance), instance.stock_sizes, instance.gap, rule=rule))
+
+
+def _run_guillotine(instance: Instance) -> PlacementTable:
+    return PlacementTable.from_sheets(pack_guillotine(instance.glass_parts, instance.stock_sizes, instance.gap))
+
+
+def _run_rectpack(instance: Instance) -> PlacementTable:
+    bin_packing = importlib.import_module('2D_Bin_Packeging')
+    return PlacementTable.from_sheets(bin_packing.calculate_layout_with_rectpack(_expand(instance), instance.stock_sizes,
+                                                                                 instance.gap))
+
+
+def _run_shelf(instance: Instance) -> PlacementTable:
+    from GlassCuttingIO import GlassCuttingOptimizer, Panel, Stock
+    panels = [Panel(p['length'], p['height'], p['qty'], p['location'], p['length'] * p['height'] / 1_000_000)
+              for p in instance.glass_parts]
+    stocks = [Stock(s['length'], s['width'], s['qty']) for s in instance.stock_sizes]
+    return GlassCuttingOptimizer(stocks, cut_width=instance.gap).optimize(panels).placement_table()
+
+
+def _run_bin_packer(instance: Instance) -> PlacementTable:
+    handler = importlib.import_module('bin-packing-handler')
+    parts = [handler.Part(p['location'], p['length'], p['height'], p['qty']) for p in instance.glass_parts]
+    stocks = [handler.StockSize(f"{s['length']}x{s['width']}", s['length'], s['width'], s['qty'])
+              for s in instance.stock_sizes]
+    sizes = {s.name: (s.width, s.height) for s in stocks}
+    table = PlacementTable()
+    # Sheet numbers restart for every stock size, so a physical sheet is (stock, number)
+    sheet_of: Dict[Tuple[str, int], int] = {}
+    for result in handler.BinPacker(parts, stocks).pack():
+        key = (result.stock_name, result.sheet_number)
+        if key not in sheet_of:
+            sheet_of[key] = table.add_sheet(*sizes[result.stock_name])
+        location = result.part_id.rsplit('_', 1)[0]
+        table.append(sheet_of[key], table.intern_part(location, result.width, result.height),
+                     result.x, result.y, result.width, result.height, False)
+    return table
+
+
+def _run_genetic(instance: Instance) -> PlacementTable:
+    from Genetic_Algorithm import Part, genetic_heuristic_optimization, sheets_to_table
+    parts = [Part(p['location'], p['length'], p['height'], p['qty']) for p in instance.glass_parts]
+    stock = [(s['length'], s['width']) for s in instance.stock_sizes]
+    return sheets_to_table(genetic_heuristic_optimization(parts, stock, population_size=12, generations=10,
+                                                          workers=1, seed=0, verbose=False))
+
+
+def _run_cutting_stock(instance: Instance) -> PlacementTable:
+    from CuttingStockSolver import solve_cutting_stock
+    plan = solve_cutting_stock(group_parts(instance.glass_parts), instance.stock_sizes, instance.gap, time_limit=10.0)
+    return PlacementTable.from_sheets(plan.sheets, instance.gap)
+
+
+PACKERS: Dict[str, Callable[[Instance], PlacementTable]] = {
+    'grouped_blocks': _run_grouped,
+    'calculate_layout': _run_calculate_layout,
+    'calculate_layout_bottom_left': lambda instance: _run_calculate_layout(instance, 'bottom_left'),
+    'guillotine': _run_guillotine,
+    'rectpack': _run_rectpack,
+    'glass_cutting_optimizer': _run_shelf,
+    'bin_packer': _run_bin_packer,
+    'genetic': _run_genetic,
+    'cutting_stock': _run_cutting_stock,
+}
+
+
+def validate(table: PlacementTable) -> bool:
+    """Every piece lies on its sheet and no two pieces on a sheet overlap."""
+    return table.is_valid()
+
+
+def _sheet_rects(table: PlacementTable, sheet: int, gap: int):
+    """Piece footprints on one sheet, widened by the kerf each cut removes."""
+    return [(p.x, p.y, p.width + gap, p.height + gap) for p in table.sheet_placements(sheet)]
+
+
+def measure(instance: Instance, packer: str, memory: bool = True) -> BenchmarkRecord:
+    """Run one packer on one instance: wall time, then peak traced memory in a second run."""
+    record = BenchmarkRecord(instance.name, packer)
+    run = PACKERS[packer]
+    try:
+        start = time.perf_counter()
+        table = run(instance)
+        record.time_s = time.perf_counter() - start
+        if memory:
+            tracemalloc.start()
+            try:
+                run(instance)
+                record.peak_mb = tracemalloc.get_traced_memory()[1] / 1_000_000
+            finally:
+                tracemalloc.stop()
+    except Exception as e:
+        record.error = f"{type(e).__name__}: {e}"
+        return record
+
+    cols = table.to_numpy()
+    repeat = cols['sheet_repeat']
+    counts = np.bincount(cols['sheet_id'], minlength=table.sheet_count)
+    sheet_area = float((cols['sheet_length'] * cols['sheet_width'] * repeat).sum())
+    piece_area = float((table.piece_area_by_sheet() * repeat).sum())
+    record.sheets = int(repeat.sum())
+    record.pieces = int((counts * repeat).sum())
+    record.waste_pct = 100 - piece_area / sheet_area * 100 if sheet_area else None
+    record.complete = record.pieces == instance.demand
+    record.valid = validate(table)
+    record.guillotine = all(is_guillotine(_sheet_rects(table, s, instance.gap)) for s in range(table.sheet_count))
+    return record
+
+
+def run_benchmarks(instances: List[Instance], packers: Optional[List[str]] = None, memory: bool = True,
+                   verbose: bool = False) -> BenchmarkReport:
+    report = BenchmarkReport(environment={'python': platform.python_version(), 'machine': platform.machine(),
+                                          'numpy': np.__version__})
+    for instance in instances:
+        for packer in packers or list(PACKERS):
+            record = measure(instance, packer, memory)
+            report.records.append(record)
+            if verbose:
+                print(_format(record), flush=True)
+    return report
+
+
+def compare(baseline: BenchmarkReport, current: BenchmarkReport, time_tolerance: float = 0.25,
+            time_floor: float = 0.05, waste_tolerance: float = 0.5) -> List[str]:
+    """Regressions of `current` against `baseline`, matched by (instance, packer).
+
+    Times are flagged when slower by more than `time_tolerance` (relative) and
+    `time_floor` seconds; waste when worse by more than `waste_tolerance`
+    percentage points. More sheets, lost completeness or validity, and new
+    errors are always regressions.
+    """
+    reference = {(r.instance, r.packer): r for r in baseline.records}
+    regressions = []
+    for r in current.records:
+        old = reference.get((r.instance, r.packer))
+        if old is None or old.error:
+            continue
+        key = f"{r.instance} / {r.packer}"
+        if r.error:
+            regressions.append(f"{key}: now fails ({r.error})")
+            continue
+        if old.complete and not r.complete:
+            regressions.append(f"{key}: no longer places every piece")
+        if old.valid and not r.valid:
+            regressions.append(f"{key}: layout no longer valid")
+        if r.sheets > old.sheets:
+            regressions.append(f"{key}: sheets {old.sheets} -> {r.sheets}")
+        if r.waste_pct is not None and old.waste_pct is not None and r.waste_pct > old.waste_pct + waste_tolerance:
+            regressions.append(f"{key}: waste {old.waste_pct:.2f}% -> {r.waste_pct:.2f}%")
+        if r.time_s > old.time_s * (1 + time_tolerance) and r.time_s - old.time_s > time_floor:
+            regressions.append(f"{key}: time {old.time_s:.3f}s -> {r.time_s:.3f}s")
+    return regressions
+
+
+def _wall_time(command: List[str], env: Optional[Dict] = None) -> float:
+    start = time.perf_counter()
+    subprocess.run(command, check=True, env=env, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def startup_check(parts_file: str = 'data/glass_data.csv', stock_file: str = 'data/glass_sheet_size.csv',
+                  runs: int = 7, budget: float = 0.1) -> Dict:
+    """Time the `pack` CLI on a small job against a startup budget.
+
+    The overhead is the median wall time of `pack.py` minus the median start
+    of a bare interpreter, so it covers imports, loading, packing and output.
+    A run under -X importtime lists the modules loaded; none of pack.HEAVY_MODULES
+    may be among them.
+    """
+    from pack import HEAVY_MODULES
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    command = [sys.executable, os.path.join(here, 'pack.py'), parts_file, stock_file, '--quiet']
+    # Warm the bytecode cache first; an installed copy always has one
+    warm_env = {k: v for k, v in os.environ.items() if k != 'PYTHONDONTWRITEBYTECODE'}
+    _wall_time(command, warm_env)
+
+    bare = statistics.median(_wall_time([sys.executable, '-c', 'pass']) for _ in range(runs))
+    total = statistics.median(_wall_time(command) for _ in range(runs))
+    trace = subprocess.run([sys.executable, '-X', 'importtime'] + command[1:], check=True,
+                           capture_output=True, text=True).stderr
+    loaded = {line.rsplit('|', 1)[1].strip().split('.')[0] for line in trace.splitlines() if line.count('|') == 2}
+    heavy = sorted(loaded & set(HEAVY_MODULES))
+    overhead = total - bare
+    return {'interpreter_s': bare, 'pack_s': total, 'overhead_s': overhead, 'budget_s': budget,
+            'heavy_imports': heavy, 'ok': overhead <= budget and not heavy}
+
+
+def _format(r: BenchmarkRecord) -> str:
+    if r.error:
+        return f"{r.instance:<22} {r.packer:<30} ERROR {r.error}"
+    peak = f"{r.peak_mb:8.1f}" if r.peak_mb is not None else f"{'-':>8}"
+    flags = ('' if r.complete else ' incomplete') + ('' if r.valid else ' invalid') + (' guillotine' if r.guillotine else '')
+    return f"{r.instance:<22} {r.packer:<30} {r.time_s:8.3f} {peak} {r.sheets:6d} {r.waste_pct:7.2f}{flags}"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark every packer on generated and repo instances.")
+    parser.add_argument('--suite', default='quick', choices=['quick', 'full'])
+    parser.add_argument('--packers', help="comma-separated subset of: " + ', '.join(PACKERS))
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc run")
+    parser.add_argument('--output', help="write results as JSON")
+    parser.add_argument('--baseline', help="compare against a stored JSON run; exit 1 on regressions")
+    parser.add_argument('--time-tolerance', type=float, default=0.25, help="allowed relative slowdown")
+    parser.add_argument('--time-floor', type=float, default=0.05,
+                        help="slowdowns under this many seconds are never flagged")
+    parser.add_argument('--waste-tolerance', type=float, default=0.5, help="allowed waste increase (points)")
+    parser.add_argument('--startup', action='store_true',
+                        help="only check the pack CLI startup budget on the repo order; exit 1 if exceeded")
+    parser.add_argument('--startup-budget', type=float, default=0.1, help="allowed pack CLI overhead in seconds")
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        result = startup_check(budget=args.startup_budget)
+        print(f"Interpreter start {result['interpreter_s'] * 1000:.1f} ms, pack CLI {result['pack_s'] * 1000:.1f} ms, "
+              f"overhead {result['overhead_s'] * 1000:.1f} ms (budget {result['budget_s'] * 1000:.0f} ms)")
+        if result['heavy_imports']:
+            print(f"Heavy modules imported on the default path: {', '.join(result['heavy_imports'])}")
+        return 0 if result['ok'] else 1
+
+    packers = args.packers.split(',') if args.packers else None
+    unknown = set(packers or []) - set(PACKERS)
+    if unknown:
+        parser.error(f"unknown packers: {sorted(unknown)}")
+
+    print(f"{'Instance':<22} {'Packer':<30} {'Time (s)':>8} {'Peak MB':>8} {'Sheets':>6} {'Waste %':>7}")
+    report = run_benchmarks(suite(args.suite), packers, memory=not args.no_memory, verbose=True)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report.to_json(), file, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = BenchmarkReport.from_json(json.load(file))
+        regressions = compare(baseline, report, time_tolerance=args.time_tolerance, time_floor=args.time_floor,
+                              waste_tolerance=args.waste_tolerance)
+        print(f"\n{len(regressions)} regression(s) against {args.baseline}")
+        for line in regressions:
+            print(f"  {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
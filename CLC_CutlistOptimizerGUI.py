@@ -1,11 +1,15 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, scrolledtext, ttk
-from svgwrite import Drawing
-import openpyxl
+from CutListIngest import IngestError, read_table
+from Instrumentation import timed
+from LayoutRenderer import render_svg
+from MaterialPartition import pack_partitions, partition_parts
 import math
+import multiprocessing
 import os
+import queue
 import subprocess
-from PIL import Image, ImageTk
+import threading
 from ttkthemes import ThemedTk
 import shutil
 import sys
@@ -40,7 +44,7 @@ class CutlistOptimizerGUI:
         self.setup_widgets()  
         self.window.grid_columnconfigure(1, weight=1)
         self.window.resizable(True, False)
-        self.window.geometry('700x395')
+        self.window.geometry('700x425')
         self.window.mainloop()
     
     def setup_variables(self):
@@ -50,6 +54,9 @@ class CutlistOptimizerGUI:
         self.stock_length = tk.StringVar(value='2440')
         self.gap = tk.StringVar(value='12.7')
         self.project_id = tk.StringVar(value='Project1')
+        self.status = tk.StringVar()
+        # Filled by the packing thread, drained on the Tk main loop by poll_progress
+        self.progress_queue = queue.Queue()
         self.row_num = 0
         last_output_folder = self.load_last_output_folder_path()
         if last_output_folder:
@@ -107,9 +114,14 @@ class CutlistOptimizerGUI:
 
         # Create & Export Cut List and Open Output Directory Buttons
         self.row_num += 1
-        ttk.Button(self.window, text="Create & Export Cut List", command=self.create_export_cutlist).grid(row=self.row_num, column=0, columnspan=2, pady=10, sticky="ew")
+        self.export_button = ttk.Button(self.window, text="Create & Export Cut List", command=self.create_export_cutlist)
+        self.export_button.grid(row=self.row_num, column=0, columnspan=2, pady=10, sticky="ew")
         ttk.Button(self.window, text="Open Output Directory", command=self.open_output_directory).grid(row=self.row_num, column=2, pady=10, sticky="ew")
 
+        # Packing progress
+        self.row_num += 1
+        ttk.Label(self.window, textvariable=self.status).grid(row=self.row_num, column=0, columnspan=3, padx=10, sticky="w")
+
         # Configure the weight of the bottom row to prevent vertical expansion
         self.window.grid_rowconfigure(self.row_num, weight=0)
         last_output_folder = self.load_last_output_folder_path()
@@ -117,6 +129,8 @@ class CutlistOptimizerGUI:
             self.output_folder_path.set(last_output_folder)  # Update the StringVar with the loaded path
 
     def insert_image(self):
+        from PIL import Image, ImageTk
+
         # Load the icon image
         resources_path= os.path.join(os.path.dirname(__file__), 'resources')
         icon_path = os.path.join(resources_path, 'clc.png')
@@ -158,25 +172,56 @@ class CutlistOptimizerGUI:
                 stock_length = float(self.stock_length.get())
                 gap = float(self.gap.get())
                 cut_list = []  # Initialize the cut list
-                wb = openpyxl.load_workbook(self.input_file_path)
-                sheet = wb.active
-                for row in sheet.iter_rows(min_row=2, values_only=True):
-                    part_label, length, height, count, material = row
-                    count = int(count)  # Convert count to integer
-                    for _ in range(count):
-                        cut_list.append({'Part Label': part_label, 'Length': math.ceil(float(length)), 'Height': math.ceil(float(height)), 'Material': material})
+                # Streams the workbook in read-only mode; bad rows raise with their row number
+                for row in read_table(self.input_file_path, schema='excel'):
+                    for _ in range(row.qty):
+                        cut_list.append({'Part Label': row.label, 'Length': math.ceil(row.length), 'Height': math.ceil(row.height), 'Material': row.material})
                 project_folder = self.determine_project_folder()
-                self.create_and_export_cutlists(cut_list, (stock_length, stock_width), gap, project_folder)
-                messagebox.showinfo("Success", f"SVG layouts have been created and exported successfully in {project_folder}.")
+            except IngestError as e:
+                messagebox.showerror("Error", f"Invalid cut list: {e}")
             except ValueError:
                 messagebox.showerror("Error", "Invalid dimensions or gap value. Please enter valid numbers.")
             except Exception as e:
                 messagebox.showerror("Error", f"An error occurred: {e}")
+            else:
+                # Pack off the main thread so the window keeps redrawing
+                self.export_button.config(state=tk.DISABLED)
+                self.status.set(f"Packing {len(cut_list)} parts...")
+                threading.Thread(target=self.export_in_background, args=(cut_list, (stock_length, stock_width), gap, project_folder),
+                                 daemon=True).start()
+                self.window.after(100, self.poll_progress)
+
+    def export_in_background(self, cut_list, plywood_size, gap, project_folder):
+        try:
+            self.create_and_export_cutlists(cut_list, plywood_size, gap, project_folder,
+                                            progress=lambda event: self.progress_queue.put(('progress', event)))
+        except Exception as e:
+            self.progress_queue.put(('error', str(e)))
+        else:
+            self.progress_queue.put(('done', project_folder))
+
+    def poll_progress(self):
+        # Runs on the Tk main loop; the packing thread never touches widgets
+        while True:
+            try:
+                kind, payload = self.progress_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                self.status.set(f"Packed {payload.finished} of {payload.total} materials ({payload.label}: {payload.state})")
+                continue
+            self.export_button.config(state=tk.NORMAL)
+            if kind == 'done':
+                self.status.set("Done")
+                messagebox.showinfo("Success", f"SVG layouts have been created and exported successfully in {payload}.")
+            else:
+                self.status.set("Failed")
+                messagebox.showerror("Error", f"An error occurred: {payload}")
+            return
+        self.window.after(100, self.poll_progress)
 
     def load_cut_list(self, filepath):
-        wb = openpyxl.load_workbook(filepath)
-        sheet = wb.active
-        return [{'Part Label': row[0], 'Length': math.ceil(float(row[1])), 'Height': math.ceil(float(row[2])), 'Material': row[4]} for row in sheet.iter_rows(min_row=2, values_only=True)]
+        return [{'Part Label': row.label, 'Length': math.ceil(row.length), 'Height': math.ceil(row.height), 'Material': row.material} for row in read_table(filepath, schema='excel')]
 
     def determine_project_folder(self):
         project_id = self.project_id.get().strip()
@@ -185,56 +230,36 @@ class CutlistOptimizerGUI:
 
        # project_folder = os.path.join(self.output_folder_path, project_id) if project_id else self.get_project_folder(self.output_folder_path)
         os.makedirs(project_folder, exist_ok=True)
+        return project_folder
         
 
-    def create_and_export_cutlists(self, cut_list, plywood_size, gap, project_folder):
-        # Group parts based on material
-        materials = {}
-        for part in cut_list:
-            material = part['Material']
-            if material not in materials:
-                materials[material] = []
-            materials[material].append(part)
-
-        # Create and export cut lists for each material
-        for material, parts in materials.items():
-            layouts = self.calculate_layout(parts, plywood_size, gap)
-            self.create_svg(layouts, project_folder, gap, material)
-
-    def calculate_layout(self, parts, plywood_size, gap):
-        parts.sort(key=lambda x: x['Height'], reverse=True)
-        sheet_layouts, current_sheet = [], {'parts': [], 'positions': []}
-        current_x, current_y = gap, gap
-        max_y_in_row = 0
-        for part in parts:
-            if current_x + part['Length'] + gap > plywood_size[0]:
-                current_x, current_y = gap, current_y + max_y_in_row + gap
-                max_y_in_row = 0
-            if current_y + part['Height'] + gap > plywood_size[1]:
-                sheet_layouts.append(current_sheet)
-                current_sheet = {'parts': [], 'positions': []}
-                current_y = gap
-            current_sheet['parts'].append(part)
-            current_sheet['positions'].append((current_x, current_y))
-            current_x += part['Length'] + gap
-            max_y_in_row = max(max_y_in_row, part['Height'])
-        if current_sheet['parts']:
-            sheet_layouts.append(current_sheet)
-        return sheet_layouts
-
-    def create_svg(self, sheet_layouts, project_folder, gap, material):
-        for i, sheet in enumerate(sheet_layouts, start=1):
-            # Filename now includes the material name
-            output_path = os.path.join(project_folder, f"{material}_cut_{i}.svg")
-            dwg = Drawing(output_path, size=(f'{self.stock_width.get()}mm', f'{self.stock_length.get()}mm'))
-            for part, (x, y) in zip(sheet['parts'], sheet['positions']):
-                dwg.add(dwg.rect(insert=(f'{x}mm', f'{y}mm'), size=(f"{part['Length']}mm", f"{part['Height']}mm"), stroke='black', fill='none'))
-                text_x = x + part['Length'] / 2
-                text_y = y + part['Height'] / 2
-                dwg.add(dwg.text(part['Part Label'], insert=(f'{text_x}mm', f'{text_y}mm'), fill='black', text_anchor="middle", dominant_baseline="central", font_size='15px', font_family="Arial"))
-                dimensions_text = f"{part['Length']}x{part['Height']}mm"
-                dwg.add(dwg.text(dimensions_text, insert=(f'{text_x}mm', f'{text_y + 10}mm'), fill='black', text_anchor="middle", dominant_baseline="hanging", font_size='15px', font_family="Arial"))
-            dwg.save()
+    def create_and_export_cutlists(self, cut_list, plywood_size, gap, project_folder, progress=None):
+        # One partition per material, each packed in its own process with the same stock
+        parts = [{'location': part['Part Label'], 'length': part['Length'], 'height': part['Height'], 'qty': 1,
+                  'material': part['Material']} for part in cut_list]
+        # The packing core works in whole millimetres; round the gap up so parts never get closer
+        gap = math.ceil(gap)
+        length, width = int(plywood_size[0]), int(plywood_size[1])
+        # Keep a gap-wide trim on every edge: each part already carries one gap on its far side,
+        # so pack on the sheet less one gap and shift everything in by a gap
+        stock = [{'length': length - gap, 'width': width - gap, 'qty': math.inf}]
+        # Plywood has a grain, so parts keep their length along the sheet length
+        plan = pack_partitions(partition_parts(parts, stock), gap, progress=progress, allow_rotation=False)
+        if plan.errors or not plan.complete:
+            failed = plan.errors or {r.label: "some parts do not fit the stock size" for r in plan.results if not r.complete}
+            raise ValueError("; ".join(f"{material}: {error}" for material, error in failed.items()))
+
+        for result in plan.results:
+            sheets = [dict(sheet, size=(length, width),
+                           placements=[dict(p, position=(p['position'][0] + gap, p['position'][1] + gap))
+                                       for p in sheet['placements']])
+                      for sheet in result.sheets]
+            self.create_svg(sheets, project_folder, gap, result.label)
+
+    @timed('CutlistOptimizerGUI.create_svg')
+    def create_svg(self, sheets, project_folder, gap, material):
+        # Identical sheets are rendered once and written per sheet; filename includes the material name
+        render_svg(sheets, project_folder, prefix=f"{material}_cut", gap=gap, per_sheet=True)
 
     def display_instructions(self):
         instructions = """
@@ -303,5 +328,6 @@ class CutlistOptimizerGUI:
             return None
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     setup_resources()
     CutlistOptimizerGUI()
@@ -0,0 +1,337 @@
+import csv
+import math
+import os
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+# Column conventions used across the repo, mapped onto the canonical fields
+# label / length / height / qty / material / area_sqm.
+SCHEMAS: Dict[str, Dict[str, str]] = {
+    'glass': {'label': 'location', 'length': 'glass_length', 'height': 'glass_height',
+              'qty': 'glass_qty', 'area_sqm': 'area_sqm'},
+    'parts': {'label': 'id', 'length': 'width', 'height': 'height', 'qty': 'quantity'},
+    'stock': {'label': 'particulars', 'length': 'length', 'height': 'width', 'qty': 'qty'},
+    'named_stock': {'label': 'name', 'length': 'width', 'height': 'height', 'qty': 'quantity'},
+}
+# Columns a file may leave out; every other mapped column is required
+OPTIONAL_COLUMNS = {'particulars', 'area_sqm'}
+
+# The GUI workbook layout: Part Label, Length, Height, Count, Material in columns A-E
+EXCEL_COLUMNS = ('label', 'length', 'height', 'qty', 'material')
+
+# engine='auto' only pays for importing pyarrow on files at least this large
+PYARROW_MIN_BYTES = 4 << 20
+
+
+class IngestError(ValueError):
+    """Schema or value error, pointing at the offending source row and column."""
+
+    def __init__(self, message: str, source: str = '', row: Optional[int] = None, column: Optional[str] = None):
+        self.source = source
+        self.row = row
+        self.column = column
+        where = source
+        if row is not None:
+            where += f":{row}"
+        if column is not None:
+            where += f" [{column}]"
+        super().__init__(f"{where}: {message}" if where else message)
+
+
+class PartRecord(NamedTuple):
+    label: str
+    length: float
+    height: float
+    qty: int
+    material: str
+    area_sqm: float
+
+
+@dataclass
+class PartTable:
+    """Columnar cut list: typed arrays for numbers, interned codes for strings."""
+    schema: str = ''
+    length: array = field(default_factory=lambda: array('d'))
+    height: array = field(default_factory=lambda: array('d'))
+    qty: array = field(default_factory=lambda: array('q'))
+    area_sqm: array = field(default_factory=lambda: array('d'))
+    label_codes: array = field(default_factory=lambda: array('l'))
+    material_codes: array = field(default_factory=lambda: array('l'))
+    labels: List[str] = field(default_factory=list)
+    materials: List[str] = field(default_factory=list)
+    errors: List[IngestError] = field(default_factory=list)
+
+    def __post_init__(self):
+        self._label_index = {label: i for i, label in enumerate(self.labels)}
+        self._material_index = {material: i for i, material in enumerate(self.materials)}
+
+    def __len__(self) -> int:
+        return len(self.length)
+
+    def _intern(self, value: str, values: List[str], index: Dict[str, int]) -> int:
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(values)
+            values.append(value)
+        return code
+
+    def append(self, label: str, length: float, height: float, qty: int, material: str = '',
+               area_sqm: Optional[float] = None):
+        self.length.append(length)
+        self.height.append(height)
+        self.qty.append(qty)
+        self.area_sqm.append(length * height * qty / 1_000_000 if area_sqm is None else area_sqm)
+        self.label_codes.append(self._intern(label, self.labels, self._label_index))
+        self.material_codes.append(self._intern(material, self.materials, self._material_index))
+
+    def record(self, i: int) -> PartRecord:
+        return PartRecord(self.labels[self.label_codes[i]], self.length[i], self.height[i], self.qty[i],
+                          self.materials[self.material_codes[i]], self.area_sqm[i])
+
+    def __iter__(self) -> Iterator[PartRecord]:
+        return (self.record(i) for i in range(len(self)))
+
+    def total_quantity(self) -> int:
+        return sum(self.qty)
+
+
+def detect_schema(header: Sequence) -> Optional[str]:
+    """Name of the first schema whose required columns all appear in the header."""
+    columns = {str(c).strip() for c in header if c is not None}
+    for name, mapping in SCHEMAS.items():
+        if all(column in columns for column in mapping.values() if column not in OPTIONAL_COLUMNS):
+            return name
+    return None
+
+
+def _column_positions(header: Sequence, schema: str, source: str) -> Dict[str, int]:
+    if schema == 'excel':
+        return {f: i for i, f in enumerate(EXCEL_COLUMNS)}
+    mapping = SCHEMAS.get(schema)
+    if mapping is None:
+        raise IngestError(f"unknown schema {schema!r}; expected one of {sorted(SCHEMAS) + ['excel']}", source)
+    position = {str(c).strip(): i for i, c in enumerate(header) if c is not None}
+    missing = [column for column in mapping.values() if column not in OPTIONAL_COLUMNS and column not in position]
+    if missing:
+        raise IngestError(f"missing columns {missing}", source, row=1)
+    return {f: position[column] for f, column in mapping.items() if column in position}
+
+
+def _convert(value, kind, source: str, row: int, column: str):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        raise IngestError("missing value", source, row, column)
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise IngestError(f"not a number: {value!r}", source, row, column) from None
+    if not math.isfinite(number):
+        raise IngestError(f"not a finite number: {value!r}", source, row, column)
+    if kind is int:
+        if number != int(number):
+            raise IngestError(f"not a whole number: {value!r}", source, row, column)
+        number = int(number)
+    if number < 0 or (number == 0 and column in ('length', 'height')):
+        raise IngestError(f"must be positive: {value!r}", source, row, column)
+    return number
+
+
+def _append_row(table: PartTable, values: Sequence, positions: Dict[str, int], source: str, row: int):
+    def get(f):
+        i = positions.get(f)
+        return values[i] if i is not None and i < len(values) else None
+
+    length = _convert(get('length'), float, source, row, 'length')
+    height = _convert(get('height'), float, source, row, 'height')
+    qty = _convert(get('qty'), int, source, row, 'qty')
+    area = get('area_sqm')
+    area = None if area is None or area == '' else _convert(area, float, source, row, 'area_sqm')
+    label, material = get('label'), get('material')
+    table.append('' if label is None else str(label).strip(), length, height, qty,
+                 '' if material is None else str(material).strip(), area)
+
+
+def _csv_rows(path: str) -> Iterator[Sequence]:
+    with open(path, newline='', encoding='utf-8-sig') as file:
+        yield from csv.reader(file)
+
+
+def _xlsx_rows(path: str) -> Iterator[Sequence]:
+    import openpyxl
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from wb.active.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def _is_blank(values: Sequence) -> bool:
+    return all(v is None or (isinstance(v, str) and not v.strip()) for v in values)
+
+
+def _load_rows(rows: Iterator[Sequence], table: PartTable, schema: Optional[str], source: str,
+               collect_errors: bool, positional: bool):
+    header = next(rows, None)
+    if header is None:
+        raise IngestError("file is empty", source)
+    if schema is None:
+        schema = detect_schema(header) or ('excel' if positional else None)
+        if schema is None:
+            raise IngestError(f"unrecognised columns {list(header)}", source, row=1)
+    table.schema = schema
+    positions = _column_positions(header, schema, source)
+    width = max(positions.values()) + 1
+    i_length, i_height, i_qty = positions['length'], positions['height'], positions['qty']
+    i_label, i_material, i_area = positions.get('label'), positions.get('material'), positions.get('area_sqm')
+    append = table.append
+
+    for row, values in enumerate(rows, start=2):
+        # Fast path for well-formed rows; anything unusual goes through the checked converter
+        try:
+            if len(values) >= width:
+                length, height, qty = float(values[i_length]), float(values[i_height]), float(values[i_qty])
+                area = values[i_area] if i_area is not None else None
+                area = None if area is None or area == '' else float(area)
+                if 0 < length < math.inf and 0 < height < math.inf and 0 <= qty < math.inf and qty == int(qty) \
+                        and (area is None or 0 <= area < math.inf):
+                    append('' if i_label is None or values[i_label] is None else str(values[i_label]).strip(),
+                           length, height, int(qty),
+                           '' if i_material is None or values[i_material] is None else str(values[i_material]).strip(),
+                           area)
+                    continue
+        except (TypeError, ValueError, OverflowError):
+            pass
+        if _is_blank(values):
+            continue
+        try:
+            _append_row(table, values, positions, source, row)
+        except IngestError as e:
+            if not collect_errors:
+                raise
+            table.errors.append(e)
+
+
+def _in_range(values, positive: bool) -> bool:
+    """Whether every non-null value is finite and positive (or non-negative), as _convert requires."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    bound = pc.greater(values, 0) if positive else pc.greater_equal(values, 0)
+    if pa.types.is_floating(values.type):
+        bound = pc.and_(bound, pc.is_finite(values))
+    return pc.all(bound).as_py() is not False
+
+
+def _load_pyarrow(path: str, table: PartTable, schema: Optional[str]) -> bool:
+    """Bulk-load a clean CSV through pyarrow; False means fall back to the row reader."""
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    with pa_csv.open_csv(path, read_options=pa_csv.ReadOptions(block_size=1 << 22)) as reader:
+        header = reader.schema.names
+        schema = schema or detect_schema(header)
+        if schema is None or schema == 'excel':
+            return False
+        positions = _column_positions(header, schema, path)
+        table.schema = schema
+        for batch in reader:
+            columns = {f: batch.column(i) for f, i in positions.items()}
+            try:
+                length = columns['length'].cast(pa.float64())
+                height = columns['height'].cast(pa.float64())
+                qty = columns['qty'].cast(pa.int64())
+                area = columns['area_sqm'].cast(pa.float64()) if 'area_sqm' in columns else None
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                return False
+            if length.null_count or height.null_count or qty.null_count:
+                return False
+            # The row reader reports exactly which value is out of range
+            if not (_in_range(length, True) and _in_range(height, True) and _in_range(qty, False)
+                    and (area is None or _in_range(area, False))):
+                return False
+            table.length.frombytes(length.to_numpy().tobytes())
+            table.height.frombytes(height.to_numpy().tobytes())
+            table.qty.frombytes(qty.to_numpy().astype('int64').tobytes())
+            # Strings still go through the interning tables one value at a time
+            labels = columns['label'].to_pylist() if 'label' in columns else [''] * len(batch)
+            areas = area.to_pylist() if area is not None else None
+            start = len(table.label_codes)
+            for j, label in enumerate(labels):
+                table.label_codes.append(table._intern('' if label is None else str(label).strip(),
+                                                       table.labels, table._label_index))
+                i = start + j
+                area = areas[j] if areas is not None else None
+                table.area_sqm.append(table.length[i] * table.height[i] * table.qty[i] / 1_000_000
+                                      if area is None else float(area))
+            table.material_codes.extend([table._intern('', table.materials, table._material_index)] * len(batch))
+    return True
+
+
+def read_table(path: str, schema: Optional[str] = None, engine: str = 'auto',
+               collect_errors: bool = False) -> PartTable:
+    """Stream a CSV or XLSX cut list into a PartTable.
+
+    `schema` is one of SCHEMAS or 'excel' (positional A-E); by default it is
+    detected from the header row. CSV files are read with the csv module, or in
+    bulk with pyarrow when it is installed (engine='pyarrow', or 'auto' for
+    files of PYARROW_MIN_BYTES and up); XLSX files are read with openpyxl in
+    read_only mode. Bad rows raise IngestError, or are collected on
+    table.errors when collect_errors is set.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    table = PartTable()
+    if path.lower().endswith(('.xlsx', '.xlsm')):
+        _load_rows(_xlsx_rows(path), table, schema, path, collect_errors, positional=True)
+        return table
+
+    if engine == 'pyarrow' or (engine == 'auto' and os.path.getsize(path) >= PYARROW_MIN_BYTES):
+        try:
+            if _load_pyarrow(path, table, schema):
+                return table
+        except ImportError:
+            if engine == 'pyarrow':
+                raise
+        # Re-read with the csv module, which reports exact row errors
+        table = PartTable()
+    elif engine not in ('auto', 'csv'):
+        raise ValueError(f"Unknown engine {engine!r}; expected 'auto', 'csv' or 'pyarrow'")
+    _load_rows(_csv_rows(path), table, schema, path, collect_errors, positional=False)
+    return table
+
+
+def write_table_csv(path: str, rows: int, schema: str = 'glass', seed: int = 0):
+    """Write a synthetic order book of `rows` lines for load testing."""
+    import random
+    rng = random.Random(seed)
+    mapping = SCHEMAS[schema]
+    fields = [f for f in ('label', 'length', 'height', 'qty', 'area_sqm') if f in mapping]
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow([mapping[f] for f in fields])
+        for i in range(rows):
+            length, height, qty = rng.randint(200, 2000), rng.randint(200, 2000), rng.randint(1, 20)
+            values = {'label': f"P-{i % 5000}", 'length': length, 'height': height, 'qty': qty,
+                      'area_sqm': round(length * height * qty / 1_000_000, 3)}
+            writer.writerow([values[f] for f in fields])
+
+
+def main():
+    import sys
+    import time
+    import tracemalloc
+
+    path = sys.argv[1] if len(sys.argv) > 1 else 'data/glass_data.csv'
+    tracemalloc.start()
+    start = time.perf_counter()
+    table = read_table(path, collect_errors=True)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{path}: {len(table)} rows ({table.schema}), {table.total_quantity()} pieces, "
+          f"{len(table.errors)} bad rows in {elapsed:.2f}s, peak {peak / 1_000_000:.1f} MB")
+    for error in table.errors[:10]:
+        print(f"  {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,478 @@
+import csv
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from Instrumentation import phase, tally, timed
+from PackingCore import PartGroup, group_parts, pack_groups, plan_statistics
+
+# (group index, rotated, count) runs laid left to right inside one strip
+StripItems = Tuple[Tuple[int, bool, int], ...]
+
+
+@dataclass
+class Pattern:
+    stock: int
+    strips: List[Tuple[int, StripItems]]  # (strip height, items) bottom to top
+    counts: Tuple[int, ...]               # pieces per group, capped at demand
+    transposed: bool = False              # strips run across the sheet width instead
+    blocks: Optional[List[Dict]] = None   # fixed layout of a greedy sheet, used instead of strips
+
+    def key(self) -> Tuple:
+        return (self.stock, self.counts)
+
+
+@dataclass
+class CuttingStockPlan:
+    sheets: List[Dict]
+    lp_bound_m2: float
+    patterns_generated: int
+    iterations: int
+    solve_time: float
+    stats: Dict = field(default_factory=dict)
+
+
+def _orientations(group: PartGroup):
+    yield group.length, group.height, False
+    if group.length != group.height:
+        yield group.height, group.length, True
+
+
+def _strip_knapsack(groups: List[PartGroup], values: List[float], length: int,
+                    strip_height: int, gap: int, bounds: List[int]) -> Tuple[float, StripItems]:
+    """Best stage-2 fill of one strip: bounded knapsack over piece widths.
+
+    Each (group, orientation) is split into power-of-two bundles so the bounded
+    problem becomes a 0/1 knapsack; every bundle is one vectorized pass over
+    the strip length, and the take masks are kept for backtracking. Each
+    orientation is bounded on its own, so a strip may hold more of a group
+    than bounds[i]; callers cap the pattern counts at demand.
+    """
+    best = np.zeros(length + 1)
+    bundles = []
+    takes = []
+    for i, group in enumerate(groups):
+        if values[i] <= 0 or bounds[i] <= 0:
+            continue
+        for w, h, rotated in _orientations(group):
+            step = w + gap
+            if h > strip_height or step > length:
+                continue
+            remaining = min(bounds[i], length // step)
+            copies = 1
+            while remaining > 0:
+                copies = min(copies, remaining)
+                size = copies * step
+                candidate = best[:-size] + copies * values[i] if size <= length else None
+                if candidate is not None:
+                    take = candidate > best[size:] + 1e-12
+                    best = best.copy()
+                    best[size:][take] = candidate[take]
+                    bundles.append((i, rotated, copies, size))
+                    takes.append(take)
+                remaining -= copies
+                copies *= 2
+
+    runs: Dict[Tuple[int, bool], int] = {}
+    t = length
+    for (i, rotated, copies, size), take in zip(reversed(bundles), reversed(takes)):
+        if t >= size and take[t - size]:
+            runs[(i, rotated)] = runs.get((i, rotated), 0) + copies
+            t -= size
+    items = tuple((i, rotated, copies) for (i, rotated), copies in sorted(runs.items()))
+    return float(best[length]), items
+
+
+def _stack_strips(strips: List[Tuple[int, float]], width: int, gap: int) -> List[int]:
+    """Stage 1: unbounded knapsack of (strip height, value) over the sheet width.
+
+    best[k][t] is the best value within width t using the first k strip types.
+    Adding a type is a running maximum over each residue class of its step,
+    so every type costs one vectorized pass over the width.
+    """
+    best = [np.zeros(width + 1)]
+    for strip_height, value in strips:
+        step = strip_height + gap
+        rows = -(-(width + 1) // step)
+        padded = np.full(rows * step, -np.inf)
+        padded[:width + 1] = best[-1]
+        copies = np.arange(rows)[:, None] * value
+        table = np.maximum.accumulate(padded.reshape(rows, step) - copies, axis=0) + copies
+        best.append(table.ravel()[:width + 1])
+
+    chosen = []
+    t, k = width, len(strips)
+    while k > 0 and t > 0:
+        strip_height, _ = strips[k - 1]
+        if best[k][t] > best[k - 1][t] + 1e-9 and t >= strip_height + gap:
+            chosen.append(strip_height)
+            t -= strip_height + gap
+        else:
+            k -= 1
+    return chosen
+
+
+def _price_orientation(groups: List[PartGroup], values: List[float], length: int, width: int,
+                       gap: int, demand: List[int], stock: int) -> Tuple[float, Optional[Pattern]]:
+    heights = sorted({h for g in groups for _, h, _ in _orientations(g) if h + gap <= width})
+    strips: Dict[int, Tuple[float, StripItems]] = {}
+    for strip_height in heights:
+        value, items = _strip_knapsack(groups, values, length, strip_height, gap, demand)
+        if value > 0:
+            strips[strip_height] = (value, items)
+    if not strips:
+        return 0.0, None
+
+    chosen = _stack_strips([(h, value) for h, (value, _) in strips.items()], width, gap)
+
+    counts = [0] * len(groups)
+    for strip_height in chosen:
+        for i, _, copies in strips[strip_height][1]:
+            counts[i] += copies
+    counts = tuple(min(count, demand[i]) for i, count in enumerate(counts))
+    pattern = Pattern(stock, [(h, strips[h][1]) for h in chosen], counts)
+    value = sum(values[i] * count for i, count in enumerate(counts))
+
+    # Repeated strips are worth less once demand caps them; a residual fill may do better
+    residual_value, residual_pattern = _price_residual(groups, values, length, width, gap, demand, stock, heights)
+    if residual_value > value + 1e-9:
+        return residual_value, residual_pattern
+    return value, pattern
+
+
+def _price_residual(groups: List[PartGroup], values: List[float], length: int, width: int,
+                    gap: int, demand: List[int], stock: int, heights: List[int]) -> Tuple[float, Optional[Pattern]]:
+    """Stack strips one at a time, each filled from the demand the earlier strips left.
+
+    The next strip is the one with the best value per unit of sheet width it
+    consumes. This suits low-quantity orders, where the stage-1 knapsack
+    would repeat a strip whose pieces are already used up.
+    """
+    residual = list(demand)
+    chosen: List[Tuple[int, StripItems]] = []
+    used = 0
+    # Bounds only shrink, so a strip fill that avoids every reduced group stays optimal
+    fills: Dict[int, Tuple[float, StripItems]] = {}
+    changed: set = set()
+    while True:
+        best = None
+        for strip_height in heights:
+            step = strip_height + gap
+            if used + step > width:
+                break
+            fill = fills.get(strip_height)
+            if fill is None or any(i in changed for i, _, _ in fill[1]):
+                fill = fills[strip_height] = _strip_knapsack(groups, values, length, strip_height, gap, residual)
+            value, items = fill
+            if value > 0 and (best is None or value / step > best[0] / (best[1] + gap)):
+                best = (value, strip_height, items)
+        if best is None:
+            break
+        _, strip_height, items = best
+        chosen.append((strip_height, items))
+        changed = {i for i, _, _ in items}
+        for i, _, copies in items:
+            residual[i] -= copies
+        used += strip_height + gap
+    if not chosen:
+        return 0.0, None
+    counts = tuple(d - max(r, 0) for d, r in zip(demand, residual))
+    return sum(values[i] * count for i, count in enumerate(counts)), Pattern(stock, chosen, counts)
+
+
+def price_pattern(groups: List[PartGroup], values: List[float], length: int, width: int,
+                  gap: int, demand: List[int], stock: int = 0) -> Tuple[float, Optional[Pattern]]:
+    """Most valuable two-stage guillotine pattern for one stock size.
+
+    Stage 1 cuts the sheet into strips whose height is one of the piece
+    heights; stage 2 cuts each strip into pieces (with trim). Each strip height
+    is solved once as a knapsack, then strips are stacked by a second knapsack.
+    Strips are tried both along the sheet length and along its width.
+    """
+    best_value, best = _price_orientation(groups, values, length, width, gap, demand, stock)
+    if length != width:
+        value, pattern = _price_orientation(groups, values, width, length, gap, demand, stock)
+        if pattern is not None and value > best_value + 1e-9:
+            pattern.transposed = True
+            best_value, best = value, pattern
+    return best_value, best
+
+
+def _solve_master(patterns: List[Pattern], costs: List[float], demand: List[int], stock_qty: List[float]):
+    """Continuous restricted master; returns (objective, x, demand duals, stock duals)."""
+    from scipy.optimize import linprog
+
+    n_groups, n_stocks = len(demand), len(stock_qty)
+    A = np.zeros((n_groups + n_stocks, len(patterns)))
+    for p, pattern in enumerate(patterns):
+        A[:n_groups, p] = [-count for count in pattern.counts]
+        A[n_groups + pattern.stock, p] = 1
+    b = np.array([-d for d in demand] + [q if q != float('inf') else 1e9 for q in stock_qty])
+    res = linprog(np.array(costs), A_ub=A, b_ub=b, bounds=(0, None), method='highs')
+    if res.status != 0:
+        raise RuntimeError(f"Master LP failed: {res.message}")
+    marginals = res.ineqlin.marginals
+    return res.fun, res.x, -marginals[:n_groups], marginals[n_groups:]
+
+
+def _solve_integer(patterns: List[Pattern], costs: List[float], demand: List[int],
+                   stock_qty: List[float], backend: str, time_limit: float) -> List[int]:
+    """Integer master over the generated columns with a local MILP backend."""
+    n_groups = len(demand)
+    if backend == 'highs':
+        from scipy.optimize import Bounds, LinearConstraint, milp
+
+        A = np.zeros((n_groups + len(stock_qty), len(patterns)))
+        for p, pattern in enumerate(patterns):
+            A[:n_groups, p] = pattern.counts
+            A[n_groups + pattern.stock, p] = 1
+        lower = np.array(demand + [0] * len(stock_qty), dtype=float)
+        upper = np.array([np.inf] * n_groups + list(stock_qty), dtype=float)
+        res = milp(np.array(costs), constraints=LinearConstraint(A, lower, upper),
+                   integrality=np.ones(len(patterns)), bounds=Bounds(0, np.inf),
+                   options={'time_limit': time_limit})
+        if res.x is None:
+            raise RuntimeError(f"Integer master failed: {res.message}")
+        return [int(round(v)) for v in res.x]
+
+    # SCIP / CBC through OR-tools, as used in the julius notebook
+    from ortools.linear_solver import pywraplp
+    solver = pywraplp.Solver.CreateSolver(backend.upper())
+    if solver is None:
+        raise ValueError(f"MILP backend not available: {backend}")
+    solver.SetTimeLimit(int(time_limit * 1000))
+    x = [solver.IntVar(0, solver.infinity(), f'x{p}') for p in range(len(patterns))]
+    for i, d in enumerate(demand):
+        solver.Add(sum(pattern.counts[i] * x[p] for p, pattern in enumerate(patterns)) >= d)
+    for s, qty in enumerate(stock_qty):
+        if qty != float('inf'):
+            solver.Add(sum(x[p] for p, pattern in enumerate(patterns) if pattern.stock == s) <= qty)
+    solver.Minimize(sum(costs[p] * x[p] for p in range(len(patterns))))
+    status = solver.Solve()
+    if status not in (pywraplp.Solver.OPTIMAL, pywraplp.Solver.FEASIBLE):
+        raise RuntimeError("Integer master found no feasible plan")
+    return [int(round(v.solution_value())) for v in x]
+
+
+def _pattern_blocks(pattern: Pattern, groups: List[PartGroup], take: List[int], gap: int) -> List[Dict]:
+    """Lay a pattern out as PackingCore blocks, keeping only `take` pieces per group."""
+    if pattern.blocks is not None:
+        return _trim_blocks(pattern.blocks, take, gap)
+    remaining = list(take)
+    blocks = []
+    y = 0
+    for strip_height, items in pattern.strips:
+        x = 0
+        for i, rotated, copies in items:
+            group = groups[i]
+            w = group.height if rotated else group.length
+            used = min(copies, remaining[i])
+            if used:
+                if pattern.transposed:
+                    # Strip runs up the sheet: swap axes and stack the pieces in a column
+                    blocks.append({'group': i, 'part': group.as_part(), 'position': (y, x),
+                                   'rotated': not rotated, 'columns': 1, 'rows': used})
+                else:
+                    blocks.append({'group': i, 'part': group.as_part(), 'position': (x, y),
+                                   'rotated': rotated, 'columns': used, 'rows': 1})
+                remaining[i] -= used
+            x += copies * (w + gap)
+        y += strip_height + gap
+    return blocks
+
+
+def _trim_blocks(blocks: List[Dict], take: List[int], gap: int) -> List[Dict]:
+    """Keep only `take` pieces per group of a fixed layout: whole rows of a block first, then part of a row."""
+    remaining = list(take)
+    kept = []
+    for block in blocks:
+        i, columns = block['group'], block['columns']
+        used = min(columns * block['rows'], remaining[i])
+        rows, extra = divmod(used, columns)
+        if rows:
+            kept.append(dict(block, rows=rows))
+        if extra:
+            part = block['part']
+            ph = part['length'] if block['rotated'] else part['height']
+            x, y = block['position']
+            kept.append(dict(block, position=(x, y + rows * (ph + gap)), columns=extra, rows=1))
+        remaining[i] -= used
+    return kept
+
+
+def _greedy_patterns(groups: List[PartGroup], stock_sizes: List[Dict],
+                     gap: int) -> Tuple[List[Dict], List[Pattern]]:
+    """pack_groups' plan for the same order, and each of its sheets as a fixed-layout pattern."""
+    try:
+        sheets = pack_groups(groups, stock_sizes, gap)
+    except ValueError:
+        return [], []
+    index = {(g.location, g.length, g.height): i for i, g in enumerate(groups)}
+    stock_index: Dict[Tuple[int, int], int] = {}
+    for s, stock in enumerate(stock_sizes):
+        stock_index.setdefault((stock['length'], stock['width']), s)
+    patterns = []
+    for sheet in sheets:
+        blocks = [dict(block, group=index[(block['part']['location'], block['part']['length'],
+                                           block['part']['height'])]) for block in sheet['blocks']]
+        counts = [0] * len(groups)
+        for block in blocks:
+            counts[block['group']] += block['columns'] * block['rows']
+        sheet['blocks'] = blocks
+        patterns.append(Pattern(stock_index[tuple(sheet['size'])], [], tuple(counts), blocks=blocks))
+    return sheets, patterns
+
+
+def _plan_sheets(patterns: List[Pattern], counts: List[int], groups: List[PartGroup],
+                 stock_sizes: List[Dict], gap: int) -> List[Dict]:
+    """Turn integer pattern counts into sheets with repeat counts, trimming overproduction."""
+    remaining = [g.qty for g in groups]
+    sheets = []
+    order = sorted((p for p in range(len(patterns)) if counts[p]),
+                   key=lambda p: sum(c * groups[i].area for i, c in enumerate(patterns[p].counts)),
+                   reverse=True)
+    for p in order:
+        pattern, copies = patterns[p], counts[p]
+        size = (stock_sizes[pattern.stock]['length'], stock_sizes[pattern.stock]['width'])
+        needed = [i for i, c in enumerate(pattern.counts) if c]
+        full = min([copies] + [remaining[i] // pattern.counts[i] for i in needed])
+        if full:
+            sheets.append({'size': size, 'blocks': _pattern_blocks(pattern, groups, pattern.counts, gap),
+                           'repeat': full})
+            for i in needed:
+                remaining[i] -= full * pattern.counts[i]
+        for _ in range(copies - full):
+            take = [min(c, remaining[i]) for i, c in enumerate(pattern.counts)]
+            if not any(take):
+                break
+            sheets.append({'size': size, 'blocks': _pattern_blocks(pattern, groups, take, gap), 'repeat': 1})
+            for i, c in enumerate(take):
+                remaining[i] -= c
+    return sheets
+
+
+@timed('solve_cutting_stock')
+def solve_cutting_stock(groups: List[PartGroup], stock_sizes: List[Dict], gap: int = 0,
+                        backend: str = 'highs', time_limit: float = 10.0,
+                        max_iterations: int = 200) -> CuttingStockPlan:
+    """Gilmore-Gomory column generation over two-stage guillotine patterns.
+
+    The master LP minimises total stock area subject to demand and stock
+    quantity rows; pricing is the two-stage knapsack in price_pattern. The
+    final integer plan is solved over the generated columns with HiGHS
+    (scipy) or SCIP/CBC (OR-tools). The sheets of the greedy pack_groups plan
+    are seeded as columns too, and that plan is returned whenever the solver
+    cannot beat it in the time limit.
+    """
+    start = time.time()
+    groups = [g for g in groups if g.qty > 0]
+    demand = [g.qty for g in groups]
+    stock_qty = [stock.get('qty', float('inf')) for stock in stock_sizes]
+    stock_cost = [stock['length'] * stock['width'] / 1_000_000 for stock in stock_sizes]
+
+    # Homogeneous starting columns: one pattern per (stock, group) that fits
+    patterns: List[Pattern] = []
+    seen = set()
+    for s, stock in enumerate(stock_sizes):
+        for i in range(len(groups)):
+            values = [1.0 if j == i else 0.0 for j in range(len(groups))]
+            _, pattern = price_pattern(groups, values, stock['length'], stock['width'], gap, demand, s)
+            if pattern is not None and pattern.key() not in seen:
+                seen.add(pattern.key())
+                patterns.append(pattern)
+    with phase('greedy_seed'):
+        greedy_sheets, greedy_patterns = _greedy_patterns(groups, stock_sizes, gap)
+    for pattern in greedy_patterns:
+        if pattern.key() not in seen:
+            seen.add(pattern.key())
+            patterns.append(pattern)
+    missing = [g.location for i, g in enumerate(groups) if not any(p.counts[i] for p in patterns)]
+    if missing:
+        raise ValueError(f"Parts do not fit on any available stock sheet: {missing}")
+
+    iterations = 0
+    lp_bound = 0.0
+    while iterations < max_iterations and time.time() - start < time_limit / 2:
+        iterations += 1
+        with phase('master_lp'):
+            lp_bound, _, duals, stock_duals = _solve_master(patterns, [stock_cost[p.stock] for p in patterns],
+                                                            demand, stock_qty)
+        added = 0
+        for s, stock in enumerate(stock_sizes):
+            with phase('pricing'):
+                value, pattern = price_pattern(groups, list(duals), stock['length'], stock['width'], gap, demand, s)
+            if pattern is None or pattern.key() in seen:
+                continue
+            if stock_cost[s] - value - stock_duals[s] < -1e-9:
+                seen.add(pattern.key())
+                patterns.append(pattern)
+                added += 1
+        tally('columns_added', added)
+        if not added:
+            break
+
+    costs = [stock_cost[p.stock] for p in patterns]
+    remaining_time = max(1.0, time_limit - (time.time() - start))
+    try:
+        with phase('integer_master'):
+            counts = _solve_integer(patterns, costs, demand, stock_qty, backend, remaining_time)
+        sheets = _plan_sheets(patterns, counts, groups, stock_sizes, gap)
+    except RuntimeError:
+        if not greedy_sheets:
+            raise
+        sheets = greedy_sheets
+    stats = plan_statistics(sheets)
+    if greedy_sheets and sheets is not greedy_sheets:
+        greedy_stats = plan_statistics(greedy_sheets)
+        if greedy_stats['total_sheet_area_m2'] < stats['total_sheet_area_m2']:
+            tally('greedy_fallback')
+            sheets, stats = greedy_sheets, greedy_stats
+    return CuttingStockPlan(sheets, lp_bound, len(patterns), iterations, time.time() - start, stats)
+
+
+def load_glass_data(filepath: str) -> List[Dict]:
+    with open(filepath, 'r') as file:
+        reader = csv.DictReader(file)
+        return [{'location': row['location'],
+                 'length': int(row['glass_length']),
+                 'height': int(row['glass_height']),
+                 'qty': int(row['glass_qty'])} for row in reader]
+
+
+def load_stock_sizes(filepath: str) -> List[Dict]:
+    with open(filepath, 'r') as file:
+        reader = csv.DictReader(file)
+        return [{'length': int(row['length']),
+                 'width': int(row['width']),
+                 'qty': int(row['qty'])} for row in reader]
+
+
+def main():
+    glass_data_file = 'data/glass_data.csv'
+    stock_sizes_file = 'data/glass_sheet_size.csv'
+    gap = 0
+
+    groups = group_parts(load_glass_data(glass_data_file))
+    stock_sizes = load_stock_sizes(stock_sizes_file)
+    plan = solve_cutting_stock(groups, stock_sizes, gap)
+    stats = plan.stats
+
+    print(f"Total stock area: {stats['total_sheet_area_m2']:.3f} sq m (LP bound {plan.lp_bound_m2:.3f} sq m)")
+    print(f"Total glass area: {stats['total_glass_area_m2']:.3f} sq m")
+    print(f"Total sheets used: {stats['total_sheets']}")
+    print(f"Used area percentage: {stats['used_area_percentage']:.2f}%")
+    print(f"Wastage percentage: {stats['wastage_percentage']:.2f}%")
+    print(f"Patterns generated: {plan.patterns_generated} in {plan.iterations} iterations ({plan.solve_time:.2f}s)")
+    print("\nSummary of sheet sizes used:")
+    for (length, width), qty in stats['sheet_counter'].items():
+        print(f"  {length}mm x {width}mm: {qty} pcs")
+    print("\nCut plan:")
+    for sheet in plan.sheets:
+        pieces = sum(block['columns'] * block['rows'] for block in sheet['blocks'])
+        print(f"  {sheet['size'][0]}mm x {sheet['size'][1]}mm: {pieces} pieces x {sheet['repeat']} sheets")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+import argparse
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from Instrumentation import phase, tally, timed
+from PackingCore import expand_placements, plan_statistics, sheet_piece_area
+
+# A free rectangle during the search: (width, height, x, y); memo keys drop the position
+Space = Tuple[int, int, int, int]
+_DISCARD = 'discard'
+
+
+@dataclass
+class PieceType:
+    """Panels of one size, merged across locations so identical panels are branched on once."""
+    length: int
+    height: int
+    parts: List[Dict] = field(default_factory=list)
+
+    @property
+    def area(self) -> int:
+        return self.length * self.height
+
+
+def piece_types(parts: Sequence[Dict]) -> List[PieceType]:
+    """Group single-piece part dicts by panel size (either orientation), largest first."""
+    types: Dict[Tuple[int, int], PieceType] = {}
+    for part in parts:
+        key = (max(part['length'], part['height']), min(part['length'], part['height']))
+        types.setdefault(key, PieceType(*key)).parts.append(part)
+    return sorted(types.values(), key=lambda t: (t.area, t.length), reverse=True)
+
+
+# --- Lower bounds ---
+
+def _dff_fekete_schepers(x: int, capacity: int, k: int) -> float:
+    scaled = x * (k + 1)
+    return x if scaled % capacity == 0 else (scaled // capacity) * capacity / k
+
+
+def _dff_large_items(x: int, capacity: int, eps: int) -> float:
+    return capacity if x > capacity - eps else (0 if x < eps else x)
+
+
+def _dff_family(sizes: Sequence[int], capacity: int, max_k: int = 4, max_eps: int = 8):
+    """Dual-feasible functions on one axis: identity, Fekete-Schepers u^k and large-item U^eps."""
+    yield lambda x: x
+    for k in range(1, max_k + 1):
+        yield lambda x, k=k: _dff_fekete_schepers(x, capacity, k)
+    small = sorted({s for s in sizes if s <= capacity // 2}, reverse=True)[:max_eps]
+    for eps in small:
+        yield lambda x, eps=eps: _dff_large_items(x, capacity, eps)
+
+
+def sheet_lower_bound(dims: Sequence[Tuple[int, int]], length: int, width: int) -> int:
+    """Lower bound on the number of length x width sheets needed for pieces `dims`.
+
+    The area bound is strengthened with pairs of dual-feasible functions, one
+    per axis. Rotation is allowed, so each piece counts with the smaller of its
+    two orientations, and an orientation that does not fit is skipped. Returns
+    a very large number if some piece fits in neither orientation.
+    """
+    orientations = []
+    for w, h in dims:
+        options = [(a, b) for a, b in ((w, h), (h, w)) if a <= length and b <= width]
+        if not options:
+            return math.inf
+        orientations.append(options)
+    xs = [a for options in orientations for a, _ in options]
+    ys = [b for options in orientations for _, b in options]
+    capacity = length * width
+    best = 0
+    for fx in _dff_family(xs, length):
+        for fy in _dff_family(ys, width):
+            total = sum(min(fx(a) * fy(b) for a, b in options) for options in orientations)
+            best = max(best, math.ceil(total / capacity - 1e-9))
+    return best
+
+
+# --- Single-sheet branch and bound ---
+
+class SearchBudget:
+    """Node and wall-clock limit for one search; past it the search finishes greedily."""
+
+    def __init__(self, node_limit: int = 50_000, deadline: Optional[float] = None):
+        self.node_limit = node_limit
+        self.deadline = deadline
+        self.nodes = 0
+        self.exhausted = False
+
+    def spend(self) -> bool:
+        """Count one expanded node; False once the budget is used up."""
+        self.nodes += 1
+        if not self.exhausted and (self.nodes >= self.node_limit or (
+                self.deadline is not None and self.nodes % 256 == 0 and time.perf_counter() > self.deadline)):
+            self.exhausted = True
+        return not self.exhausted
+
+
+class SheetSearch:
+    """Maximum occupied area of one sheet over staged guillotine patterns.
+
+    A state is the multiset of open rectangles plus the remaining count of each
+    piece type. The smallest open rectangle is either given up as waste or has
+    a piece placed in its corner, after which the L-shaped rest is split into
+    two rectangles in one of the two guillotine directions. Children are tried
+    largest piece first, and a child is skipped when its piece area plus the
+    bound min(open area, remaining piece area) cannot beat the node's best.
+    Results are memoized per state, so the same sub-rectangle with the same
+    remaining pieces is solved once. Piece types merge identical panels, and
+    squares and full-width placements are not branched on twice.
+
+    Pieces occupy (length + gap) x (height + gap), the repo-wide kerf
+    convention, so areas here include the kerf.
+    """
+
+    def __init__(self, types: List[PieceType], gap: int, budget: SearchBudget):
+        self.types = types
+        self.dims = [(t.length + gap, t.height + gap) for t in types]
+        self.areas = [w * h for w, h in self.dims]
+        self.budget = budget
+        self.memo: Dict[Tuple, Tuple[int, Optional[Tuple]]] = {}
+
+    def _fits_any(self, w: int, h: int, counts: Tuple[int, ...]) -> bool:
+        for t, count in enumerate(counts):
+            if count:
+                a, b = self.dims[t]
+                if (a <= w and b <= h) or (b <= w and a <= h):
+                    return True
+        return False
+
+    def _normalize(self, spaces: List[Space], counts: Tuple[int, ...]) -> Tuple[Space, ...]:
+        """Drop rectangles no remaining piece fits and order the rest smallest first."""
+        return tuple(sorted(s for s in spaces if s[0] > 0 and s[1] > 0 and self._fits_any(s[0], s[1], counts)))
+
+    @staticmethod
+    def _key(spaces: Tuple[Space, ...], counts: Tuple[int, ...]) -> Tuple:
+        return tuple((s[0], s[1]) for s in spaces), counts
+
+    def _bound(self, spaces: Tuple[Space, ...], counts: Tuple[int, ...]) -> int:
+        return min(sum(s[0] * s[1] for s in spaces), sum(a * c for a, c in zip(self.areas, counts)))
+
+    def _children(self, space: Space, counts: Tuple[int, ...]):
+        """(type, placed w, placed h, the two new rectangles) for every placement in `space`."""
+        w, h, x, y = space
+        for t, count in enumerate(counts):
+            if not count:
+                continue
+            a, b = self.dims[t]
+            for pw, ph in ((a, b), (b, a)) if a != b else ((a, b),):
+                if pw > w or ph > h:
+                    continue
+                # Cut along the piece's right edge first, or along its top edge first
+                splits = [((w - pw, h, x + pw, y), (pw, h - ph, x, y + ph))]
+                if pw < w and ph < h:
+                    splits.append(((w - pw, ph, x + pw, y), (w, h - ph, x, y + ph)))
+                for split, rects in enumerate(splits):
+                    yield t, pw, ph, split, rects
+
+    def best(self, spaces: Tuple[Space, ...], counts: Tuple[int, ...]) -> int:
+        key = self._key(spaces, counts)
+        cached = self.memo.get(key)
+        if cached is not None:
+            return cached[0]
+        if not spaces:
+            self.memo[key] = (0, None)
+            return 0
+
+        bound = self._bound(spaces, counts)
+        explore = self.budget.spend()
+        first, rest = spaces[0], list(spaces[1:])
+        best_value, best_choice = 0, None
+        for t, pw, ph, split, rects in self._children(first, counts):
+            child_counts = counts[:t] + (counts[t] - 1,) + counts[t + 1:]
+            child = self._normalize(rest + list(rects), child_counts)
+            if self.areas[t] + self._bound(child, child_counts) <= best_value:
+                continue
+            value = self.areas[t] + self.best(child, child_counts)
+            if value > best_value:
+                best_value, best_choice = value, (t, pw, ph, split)
+            if best_value >= bound or not explore:
+                break
+        if explore and best_value < bound:
+            rest_spaces = tuple(rest)
+            if self._bound(rest_spaces, counts) > best_value:
+                value = self.best(rest_spaces, counts)
+                if value > best_value:
+                    best_value, best_choice = value, (_DISCARD,)
+        self.memo[key] = (best_value, best_choice)
+        return best_value
+
+    def layout(self, spaces: Tuple[Space, ...], counts: Tuple[int, ...]) -> List[Tuple[int, int, int, int, int]]:
+        """Replay the memoized choices from a solved state as (type, x, y, w, h) placements."""
+        placements = []
+        while spaces:
+            _, choice = self.memo[self._key(spaces, counts)]
+            if choice is None:
+                break
+            first, rest = spaces[0], list(spaces[1:])
+            if choice[0] == _DISCARD:
+                spaces = tuple(rest)
+                continue
+            t, pw, ph, split = choice
+            rects = next(r for c, cw, ch, s, r in self._children(first, counts)
+                         if (c, cw, ch, s) == (t, pw, ph, split))
+            placements.append((t, first[2], first[3], pw, ph))
+            counts = counts[:t] + (counts[t] - 1,) + counts[t + 1:]
+            spaces = self._normalize(rest + list(rects), counts)
+        return placements
+
+
+@dataclass
+class SheetSolution:
+    length: int
+    width: int
+    placements: List[Tuple[int, int, int, int, int]]  # (type, x, y, w, h) with kerf
+    used: List[int]                                   # pieces taken per type
+    occupied: int                                     # area covered, kerf included
+    exact: bool                                       # search finished inside its budget
+    nodes: int
+
+
+def solve_sheet(types: List[PieceType], counts: Sequence[int], length: int, width: int, gap: int = 0,
+                budget: Optional[SearchBudget] = None) -> SheetSolution:
+    """Fill one length x width sheet from `counts` pieces of each type, maximizing covered area."""
+    budget = budget or SearchBudget()
+    search = SheetSearch(types, gap, budget)
+    counts = tuple(counts)
+    with phase('exact_sheet', size=f"{length}x{width}"):
+        root = search._normalize([(length, width, 0, 0)], counts)
+        occupied = search.best(root, counts)
+        placements = search.layout(root, counts)
+    tally('exact_nodes', budget.nodes)
+    used = [0] * len(types)
+    for t, *_ in placements:
+        used[t] += 1
+    return SheetSolution(length, width, placements, used, occupied, not budget.exhausted, budget.nodes)
+
+
+def _sheet_dict(solution: SheetSolution, types: List[PieceType], gap: int) -> Dict:
+    """Per-piece sheet dict, handing out the merged parts of each type in order."""
+    taken = [0] * len(types)
+    placements = []
+    for t, x, y, w, h in solution.placements:
+        part = types[t].parts[taken[t]]
+        taken[t] += 1
+        rotated = (w - gap, h - gap) != (part['length'], part['height'])
+        placements.append({'part': part, 'position': (x, y), 'rotated': rotated})
+    return {'size': (solution.length, solution.width), 'placements': placements}
+
+
+# --- Tail re-packing ---
+
+@dataclass
+class TailResult:
+    sheets: List[Dict]
+    tail_sheets: int        # physical sheets taken out of the plan
+    new_sheets: int         # sheets the exact search packed them into
+    area_before: int        # stock area of the tail, mm^2
+    area_after: int
+    lower_bound: int        # DFF bound on tail sheets of the largest stock size
+    exact: bool             # every single-sheet search finished inside its budget
+    nodes: int
+    elapsed: float = 0.0
+
+    @property
+    def improved(self) -> bool:
+        return self.area_after < self.area_before
+
+
+def _per_piece(sheets: List[Dict], gap: int) -> List[Dict]:
+    return [dict(next(expand_placements([sheet], gap)), repeat=sheet.get('repeat', 1)) if 'blocks' in sheet
+            else dict(sheet, repeat=sheet.get('repeat', 1)) for sheet in sheets]
+
+
+def pack_exact(parts: List[Dict], stock_sizes: List[Dict], gap: int = 0, node_limit: int = 50_000,
+               deadline: Optional[float] = None) -> Tuple[Optional[List[Dict]], bool, int]:
+    """Pack a small set of single pieces sheet by sheet with the branch-and-bound search.
+
+    Each step first looks for the smallest stock size that takes every
+    remaining piece (the DFF bound rules most sizes out without searching);
+    otherwise it fills the stock size with the best covered-area ratio.
+    Returns (sheets or None if some piece cannot be placed, exact, nodes).
+    """
+    types = piece_types(parts)
+    counts = [len(t.parts) for t in types]
+    stock = sorted(({'length': s['length'], 'width': s['width'], 'qty': s.get('qty', math.inf)}
+                    for s in stock_sizes), key=lambda s: s['length'] * s['width'])
+    sheets, exact, nodes = [], True, 0
+    while any(counts):
+        dims = [(t.length + gap, t.height + gap) for t, c in zip(types, counts) for _ in range(c)]
+        remaining = sum(w * h for w, h in dims)
+        best: Optional[SheetSolution] = None
+        for s in stock:
+            if s['qty'] <= 0:
+                continue
+            finishing = remaining <= s['length'] * s['width'] and sheet_lower_bound(dims, s['length'], s['width']) <= 1
+            solution = solve_sheet(types, counts, s['length'], s['width'], gap, SearchBudget(node_limit, deadline))
+            exact &= solution.exact
+            nodes += solution.nodes
+            if finishing and solution.occupied == remaining:
+                best = solution
+                break
+            ratio = solution.occupied / (s['length'] * s['width'])
+            if solution.occupied and (best is None or ratio > best.occupied / (best.length * best.width)):
+                best = solution
+        if best is None:
+            return None, exact, nodes
+        sheets.append(_sheet_dict(best, types, gap))
+        for t, n in enumerate(best.used):
+            types[t].parts = types[t].parts[n:]
+            counts[t] -= n
+        next(s for s in stock if (s['length'], s['width']) == (best.length, best.width))['qty'] -= 1
+    return sheets, exact, nodes
+
+
+@timed('improve_tail')
+def improve_tail(sheets: List[Dict], stock_sizes: List[Dict], gap: int = 0, fraction: float = 0.1,
+                 max_sheets: int = 8, node_limit: int = 50_000, time_limit: float = 2.0) -> TailResult:
+    """Re-pack the worst-filled sheets of a greedy plan with the exact search.
+
+    The tail is the `fraction` of physical sheets (at least one, at most
+    `max_sheets`) with the lowest utilization. Their pieces are packed again
+    by pack_exact on the stock the rest of the plan leaves free, and the new
+    sheets replace the tail only if they use less stock area. Sheets outside
+    the tail are returned unchanged (grouped sheets in per-piece form).
+    """
+    start = time.perf_counter()
+    plan = _per_piece(sheets, gap)
+    physical = sum(sheet['repeat'] for sheet in plan)
+    wanted = min(max_sheets, max(1, math.ceil(physical * fraction)))
+
+    take = [0] * len(plan)
+    for i in sorted(range(len(plan)), key=lambda i: sheet_piece_area(plan[i]) / (plan[i]['size'][0] * plan[i]['size'][1])):
+        if wanted <= 0:
+            break
+        take[i] = min(wanted, plan[i]['repeat'])
+        wanted -= take[i]
+    kept = [dict(sheet, repeat=sheet['repeat'] - n) for sheet, n in zip(plan, take) if sheet['repeat'] > n]
+    pool = [p['part'] for sheet, n in zip(plan, take) for _ in range(n) for p in sheet['placements']]
+    area_before = sum(sheet['size'][0] * sheet['size'][1] * n for sheet, n in zip(plan, take))
+
+    used: Dict[Tuple[int, int], int] = {}
+    for sheet in kept:
+        size = tuple(sheet['size'])
+        used[size] = used.get(size, 0) + sheet['repeat']
+    stock_left = [dict(s, qty=s.get('qty', math.inf) - used.get((s['length'], s['width']), 0)) for s in stock_sizes]
+    largest = max(stock_sizes, key=lambda s: s['length'] * s['width'])
+    lower_bound = sheet_lower_bound([(p['length'] + gap, p['height'] + gap) for p in pool],
+                                    largest['length'], largest['width']) if pool else 0
+
+    new, exact, nodes = pack_exact(pool, stock_left, gap, node_limit, start + time_limit)
+    tail = sum(take)
+    if new is None or sum(s['size'][0] * s['size'][1] for s in new) >= area_before:
+        return TailResult(plan, tail, tail, area_before, area_before, lower_bound, exact, nodes,
+                          time.perf_counter() - start)
+    return TailResult(kept + new, tail, len(new), area_before, sum(s['size'][0] * s['size'][1] for s in new),
+                      lower_bound, exact, nodes, time.perf_counter() - start)
+
+
+def main():
+    from Benchmark import glass_instance, repo_instance
+    from PortfolioRunner import STRATEGY_KINDS, default_strategies
+
+    parser = argparse.ArgumentParser(description="Re-pack the tail sheets of greedy plans with branch and bound.")
+    parser.add_argument('--strategies', default='maxrects_best_short_side,rectpack_MaxRectsBssf_BBF,skyline_bottom_left_area')
+    parser.add_argument('--fraction', type=float, default=0.1)
+    parser.add_argument('--time-limit', type=float, default=2.0)
+    parser.add_argument('--seeds', type=int, default=3, help="Generated glass instances besides the repo order")
+    args = parser.parse_args()
+
+    strategies = {name: (kind, options) for name, kind, options in default_strategies()}
+    instances = [repo_instance()] + [glass_instance(seed) for seed in range(args.seeds)]
+    print(f"{'Instance':<16} {'Strategy':<28} {'Tail':>4} {'New':>4} {'LB':>3} {'Saved m2':>9} "
+          f"{'Waste %':>16} {'Time (s)':>8}")
+    for instance in instances:
+        for name in args.strategies.split(','):
+            kind, options = strategies[name]
+            sheets = STRATEGY_KINDS[kind](instance.glass_parts, instance.stock_sizes, instance.gap, options)
+            before = plan_statistics(sheets)['wastage_percentage']
+            result = improve_tail(sheets, instance.stock_sizes, instance.gap, args.fraction,
+                                  time_limit=args.time_limit)
+            after = plan_statistics(result.sheets)['wastage_percentage']
+            print(f"{instance.name:<16} {name:<28} {result.tail_sheets:>4} {result.new_sheets:>4} "
+                  f"{result.lower_bound:>3} {(result.area_before - result.area_after) / 1e6:>9.2f} "
+                  f"{before:>7.2f} -> {after:>5.2f} {result.elapsed:>8.2f}{'' if result.exact else ' (budget)'}")
+
+
+if __name__ == "__main__":
+    main()
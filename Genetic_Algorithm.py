@@ -1,10 +1,14 @@
 import csv
+import os
 import random
-from typing import List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
-import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle
-from matplotlib.backends.backend_pdf import PdfPages
+from Instrumentation import phase, tally, timed
+from LayoutRenderer import render_pdf
+from MaxRectsEngine import FreeRectIndex
+from PlacementStore import PlacementTable
+from RemnantInventory import RemnantInventory
 
 @dataclass
 class Part:
@@ -21,11 +25,20 @@ class Placement:
     rotated: bool
 
 class Sheet:
-    def __init__(self, length: int, width: int):
+    def __init__(self, length: int, width: int, rule: Optional[str] = None):
         self.length = length
         self.width = width
         self.placements: List[Placement] = []
-        self.remaining_space = [(0, 0, length, width)]
+        # A scoring rule switches to the vectorized free-space arrays (NumPy is only loaded then)
+        if rule:
+            from VectorPlacement import FreeRectArray
+            self.free_space = FreeRectArray(length, width, rule)
+        else:
+            self.free_space = FreeRectIndex(length, width)
+
+    @property
+    def remaining_space(self) -> List[Tuple[int, int, int, int]]:
+        return self.free_space.rects()
 
     def add_part(self, part: Part, x: int, y: int, rotated: bool):
         actual_length = part.height if rotated else part.length
@@ -33,21 +46,7 @@ class Sheet:
         self.placements.append(Placement(part, x, y, rotated))
 
         # Update remaining space after placing the part
-        new_remaining = []
-        for space in self.remaining_space:
-            sx, sy, sl, sh = space
-            if x < sx + sl and y < sy + sh:
-                if y > sy:
-                    new_remaining.append((sx, sy, sl, y - sy))
-                if y + actual_height < sy + sh:
-                    new_remaining.append((sx, y + actual_height, sl, sy + sh - (y + actual_height)))
-                if x > sx:
-                    new_remaining.append((sx, max(sy, y), x - sx, min(sh, actual_height)))
-                if x + actual_length < sx + sl:
-                    new_remaining.append((x + actual_length, max(sy, y), sx + sl - (x + actual_length), min(sh, actual_height)))
-            else:
-                new_remaining.append(space)
-        self.remaining_space = new_remaining
+        self.free_space.place(x, y, actual_length, actual_height)
 
 def load_glass_data(filepath: str) -> List[Part]:
     with open(filepath, 'r') as file:
@@ -60,80 +59,215 @@ def load_stock_sizes(filepath: str) -> List[Tuple[int, int]]:
         return [(int(row['length']), int(row['width'])) for row in reader]
 
 def find_best_fit(sheet: Sheet, part: Part) -> Tuple[int, int, bool]:
-    best_fit = None
-    min_waste = float('inf')
-    
-    for space in sheet.remaining_space:
-        x, y, w, h = space
-        for rotated in (False, True):
-            pl, ph = (part.height, part.length) if rotated else (part.length, part.height)
-            if pl <= w and ph <= h:
-                waste = w * h - pl * ph
-                if waste < min_waste:
-                    min_waste = waste
-                    best_fit = (x, y, rotated)
-    
+    # Smallest free rect that fits (least waste), or the sheet's scoring rule
+    best_fit = sheet.free_space.find(part.length, part.height)
     return best_fit if best_fit else (-1, -1, False)
 
-def genetic_heuristic_optimization(parts: List[Part], stock_sizes: List[Tuple[int, int]], population_size: int = 5, generations: int = 20) -> List[Sheet]:
-    def initialize_population():
-        population = []
-        for _ in range(population_size):
-            layout = optimize_cutting_heuristic(parts.copy(), stock_sizes)
-            population.append(layout)
-        return population
+# A genome is (order, rotations): the order in which part types are offered to
+# each sheet and whether each type is tried rotated first.
+Genome = Tuple[Tuple[int, ...], Tuple[bool, ...]]
+
+_WORKER_JOB = None
+
+def _init_worker(parts_spec, stock_sizes):
+    global _WORKER_JOB
+    _WORKER_JOB = (parts_spec, stock_sizes)
+
+def _fill_sheet(genome: Genome, parts_spec, demand: List[int], length: int, width: int):
+    """Place the remaining demand on one sheet in genome order, tiling runs of one part type."""
+    order, rotations = genome
+    free_space = FreeRectIndex(length, width)
+    placements = []
+    used = [0] * len(parts_spec)
+    used_area = 0
+    for i in order:
+        pl, ph = parts_spec[i][0], parts_spec[i][1]
+        if rotations[i]:
+            pl, ph = ph, pl
+        while demand[i] - used[i] > 0:
+            fit = free_space.find_rect(pl, ph)
+            if fit is None:
+                break
+            (x, y, w, h), flipped = fit
+            bl, bh = (ph, pl) if flipped else (pl, ph)
+            remaining = demand[i] - used[i]
+            columns = min(w // bl, remaining)
+            rows = min(h // bh, remaining // columns)
+            for row in range(rows):
+                for column in range(columns):
+                    placements.append((i, x + column * bl, y + row * bh, rotations[i] != flipped))
+            free_space.place(x, y, columns * bl, rows * bh)
+            used[i] += columns * rows
+            used_area += columns * rows * pl * ph
+    return placements, used, used_area
+
+def decode_genome(genome: Genome, parts_spec, stock_sizes: List[Tuple[int, int]]):
+    """Decode a genome into sheet patterns: [(stock index, placements, repeat)]."""
+    demand = [qty for _, _, qty in parts_spec]
+    patterns = []
+    while any(demand):
+        best = None
+        for s, (length, width) in enumerate(stock_sizes):
+            placements, used, used_area = _fill_sheet(genome, parts_spec, demand, length, width)
+            utilization = used_area / (length * width)
+            if placements and (best is None or utilization > best[0]):
+                best = (utilization, s, placements, used)
+        if best is None:
+            raise ValueError("Parts do not fit on any stock sheet")
+        _, s, placements, used = best
+        # Repeat the sheet while every part type on it still has demand
+        repeat = min(demand[i] // count for i, count in enumerate(used) if count)
+        for i, count in enumerate(used):
+            demand[i] -= count * repeat
+        patterns.append((s, placements, repeat))
+    return patterns
+
+def genome_fitness(genome: Genome, parts_spec=None, stock_sizes=None) -> float:
+    """Material utilization, with a small bonus for consolidating parts onto full sheets."""
+    if parts_spec is None:
+        parts_spec, stock_sizes = _WORKER_JOB
+    patterns = decode_genome(genome, parts_spec, stock_sizes)
+    total_sheet_area = 0
+    used_area = 0
+    consolidation = 0.0
+    sheet_count = 0
+    for s, placements, repeat in patterns:
+        sheet_area = stock_sizes[s][0] * stock_sizes[s][1]
+        area = sum(parts_spec[i][0] * parts_spec[i][1] for i, _, _, _ in placements)
+        total_sheet_area += sheet_area * repeat
+        used_area += area * repeat
+        consolidation += (area / sheet_area) ** 2 * repeat
+        sheet_count += repeat
+    return used_area / total_sheet_area + 0.001 * consolidation / sheet_count
 
-    def fitness(sheets: List[Sheet]) -> float:
-        total_sheet_area = sum(sheet.length * sheet.width for sheet in sheets)
-        used_area = sum(
-            placement.part.length * placement.part.height
-            for sheet in sheets
-            for placement in sheet.placements
-        )
-        return used_area / total_sheet_area if total_sheet_area > 0 else 0
+def _order_crossover(order1: Tuple[int, ...], order2: Tuple[int, ...]) -> Tuple[int, ...]:
+    """OX1: keep a slice of the first parent, fill the rest in the second parent's order."""
+    size = len(order1)
+    a, b = sorted(random.sample(range(size + 1), 2))
+    kept = set(order1[a:b])
+    rest = [gene for gene in order2 if gene not in kept]
+    return tuple(rest[:a]) + order1[a:b] + tuple(rest[a:])
 
-    def crossover(parent1: List[Sheet], parent2: List[Sheet]) -> List[Sheet]:
-        split = len(parent1) // 2
-        child = parent1[:split] + parent2[split:]
-        return child
+def _crossover(parent1: Genome, parent2: Genome) -> Genome:
+    order = _order_crossover(parent1[0], parent2[0]) if len(parent1[0]) > 1 else parent1[0]
+    rotations = tuple(random.choice(pair) for pair in zip(parent1[1], parent2[1]))
+    return order, rotations
 
-    def mutate(sheets: List[Sheet]):
-        if sheets:
-            random_sheet = random.choice(sheets)
-            if random_sheet.placements:
-                random_sheet.placements.pop(random.randint(0, len(random_sheet.placements) - 1))
+def _mutate(genome: Genome) -> Genome:
+    order, rotations = list(genome[0]), list(genome[1])
+    roll = random.random()
+    if roll < 0.4 and len(order) > 1:
+        i, j = random.sample(range(len(order)), 2)
+        order[i], order[j] = order[j], order[i]
+    elif roll < 0.7 and len(order) > 1:
+        i, j = sorted(random.sample(range(len(order) + 1), 2))
+        order[i:j] = reversed(order[i:j])
+    else:
+        i = random.randrange(len(rotations))
+        rotations[i] = not rotations[i]
+    return tuple(order), tuple(rotations)
 
-    population = initialize_population()
+def _tournament(population: List[Genome], scores: Dict[Genome, float], size: int = 3) -> Genome:
+    return max(random.sample(population, min(size, len(population))), key=scores.__getitem__)
 
-    for generation in range(generations):
-        population.sort(key=fitness, reverse=True)
-        best_fitness = fitness(population[0])
+@timed('genetic_heuristic_optimization')
+def genetic_heuristic_optimization(parts: List[Part], stock_sizes: List[Tuple[int, int]], population_size: int = 5, generations: int = 20,
+                                   mutation_rate: float = 0.2, patience: int = 10, workers: Optional[int] = None,
+                                   seed: Optional[int] = None, verbose: bool = True) -> List[Sheet]:
+    """Permutation/rotation GA decoded by the MaxRects block placer.
 
-        print(f"Generation {generation + 1}, Best Fitness: {best_fitness:.4f}")
+    Fitness is cached per genome, new genomes of a generation are decoded as one
+    batch on a process pool, and the search stops after `patience` generations
+    without improvement. The input parts are not modified.
+    """
+    rng_state = random.getstate()
+    if seed is not None:
+        random.seed(seed)
+    parts = [part for part in parts if part.quantity > 0]
+    parts_spec = [(part.length, part.height, part.quantity) for part in parts]
+    n = len(parts_spec)
+    if n == 0:
+        return []
 
-        next_generation = population[:1]
+    # Seed with the area-descending heuristic in both orientations, the rest random
+    by_area = tuple(sorted(range(n), key=lambda i: parts_spec[i][0] * parts_spec[i][1], reverse=True))
+    population: List[Genome] = [(by_area, (False,) * n), (by_area, (True,) * n)]
+    while len(population) < population_size:
+        order = list(range(n))
+        random.shuffle(order)
+        population.append((tuple(order), tuple(random.random() < 0.5 for _ in range(n))))
+    population = population[:max(population_size, 1)]
 
-        while len(next_generation) < population_size:
-            parent1, parent2 = random.sample(population[:3], 2)
-            child = crossover(parent1, parent2)
-            if random.random() < 0.1:
-                mutate(child)
-            next_generation.append(child)
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(parts_spec, stock_sizes)) if workers > 1 else None
+    scores: Dict[Genome, float] = {}
 
-        population = next_generation
+    def evaluate(genomes: List[Genome]):
+        batch = list({genome for genome in genomes if genome not in scores})
+        if not batch:
+            return
+        tally('fitness_evaluations', len(batch))
+        if executor is None:
+            results = [genome_fitness(genome, parts_spec, stock_sizes) for genome in batch]
+        else:
+            results = executor.map(genome_fitness, batch, chunksize=max(1, len(batch) // (workers * 4)))
+        scores.update(zip(batch, results))
 
-        if len(next_generation) > 1 and fitness(next_generation[0]) == best_fitness:
-            print("Early stopping triggered: no improvement in fitness.")
-            break
+    try:
+        evaluate(population)
+        best = max(population, key=scores.__getitem__)
+        stale = 0
+        for generation in range(generations):
+            population.sort(key=scores.__getitem__, reverse=True)
+            best_fitness = scores[population[0]]
 
-    return max(population, key=fitness)
+            if verbose:
+                print(f"Generation {generation + 1}, Best Fitness: {best_fitness:.4f}")
 
-def optimize_cutting_heuristic(parts: List[Part], stock_sizes: List[Tuple[int, int]]) -> List[Sheet]:
+            elite = max(1, population_size // 10)
+            next_generation = population[:elite]
+            while len(next_generation) < population_size:
+                child = _crossover(_tournament(population, scores), _tournament(population, scores))
+                if random.random() < mutation_rate:
+                    child = _mutate(child)
+                next_generation.append(child)
+            with phase('generation', generation=generation + 1, new=len(next_generation)):
+                evaluate(next_generation)
+            population = next_generation
+
+            generation_best = max(population, key=scores.__getitem__)
+            if scores[generation_best] > scores[best] + 1e-9:
+                best, stale = generation_best, 0
+            else:
+                stale += 1
+                if stale >= patience:
+                    if verbose:
+                        print("Early stopping triggered: no improvement in fitness.")
+                    break
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if seed is not None:
+            random.setstate(rng_state)
+
+    # Rebuild Sheet objects for the winner only
+    sheets = []
+    for s, placements, repeat in decode_genome(best, parts_spec, stock_sizes):
+        for _ in range(repeat):
+            sheet = Sheet(*stock_sizes[s])
+            for i, x, y, rotated in placements:
+                sheet.add_part(parts[i], x, y, rotated)
+            sheets.append(sheet)
+    return sheets
+
+@timed('optimize_cutting_heuristic')
+def optimize_cutting_heuristic(parts: List[Part], stock_sizes: List[Tuple[int, int]], rule: Optional[str] = None) -> List[Sheet]:
+    """Greedy best-fit decreasing; `rule` selects a VectorPlacement scoring rule."""
     sheets = []
     parts.sort(key=lambda p: p.length * p.height, reverse=True)
     
     while parts:
-        sheet = Sheet(*stock_sizes[0])
+        sheet = Sheet(*stock_sizes[0], rule=rule)
         for part in parts[:]:
             for _ in range(part.quantity):
                 x, y, rotated = find_best_fit(sheet, part)
@@ -142,37 +276,49 @@ def optimize_cutting_heuristic(parts: List[Part], stock_sizes: List[Tuple[int, i
                     part.quantity -= 1
                     if part.quantity == 0:
                         parts.remove(part)
+                else:
+                    # Identical units will not fit either
+                    break
         sheets.append(sheet)
     return sheets
 
+def sheets_to_table(sheets: List[Sheet]) -> PlacementTable:
+    """Flatten Sheet objects into a PlacementTable with each Part interned once."""
+    table = PlacementTable()
+    for sheet in sheets:
+        s = table.add_sheet(sheet.length, sheet.width)
+        for placement in sheet.placements:
+            part = placement.part
+            w, h = (part.height, part.length) if placement.rotated else (part.length, part.height)
+            table.append(s, table.intern_part(part.location, part.length, part.height),
+                         placement.x, placement.y, w, h, placement.rotated)
+    return table
+
+def record_offcuts(sheets: List[Sheet], inventory: RemnantInventory, source: str = '') -> int:
+    """Store the usable leftovers of finished sheets in the remnant inventory; returns how many."""
+    recorded = 0
+    for sheet in sheets:
+        rects = [(p.x, p.y, p.part.height, p.part.length) if p.rotated else (p.x, p.y, p.part.length, p.part.height)
+                 for p in sheet.placements]
+        recorded += len(inventory.record_sheet(sheet.length, sheet.width, rects, source=source))
+    return recorded
+
 def visualize_sheets(sheets: List[Sheet], output_pdf: str):
-    with PdfPages(output_pdf) as pdf:
-        for i, sheet in enumerate(sheets):
-            fig, ax = plt.subplots(figsize=(8, 6))
-            ax.set_xlim(0, sheet.length)
-            ax.set_ylim(0, sheet.width)
-            ax.set_title(f"Sheet {i + 1}: {sheet.length}x{sheet.width}")
-            for placement in sheet.placements:
-                color = f"#{random.randint(0, 0xFFFFFF):06x}"
-                actual_length = placement.part.height if placement.rotated else placement.part.length
-                actual_height = placement.part.length if placement.rotated else placement.part.height
-                rect = Rectangle((placement.x, placement.y), actual_length, actual_height, edgecolor="black", facecolor=color, alpha=0.7)
-                ax.add_patch(rect)
-                ax.text(placement.x + actual_length / 2, placement.y + actual_height / 2, placement.part.location,
-                        ha="center", va="center", fontsize=8, color="white")
-            pdf.savefig(fig)
-            plt.close()
+    # Identical sheets are drawn once; the page title lists the sheet numbers
+    render_pdf(sheets_to_table(sheets), output_pdf)
 
 def main():
     # File paths
     glass_data_file = 'glass_data.csv'
     stock_sizes_file = 'glass_sheet_size.csv'
 
-    parts = load_glass_data(glass_data_file)
-    stock_sizes = load_stock_sizes(stock_sizes_file)
+    with phase('load'):
+        parts = load_glass_data(glass_data_file)
+        stock_sizes = load_stock_sizes(stock_sizes_file)
 
     optimized_layout = genetic_heuristic_optimization(parts, stock_sizes)
-    visualize_sheets(optimized_layout, "optimized_layout.pdf")
+    with phase('render'):
+        visualize_sheets(optimized_layout, "optimized_layout.pdf")
     print("Optimization complete. Results saved to 'optimized_layout.pdf'.")
 
 if __name__ == "__main__":
@@ -1,11 +1,11 @@
-import pandas as pd
-import numpy as np
 from dataclasses import dataclass
 from typing import List, Tuple, Optional
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
 import os
 from datetime import datetime
+from CutListIngest import read_table
+from Instrumentation import timed
+from LayoutRenderer import render_pdf
+from PlacementStore import PlacementTable
 
 @dataclass
 class Panel:
@@ -26,15 +26,8 @@ class GlassCuttingIO:
     def load_stock_sizes(file_path: str) -> List[Stock]:
         """Load stock sizes from CSV file"""
         try:
-            df = pd.read_csv(file_path)
-            stocks = []
-            for _, row in df.iterrows():
-                stock = Stock(
-                    length=float(row['length']),
-                    width=float(row['width']),
-                    quantity=int(row['qty'])
-                )
-                stocks.append(stock)
+            table = read_table(file_path, schema='stock')
+            stocks = [Stock(length=row.length, width=row.height, quantity=row.qty) for row in table]
             return stocks
         except FileNotFoundError:
             raise FileNotFoundError(f"Stock sizes file not found: {file_path}")
@@ -45,17 +38,9 @@ class GlassCuttingIO:
     def load_glass_data(file_path: str) -> List[Panel]:
         """Load panel requirements from CSV file"""
         try:
-            df = pd.read_csv(file_path)
-            panels = []
-            for _, row in df.iterrows():
-                panel = Panel(
-                    length=float(row['glass_length']),
-                    height=float(row['glass_height']),
-                    quantity=int(row['glass_qty']),
-                    location=str(row['location']),
-                    area_sqm=float(row['area_sqm'])
-                )
-                panels.append(panel)
+            table = read_table(file_path, schema='glass')
+            panels = [Panel(length=row.length, height=row.height, quantity=row.qty, location=row.label,
+                            area_sqm=row.area_sqm) for row in table]
             return panels
         except FileNotFoundError:
             raise FileNotFoundError(f"Glass data file not found: {file_path}")
@@ -68,15 +53,50 @@ class OptimizationResult:
         self.total_sheets = total_sheets
         self.efficiency = efficiency
 
+    def placement_table(self) -> PlacementTable:
+        """The placements as a compact PlacementTable, one sheet per sheet_number."""
+        return PlacementTable.from_flat_placements(self.placements)
+
 class GlassCuttingOptimizer:
-    def __init__(self, stocks: List[Stock], cut_width: float = 5):  # 5mm cutting width
+    def __init__(self, stocks: List[Stock], cut_width: float = 5, plan_mix: bool = False):  # 5mm cutting width
         self.stocks = stocks
         self.cut_width = cut_width
-        
+        self.plan_mix = plan_mix
+
+    def stock_sequence(self, panels: List[Panel]) -> List[Stock]:
+        """Stocks in the order sheets are opened.
+
+        Without plan_mix this is the given order. With it, the sheets of the
+        mix from StockSelection.plan_stock_mix come first, largest sheets first
+        since the tallest panels are placed first, followed by the given stocks
+        as a fallback for whatever the mix estimate did not cover.
+        """
+        if not self.plan_mix:
+            return self.stocks
+        from StockSelection import plan_stock_mix
+        glass_parts = [{'location': p.location, 'length': p.length, 'height': p.height, 'qty': p.quantity}
+                       for p in panels]
+        stock_sizes = [{'length': s.length, 'width': s.width, 'qty': s.quantity} for s in self.stocks]
+        mix = plan_stock_mix(glass_parts, stock_sizes, gap=self.cut_width)
+        planned = sorted(mix.order(), key=lambda item: -item[0][0] * item[0][1])
+        return [Stock(length, width, n) for (length, width), n in planned] + self.stocks
+
+    @timed('GlassCuttingOptimizer.optimize')
     def optimize(self, panels: List[Panel]) -> OptimizationResult:
         """Optimize cutting layout for all panels"""
+        stocks = self.stock_sequence(panels)
         all_placements = []
-        sheets_used = {f"{stock.length}x{stock.width}": 0 for stock in self.stocks}
+        sheets_used = {f"{stock.length}x{stock.width}": 0 for stock in stocks}
+        # Mix entries draw on the same physical sheets as the stock entry of their size
+        available = {}
+        for stock in self.stocks:
+            key = f"{stock.length}x{stock.width}"
+            available[key] = available.get(key, 0) + stock.quantity
+        entry_used = [0] * len(stocks)
+
+        def exhausted(index: int) -> bool:
+            key = f"{stocks[index].length}x{stocks[index].width}"
+            return entry_used[index] >= stocks[index].quantity or sheets_used[key] >= available[key]
         total_panel_area = 0
         total_sheet_area = 0
         
@@ -88,6 +108,10 @@ class GlassCuttingOptimizer:
         sorted_panels.sort(key=lambda x: (x[1], x[0]), reverse=True)
         
         current_stock_idx = 0
+        while current_stock_idx < len(stocks) and exhausted(current_stock_idx):
+            current_stock_idx += 1
+        if current_stock_idx >= len(stocks):
+            raise ValueError("Not enough stock sheets available")
         current_sheet = 0
         x, y = 0, 0
         max_height = 0
@@ -96,7 +120,7 @@ class GlassCuttingOptimizer:
             placed = False
             
             while not placed:
-                stock = self.stocks[current_stock_idx]
+                stock = stocks[current_stock_idx]
                 
                 # Add cutting width
                 effective_length = panel_length + self.cut_width
@@ -130,12 +154,13 @@ class GlassCuttingOptimizer:
                 # Try next sheet
                 else:
                     sheets_used[f"{stock.length}x{stock.width}"] += 1
+                    entry_used[current_stock_idx] += 1
                     total_sheet_area += stock.length * stock.width
                     
-                    # Check if we need to switch to a different stock size
-                    if sheets_used[f"{stock.length}x{stock.width}"] >= stock.quantity:
+                    # Switch to the next stock entry that still has sheets of its size left
+                    while exhausted(current_stock_idx):
                         current_stock_idx += 1
-                        if current_stock_idx >= len(self.stocks):
+                        if current_stock_idx >= len(stocks):
                             raise ValueError("Not enough stock sheets available")
                     
                     current_sheet += 1
@@ -151,96 +176,26 @@ class GlassCuttingOptimizer:
         efficiency = (total_panel_area / total_sheet_area) * 100
         return OptimizationResult(all_placements, sheets_used, efficiency)
 
+    @timed('GlassCuttingOptimizer.export_visualization')
     def export_visualization(self, result: OptimizationResult, output_dir: str = 'output'):
         """Export cutting layout visualization to PDF"""
         os.makedirs(output_dir, exist_ok=True)
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         pdf_path = os.path.join(output_dir, f'glass_cutting_layout_{timestamp}.pdf')
         
-        with PdfPages(pdf_path) as pdf:
-            # Summary page
-            plt.figure(figsize=(11.7, 8.3))  # A4 landscape
-            plt.axis('off')
-            
-            summary_text = [
-                "Glass Cutting Optimization Summary",
-                "=" * 50,
-                f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-                f"Overall Efficiency: {result.efficiency:.1f}%",
-                "\nStock Sheets Used:",
-            ]
-            
-            for size, count in result.total_sheets.items():
-                if count > 0:
-                    length, width = map(float, size.split('x'))
-                    summary_text.append(
-                        f"- {count} sheets of {length}mm × {width}mm"
-                    )
-            
-            plt.text(0.1, 0.95, '\n'.join(summary_text),
-                    transform=plt.gca().transAxes,
-                    fontsize=10, family='monospace',
-                    verticalalignment='top')
-            
-            pdf.savefig()
-            plt.close()
-            
-            # Cutting layouts by sheet
-            sheet_groups = {}
-            for placement in result.placements:
-                key = (placement['sheet_size'], placement['sheet_number'])
-                if key not in sheet_groups:
-                    sheet_groups[key] = []
-                sheet_groups[key].append(placement)
-            
-            for (sheet_size, sheet_number), placements in sheet_groups.items():
-                length, width = map(float, sheet_size.split('x'))
-                
-                # Calculate figure size to maintain aspect ratio
-                fig_width = min(11.7, length / 200)  # A4 landscape width in inches
-                fig_height = fig_width * (width / length)
-                
-                fig, ax = plt.subplots(figsize=(fig_width, fig_height))
-                
-                # Draw stock sheet
-                ax.add_patch(plt.Rectangle((0, 0), length, width,
-                                         fill=False, color='black'))
-                
-                # Draw panels
-                colors = plt.cm.Set3(np.linspace(0, 1, len(placements)))
-                for placement, color in zip(placements, colors):
-                    ax.add_patch(plt.Rectangle(
-                        (placement['x'], placement['y']),
-                        placement['length'],
-                        placement['height'],
-                        fill=True,
-                        color=color,
-                        alpha=0.5
-                    ))
-                    
-                    # Add label
-                    ax.text(
-                        placement['x'] + placement['length']/2,
-                        placement['y'] + placement['height']/2,
-                        f"{placement['location']}\n{placement['length']}×{placement['height']}",
-                        horizontalalignment='center',
-                        verticalalignment='center',
-                        fontsize=8,
-                        wrap=True
-                    )
-                
-                ax.set_xlim(-50, length + 50)
-                ax.set_ylim(-50, width + 50)
-                ax.set_aspect('equal')
-                ax.set_title(f'Sheet {sheet_number + 1} ({sheet_size}mm)')
-                
-                # Add dimensions
-                ax.text(length/2, -30, f'{length}mm', horizontalalignment='center')
-                ax.text(-30, width/2, f'{width}mm', verticalalignment='center',
-                       rotation=90)
-                
-                pdf.savefig(fig, bbox_inches='tight')
-                plt.close()
+        summary = [
+            "Glass Cutting Optimization Summary",
+            f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+            f"Overall Efficiency: {result.efficiency:.1f}%",
+            "Stock Sheets Used:",
+        ]
+        for size, count in result.total_sheets.items():
+            if count > 0:
+                length, width = map(float, size.split('x'))
+                summary.append(f"- {count} sheets of {length}mm × {width}mm")
+        
+        # Repeated layouts are drawn once; the page title lists the sheet numbers
+        render_pdf(result.placement_table(), pdf_path, summary=summary)
         
         print(f"PDF exported to: {pdf_path}")
         return pdf_path
\ No newline at end of file
@@ -1,6 +1,9 @@
 import csv
-from typing import List, Dict
 from collections import Counter
+from typing import List, Dict, Optional
+from Instrumentation import phase, tally, timed
+from PackingCore import group_parts, pack_groups, expand_placements, plan_statistics
+from StockSelection import StockMix, can_skip, utilization_bounds
 
 def load_glass_data(filepath: str) -> List[Dict]:
     with open(filepath, 'r') as file:
@@ -23,7 +26,41 @@ def expand_parts(glass_parts: List[Dict]) -> List[Dict]:
         expanded_parts.extend([{'location': part['location'], 'length': part['length'], 'height': part['height']} for _ in range(part['qty'])])
     return expanded_parts
 
-def calculate_layout(parts: List[Dict], stock_sizes: List[Dict], gap: int) -> List[Dict]:
+@timed('calculate_layout')
+def calculate_layout(parts: List[Dict], stock_sizes: List[Dict], gap: int, rule: Optional[str] = None,
+                     prune: bool = True, mix: Optional[StockMix] = None) -> List[Dict]:
+    """First-fit free-space layout, or scored MaxRects placement when `rule` is given.
+
+    Rules are the VectorPlacement scoring rules (best_area, best_short_side,
+    best_long_side, bottom_left, contact_point).
+
+    Each new sheet goes to the stock size with the best utilization. A part
+    size that finds no room on a sheet is not tried on it again, since the
+    free space only shrinks. With `prune`, sizes are tried in order of their
+    StockSelection utilization bound and a size whose bound cannot beat the
+    best sheet so far is not packed at all. A sheet being packed is abandoned
+    as soon as its glass plus the glass of the parts still able to join it
+    cannot beat that sheet either. The chosen sheets are the same as without
+    pruning. The first-fit path can place overlapping parts, so it only gets
+    the plain area bounds, not the ones capped by the free area.
+
+    A `mix` from StockSelection.plan_stock_mix restricts each sheet to the
+    sizes the mix still has sheets of; once the mix is used up, or none of its
+    sizes takes a part, every size is tried again. The mix is only a candidate:
+    the unrestricted layout is computed too, and the mix layout is returned
+    only if it uses no more stock area.
+    """
+    sheets = _layout(parts, stock_sizes, gap, rule, prune)
+    if mix is None:
+        return sheets
+    planned = _layout(parts, stock_sizes, gap, rule, prune, mix)
+    if plan_statistics(planned)['total_sheet_area_m2'] <= plan_statistics(sheets)['total_sheet_area_m2']:
+        return planned
+    tally('stock_mix_rejected')
+    return sheets
+
+def _layout(parts: List[Dict], stock_sizes: List[Dict], gap: int, rule: Optional[str], prune: bool,
+            mix: Optional[StockMix] = None) -> List[Dict]:
     def can_fit(part, space):
         return (part['length'] <= space[2] and part['height'] <= space[3]) or \
                (part['height'] <= space[2] and part['length'] <= space[3])
@@ -31,47 +68,109 @@ def calculate_layout(parts: List[Dict], stock_sizes: List[Dict], gap: int) -> Li
     def place_part(part, position, rotated):
         return {'part': part, 'position': position, 'rotated': rotated}
 
+    if rule:
+        from VectorPlacement import FreeRectArray
+
     sheets = []
     remaining_parts = parts.copy()
+    mix_left = dict(mix.counts) if mix else {}
 
     while remaining_parts:
         best_utilization = 0
         best_sheet = None
         best_placement = None
-
-        for stock in stock_sizes:
+        best_index = None
+        part_counts = Counter((part['length'], part['height']) for part in remaining_parts)
+        glass_left = sum(length * height * count for (length, height), count in part_counts.items())
+
+        planned = [i for i, stock in enumerate(stock_sizes) if mix_left.get((stock['length'], stock['width']), 0) > 0]
+        candidates = planned or list(range(len(stock_sizes)))
+        tally('stock_sizes_outside_mix', len(stock_sizes) - len(candidates))
+        if prune:
+            bounds = utilization_bounds(remaining_parts, [stock_sizes[i] for i in candidates], gap, relax=bool(rule))
+            bounds = dict(zip(candidates, bounds))
+            candidates = sorted(candidates, key=lambda i: (-bounds[i], i))
+        for index in candidates:
+            if prune and can_skip(bounds[index], index, best_utilization, best_index):
+                tally('stock_sizes_pruned')
+                continue
+            stock = stock_sizes[index]
+            capacity = stock['length'] * stock['width']
             sheet = {'size': (stock['length'], stock['width']), 'placements': []}
             available_space = [(0, 0, stock['length'], stock['width'])]
-
+            if rule:
+                # Score every free rect in both orientations in one vectorized pass
+                free_space = FreeRectArray(stock['length'], stock['width'], rule)
+
+            # Glass placed, free area left, and glass of the untried parts whose size has not failed yet
+            placed_area, free_area, open_area = 0, capacity, glass_left
+            untried = Counter(part_counts)
+            failed = set()
             for part in remaining_parts:
-                best_fit = None
-                for i, space in enumerate(available_space):
-                    if can_fit(part, space):
-                        rotated = part['height'] <= space[2] and part['length'] > space[2]
-                        best_fit = (i, space, rotated)
-                        break
-
-                if best_fit:
-                    i, space, rotated = best_fit
-                    x, y = space[0], space[1]
-                    w, h = (part['height'], part['length']) if rotated else (part['length'], part['height'])
+                size = (part['length'], part['height'])
+                untried[size] -= 1
+                if size in failed:
+                    continue
+                reachable = placed_area + (min(open_area, free_area) if rule else open_area)
+                if prune and can_skip(reachable / capacity * (1 + 1e-12), index, best_utilization, best_index):
+                    tally('sheets_abandoned')
+                    sheet = None
+                    break
+                area = size[0] * size[1]
+                open_area -= area
+
+                if rule:
+                    fit = free_space.find(part['length'] + gap, part['height'] + gap)
+                    if fit:
+                        x, y, rotated = fit
+                        w, h = (part['height'], part['length']) if rotated else (part['length'], part['height'])
+                        free_space.place(x, y, w + gap, h + gap)
+                else:
+                    fit = None
+                    for i, space in enumerate(available_space):
+                        if can_fit(part, space):
+                            rotated = part['height'] <= space[2] and part['length'] > space[2]
+                            fit = (i, space, rotated)
+                            break
+
+                    if fit:
+                        i, space, rotated = fit
+                        x, y = space[0], space[1]
+                        w, h = (part['height'], part['length']) if rotated else (part['length'], part['height'])
+
+                        # Update available space
+                        del available_space[i]
+                        if x + w + gap < stock['length']:
+                            available_space.append((x + w + gap, y, stock['length'] - (x + w + gap), h))
+                        if y + h + gap < stock['width']:
+                            available_space.append((x, y + h + gap, w, stock['width'] - (y + h + gap)))
+                        available_space.sort(key=lambda s: (s[2] * s[3], s[2] + s[3]), reverse=True)
+
+                if fit:
                     sheet['placements'].append(place_part(part, (x, y), rotated))
-                    
-                    # Update available space
-                    del available_space[i]
-                    if x + w + gap < stock['length']:
-                        available_space.append((x + w + gap, y, stock['length'] - (x + w + gap), h))
-                    if y + h + gap < stock['width']:
-                        available_space.append((x, y + h + gap, w, stock['width'] - (y + h + gap)))
-                    available_space.sort(key=lambda s: (s[2] * s[3], s[2] + s[3]), reverse=True)
-
-            utilization = sum(p['part']['length'] * p['part']['height'] for p in sheet['placements']) / (stock['length'] * stock['width'])
-            if utilization > best_utilization:
+                    placed_area += area
+                    free_area -= (w + gap) * (h + gap)
+                else:
+                    failed.add(size)
+                    open_area -= untried[size] * area
+            if sheet is None:
+                continue
+
+            utilization = placed_area / capacity
+            # Ties go to the earlier stock size, as when sizes are tried in file order
+            if utilization > best_utilization or (utilization == best_utilization and best_index is not None
+                                                  and index < best_index):
                 best_utilization = utilization
+                best_index = index
                 best_sheet = sheet
                 best_placement = [p['part'] for p in sheet['placements']]
 
+        if best_sheet is None and planned:
+            # None of the planned sizes takes a remaining part; drop the plan
+            mix_left.clear()
+            continue
         if best_sheet:
+            mix_left[best_sheet['size']] = mix_left.get(best_sheet['size'], 0) - 1
             sheets.append(best_sheet)
             for part in best_placement:
                 remaining_parts.remove(part)
@@ -87,48 +186,48 @@ def calculate_layout(parts: List[Dict], stock_sizes: List[Dict], gap: int) -> Li
 
     return sheets
 
-def optimize_glass_cutting(glass_data_file: str, stock_sizes_file: str, gap: int):
-    glass_parts = load_glass_data(glass_data_file)
-    stock_sizes = load_stock_sizes(stock_sizes_file)
-    
-    # Expand parts based on quantity
-    expanded_parts = expand_parts(glass_parts)
-    
-    # Sort parts by area in descending order
-    expanded_parts.sort(key=lambda x: x['length'] * x['height'], reverse=True)
-    
-    optimized_layout = calculate_layout(expanded_parts, stock_sizes, gap)
-    
-    # Calculate total areas in square millimeters
-    total_glass_area_mm2 = sum(part['length'] * part['height'] for part in expanded_parts)
-    total_sheet_area_mm2 = sum(sheet['size'][0] * sheet['size'][1] for sheet in optimized_layout)
-    
-    # Convert areas to square meters
-    total_glass_area_m2 = total_glass_area_mm2 / 1_000_000  # 1 m² = 1,000,000 mm²
-    total_sheet_area_m2 = total_sheet_area_mm2 / 1_000_000  # 1 m² = 1,000,000 mm²
+def optimize_glass_cutting(glass_data_file: str, stock_sizes_file: str, gap: int, grouped: bool = False):
+    with phase('load'):
+        glass_parts = load_glass_data(glass_data_file)
+        stock_sizes = load_stock_sizes(stock_sizes_file)
     
-    # Calculate efficiency and wastage
-    used_area_percentage = (total_glass_area_mm2 / total_sheet_area_mm2) * 100
-    wastage_percentage = 100 - used_area_percentage
+    if grouped:
+        # Pack quantity groups as tiled blocks; expand only for the printed layout
+        packed_sheets = pack_groups(group_parts(glass_parts), stock_sizes, gap)
+        with phase('expand'):
+            optimized_layout = list(expand_placements(packed_sheets, gap))
+    else:
+        with phase('expand'):
+            # Expand parts based on quantity
+            expanded_parts = expand_parts(glass_parts)
+        
+        with phase('sort'):
+            # Sort parts by area in descending order
+            expanded_parts.sort(key=lambda x: x['length'] * x['height'], reverse=True)
+        
+        optimized_layout = calculate_layout(expanded_parts, stock_sizes, gap)
     
-    # Calculate sheet size usage summary
-    sheet_counter = Counter((sheet['size'][0], sheet['size'][1]) for sheet in optimized_layout)
+    with phase('stats'):
+        # Area totals come from the quantity groups, not the expanded list
+        total_glass_area_mm2 = sum(part['length'] * part['height'] * part['qty'] for part in glass_parts)
+        stats = plan_statistics(optimized_layout, total_glass_area_mm2)
     
     # Print results 
-    print(f"\nTotal sheets used: {len(optimized_layout)}")
-    print(f"\nTotal glass area: {total_glass_area_m2:.3f} sq m")
-    print(f"Total stock area used: {total_sheet_area_m2:.3f} sq m")
-    print(f"\nUsed area percentage: {used_area_percentage:.2f}%")
-    print(f"Wastage percentage: {wastage_percentage:.2f}%")
+    print(f"\nTotal sheets used: {stats['total_sheets']}")
+    print(f"\nTotal glass area: {stats['total_glass_area_m2']:.3f} sq m")
+    print(f"Total stock area used: {stats['total_sheet_area_m2']:.3f} sq m")
+    print(f"\nUsed area percentage: {stats['used_area_percentage']:.2f}%")
+    print(f"Wastage percentage: {stats['wastage_percentage']:.2f}%")
     
     # Print summary of sheet sizes used and their quantity
     print("\nSummary of sheet sizes used:")
-    for (length, width), qty in sheet_counter.items():
+    for (length, width), qty in stats['sheet_counter'].items():
         print(f"  {length}mm x {width}mm: {qty} pcs")
     
     print("Optimized Layout:")
     for i, sheet in enumerate(optimized_layout, 1):
-        print(f"Sheet {i}: {sheet['size'][0]}mm x {sheet['size'][1]}mm")
+        repeat = f" x {sheet['repeat']}" if sheet.get('repeat', 1) > 1 else ""
+        print(f"Sheet {i}: {sheet['size'][0]}mm x {sheet['size'][1]}mm{repeat}")
         for placement in sheet['placements']:
             part = placement['part']
             position = placement['position']
@@ -136,8 +235,9 @@ def optimize_glass_cutting(glass_data_file: str, stock_sizes_file: str, gap: int
             print(f"  {part['location']} ({part['length']}x{part['height']}) at position {position} ({orientation})")
 
 # Example usage
-glass_data_file = 'cutlist/glass_data.csv'
-stock_sizes_file = 'cutlist/glass_sheet_size.csv'
-gap = 0  # Gap between parts in mm
+if __name__ == "__main__":
+    glass_data_file = 'cutlist/glass_data.csv'
+    stock_sizes_file = 'cutlist/glass_sheet_size.csv'
+    gap = 0  # Gap between parts in mm
 
-optimize_glass_cutting(glass_data_file, stock_sizes_file, gap)
+    optimize_glass_cutting(glass_data_file, stock_sizes_file, gap)
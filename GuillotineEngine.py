@@ -0,0 +1,335 @@
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from Instrumentation import high_water, record_find, tally, timed
+
+# How a free rect is chosen for a piece (lower score wins)
+FIT_RULES = ('best_area', 'best_short_side', 'best_long_side', 'worst_area')
+# Which way the leftover of a free rect is cut after a piece goes in its corner
+SPLIT_RULES = ('shorter_leftover', 'longer_leftover', 'min_area', 'max_area', 'shorter_axis', 'longer_axis')
+
+# A node cut along 'x' is divided by vertical cuts into side-by-side columns;
+# along 'y' by horizontal cuts into stacked strips.
+X, Y = 'x', 'y'
+
+
+class CutNode:
+    """Node of a staged guillotine cut tree.
+
+    Internal nodes hold their children in cut order along `axis`; leaves are a
+    placed piece or free space. Children of a node are always cut along the
+    other axis, so a node's depth is its cutting stage.
+    """
+    __slots__ = ('x', 'y', 'w', 'h', 'axis', 'children', 'piece', 'parent')
+
+    def __init__(self, x: int, y: int, w: int, h: int, parent: Optional['CutNode'] = None):
+        self.x, self.y, self.w, self.h = x, y, w, h
+        self.axis: Optional[str] = None
+        self.children: List['CutNode'] = []
+        self.piece: Optional[Dict] = None
+        self.parent = parent
+
+    @property
+    def is_free(self) -> bool:
+        return not self.children and self.piece is None
+
+    def start(self, axis: str) -> int:
+        return self.x if axis == X else self.y
+
+    def end(self, axis: str) -> int:
+        return self.x + self.w if axis == X else self.y + self.h
+
+    def to_dict(self) -> Dict:
+        node = {'rect': (self.x, self.y, self.w, self.h)}
+        if self.children:
+            node['axis'] = self.axis
+            node['children'] = [child.to_dict() for child in self.children]
+        elif self.piece is not None:
+            node['piece'] = self.piece
+        else:
+            node['free'] = True
+        return node
+
+
+def _fit_score(rule: str, w: int, h: int, pw: int, ph: int) -> Tuple[int, int]:
+    leftover_w, leftover_h = w - pw, h - ph
+    if rule == 'best_area':
+        return w * h - pw * ph, min(leftover_w, leftover_h)
+    if rule == 'best_short_side':
+        return min(leftover_w, leftover_h), max(leftover_w, leftover_h)
+    if rule == 'best_long_side':
+        return max(leftover_w, leftover_h), min(leftover_w, leftover_h)
+    return -(w * h - pw * ph), min(leftover_w, leftover_h)
+
+
+def _first_axis(rule: str, w: int, h: int, pw: int, ph: int) -> str:
+    """Axis of the first cut: Y keeps the full-width leftover above the piece, X the full-height one beside it."""
+    leftover_w, leftover_h = w - pw, h - ph
+    if rule == 'shorter_leftover':
+        return Y if leftover_w <= leftover_h else X
+    if rule == 'longer_leftover':
+        return Y if leftover_w > leftover_h else X
+    if rule in ('min_area', 'max_area'):
+        # Y leaves pw x leftover_h on the strip and w x leftover_h above; compare the smaller piece
+        beside_y, beside_x = leftover_w * ph, pw * leftover_h
+        return Y if (beside_y <= beside_x) == (rule == 'max_area') else X
+    if rule == 'shorter_axis':
+        return Y if w <= h else X
+    return Y if w > h else X
+
+
+class GuillotineSheet:
+    """One stock sheet packed by guillotine splits, with the cut tree built as pieces go in.
+
+    Every placement cuts the chosen free leaf in two stages (first cut by the
+    split rule, then the piece off its strip); a split along the parent's own
+    axis is spliced into the parent so same-direction cuts stay in one stage.
+    With `merge`, free leaves left next to each other in the same node are
+    joined by dropping the cut between them.
+    """
+
+    def __init__(self, length: int, width: int, gap: int = 0, rule: str = 'best_short_side',
+                 split: str = 'longer_axis', merge: bool = True):
+        if rule not in FIT_RULES:
+            raise ValueError(f"Unknown fit rule {rule!r}; expected one of {FIT_RULES}")
+        if split not in SPLIT_RULES:
+            raise ValueError(f"Unknown split rule {split!r}; expected one of {SPLIT_RULES}")
+        self.length, self.width, self.gap = length, width, gap
+        self.rule, self.split, self.merge = rule, split, merge
+        self.root = CutNode(0, 0, length, width)
+        self.free: List[CutNode] = [self.root]
+        self.placements: List[Dict] = []
+        self.used_area = 0
+
+    def find(self, length: int, height: int, allow_rotation: bool = True) -> Optional[Tuple[CutNode, bool]]:
+        best = None
+        record_find(len(self.free))
+        for node in self.free:
+            for rotated in ((False, True) if allow_rotation and length != height else (False,)):
+                pw, ph = (height, length) if rotated else (length, height)
+                if pw <= node.w and ph <= node.h:
+                    score = _fit_score(self.rule, node.w, node.h, pw, ph)
+                    if best is None or score < best[0]:
+                        best = (score, node, rotated)
+        return None if best is None else (best[1], best[2])
+
+    def insert(self, part: Dict, allow_rotation: bool = True) -> Optional[Dict]:
+        """Place a {'location', 'length', 'height'} part; returns its placement or None."""
+        fit = self.find(part['length'], part['height'], allow_rotation)
+        if fit is None:
+            return None
+        node, rotated = fit
+        pw, ph = (part['height'], part['length']) if rotated else (part['length'], part['height'])
+        self._cut(node, pw, ph, part, rotated)
+        placement = {'part': part, 'position': (node.x, node.y), 'rotated': rotated}
+        self.placements.append(placement)
+        self.used_area += pw * ph
+        tally('placements')
+        high_water('free_rects', len(self.free))
+        return placement
+
+    def _children(self, node: CutNode, axis: str, size: int) -> List[CutNode]:
+        """Cut `node` across `axis` at `size` from its start; the kerf goes to the second part."""
+        first = (CutNode(node.x, node.y, size, node.h) if axis == X else CutNode(node.x, node.y, node.w, size))
+        rest = (node.w if axis == X else node.h) - size - self.gap
+        if rest <= 0:
+            return [first]
+        if axis == X:
+            return [first, CutNode(node.x + size + self.gap, node.y, rest, node.h)]
+        return [first, CutNode(node.x, node.y + size + self.gap, node.w, rest)]
+
+    def _attach(self, node: CutNode, axis: str, children: List[CutNode]) -> CutNode:
+        """Cut `node` into `children`; returns the node that now holds them."""
+        parent = node.parent
+        if parent is not None and parent.axis == axis:
+            # Same direction as the parent's cuts: splice in as extra strips/columns of that stage
+            i = parent.children.index(node)
+            parent.children[i:i + 1] = children
+        else:
+            node.axis = axis
+            node.children = children
+            parent = node
+        for child in children:
+            child.parent = parent
+        return parent
+
+    def _cut(self, node: CutNode, pw: int, ph: int, part: Dict, rotated: bool):
+        self.free.remove(node)
+        first = _first_axis(self.split, node.w, node.h, pw, ph)
+        second = X if first == Y else Y
+        touched = []
+
+        # Stage n: the band holding the piece off the rest of the free rect
+        outer = self._children(node, first, ph if first == Y else pw)
+        band = node
+        if len(outer) > 1:
+            touched.append(self._attach(node, first, outer))
+            band = outer[0]
+            self.free.extend(outer[1:])
+
+        # Stage n+1: the piece off the end of its band
+        inner = self._children(band, second, pw if second == X else ph)
+        piece = band
+        if len(inner) > 1:
+            touched.append(self._attach(band, second, inner))
+            piece = inner[0]
+            self.free.extend(inner[1:])
+        piece.piece = {'location': part['location'], 'length': part['length'], 'height': part['height'],
+                       'rotated': rotated}
+
+        if self.merge:
+            for parent in touched:
+                self._merge_free(parent)
+
+    def _merge_free(self, parent: CutNode):
+        """Join runs of free siblings; their union spans the parent, so it is still a guillotine piece."""
+        if not parent.children:
+            return
+        axis = parent.axis
+        merged: List[CutNode] = []
+        for child in parent.children:
+            previous = merged[-1] if merged else None
+            if previous is not None and previous.is_free and child.is_free:
+                if axis == X:
+                    previous.w = child.x + child.w - previous.x
+                else:
+                    previous.h = child.y + child.h - previous.y
+                self.free.remove(child)
+            else:
+                merged.append(child)
+        parent.children = merged
+        if len(merged) == 1 and merged[0].is_free:
+            # Nothing left to cut here: the parent is free space again
+            self.free.remove(merged[0])
+            parent.axis, parent.children = None, []
+            self.free.append(parent)
+            if parent.parent is not None:
+                self._merge_free(parent.parent)
+
+    def stages(self) -> int:
+        def depth(node: CutNode) -> int:
+            return 1 + max(depth(child) for child in node.children) if node.children else 0
+        return depth(self.root)
+
+    def cut_sequence(self) -> List[Dict]:
+        """Cuts in table order: each node's cuts, then its children's, top-down.
+
+        Each cut is {'stage', 'axis', 'position', 'start', 'end'}: a vertical
+        cut (axis 'x') at x=position from y=start to y=end, or a horizontal
+        one. A cut that only removes an edge trim is marked 'trim'.
+        """
+        cuts = []
+
+        def visit(node: CutNode, stage: int):
+            if node.piece is not None:
+                # A sliver narrower than the kerf can be left beside a piece; trim it off
+                piece = node.piece
+                pw, ph = (piece['height'], piece['length']) if piece['rotated'] else (piece['length'], piece['height'])
+                if node.w > pw:
+                    cuts.append({'stage': stage, 'axis': X, 'position': node.x + pw,
+                                 'start': node.y, 'end': node.y + node.h, 'trim': True})
+                if node.h > ph:
+                    cuts.append({'stage': stage, 'axis': Y, 'position': node.y + ph,
+                                 'start': node.x, 'end': node.x + pw, 'trim': True})
+                return
+            if not node.children:
+                return
+            axis = node.axis
+            span = (node.y, node.y + node.h) if axis == X else (node.x, node.x + node.w)
+            for child in node.children[:-1]:
+                cuts.append({'stage': stage, 'axis': axis, 'position': child.end(axis),
+                             'start': span[0], 'end': span[1]})
+            if node.children[-1].end(axis) < node.end(axis):
+                cuts.append({'stage': stage, 'axis': axis, 'position': node.children[-1].end(axis),
+                             'start': span[0], 'end': span[1], 'trim': True})
+            for child in node.children:
+                visit(child, stage + 1)
+
+        visit(self.root, 1)
+        return cuts
+
+    def offcuts(self) -> List[Tuple[int, int, int, int]]:
+        return [(node.x, node.y, node.w, node.h) for node in self.free]
+
+    def to_sheet(self) -> Dict:
+        return {'size': (self.length, self.width), 'placements': self.placements,
+                'cut_tree': self.root.to_dict(), 'cuts': self.cut_sequence(), 'stages': self.stages(),
+                'repeat': 1}
+
+
+def is_guillotine(rects: Iterable[Tuple[float, float, float, float]]) -> bool:
+    """True if the pieces can be separated by edge-to-edge cuts, recursively."""
+    rects = list(rects)
+    if len(rects) <= 1:
+        return True
+    for axis in (0, 1):
+        # Candidate cut lines are piece edges that no piece straddles
+        for edge in sorted({r[axis] + r[axis + 2] for r in rects}):
+            before = [r for r in rects if r[axis] + r[axis + 2] <= edge]
+            after = [r for r in rects if r[axis] >= edge]
+            if before and after and len(before) + len(after) == len(rects):
+                return is_guillotine(before) and is_guillotine(after)
+    return False
+
+
+@timed('pack_guillotine')
+def pack_guillotine(glass_parts: List[Dict], stock_sizes: List[Dict], gap: int = 0, rule: str = 'best_short_side',
+                    split: str = 'longer_axis', merge: bool = True, deadline: Optional[float] = None) -> List[Dict]:
+    """Guillotine-pack every piece; each sheet dict carries its cut tree and cut sequence.
+
+    Pieces go in area-descending order. Each new sheet is filled on every stock
+    size that still has quantity and the fullest one is kept, as in pack_groups.
+    Raises TimeoutError once time.perf_counter() passes `deadline`.
+    """
+    parts = [{'location': p['location'], 'length': p['length'], 'height': p['height']}
+             for p in glass_parts for _ in range(p.get('qty', 1))]
+    parts.sort(key=lambda p: (p['length'] * p['height'], max(p['length'], p['height'])), reverse=True)
+    stock_left = [stock.get('qty', float('inf')) for stock in stock_sizes]
+    sheets = []
+
+    while parts:
+        best = None
+        for s, stock in enumerate(stock_sizes):
+            if stock_left[s] <= 0:
+                continue
+            if deadline is not None and time.perf_counter() > deadline:
+                raise TimeoutError(f"{len(parts)} parts left unpacked at the deadline")
+            sheet = GuillotineSheet(stock['length'], stock['width'], gap, rule, split, merge)
+            placed = [i for i, part in enumerate(parts) if sheet.insert(part) is not None]
+            utilization = sheet.used_area / (stock['length'] * stock['width'])
+            if placed and (best is None or utilization > best[0]):
+                best = (utilization, s, sheet, placed)
+        if best is None:
+            raise ValueError(f"Parts do not fit on any available stock sheet: {sorted({p['location'] for p in parts})}")
+        _, s, sheet, placed = best
+        stock_left[s] -= 1
+        placed_set = set(placed)
+        parts = [part for i, part in enumerate(parts) if i not in placed_set]
+        sheets.append(sheet.to_sheet())
+    return sheets
+
+
+def main():
+    from PackingCore import plan_statistics
+    from CutListIngest import read_table
+
+    glass_parts = [{'location': r.label, 'length': int(r.length), 'height': int(r.height), 'qty': r.qty}
+                   for r in read_table('data/glass_data.csv')]
+    stock_sizes = [{'length': int(r.length), 'width': int(r.height), 'qty': r.qty}
+                   for r in read_table('data/glass_sheet_size.csv')]
+    sheets = pack_guillotine(glass_parts, stock_sizes, gap=3)
+    stats = plan_statistics(sheets)
+
+    print(f"Total sheets used: {stats['total_sheets']}")
+    print(f"Wastage percentage: {stats['wastage_percentage']:.2f}%")
+    print(f"Most cutting stages on a sheet: {max(sheet['stages'] for sheet in sheets)}")
+    print("\nCut sequence for sheet 1:")
+    for cut in sheets[0]['cuts']:
+        direction = 'vertical' if cut['axis'] == X else 'horizontal'
+        trim = ' (trim)' if cut.get('trim') else ''
+        print(f"  stage {cut['stage']}: {direction} cut at {cut['position']} "
+              f"from {cut['start']} to {cut['end']}{trim}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
-import pandas as pd
-import numpy as np
 from typing import List, Tuple
+from Instrumentation import timed
 
 class GlassPiece:
     def __init__(self, location: str, length: float, height: float, qty: int):
@@ -21,69 +20,54 @@ class HybridGlassCuttingOptimizer:
         self.stock_sheets = stock_sheets
         self.glass_pieces = glass_pieces
         
+    @timed('HybridGlassCuttingOptimizer.optimize')
     def optimize(self):
-        # Sort pieces by area in descending order
+        # Sort pieces by area in descending order; demand is kept as a count per piece
         sorted_pieces = sorted(
-            [piece for piece in self.glass_pieces for _ in range(piece.qty)],
+            self.glass_pieces,
             key=lambda p: p.length * p.height, 
             reverse=True
         )
         
         # Track utilization
         sheet_utilization = []
-        remaining_pieces = sorted_pieces.copy()
+        remaining_qty = {id(piece): piece.qty for piece in sorted_pieces}
         
         for stock_sheet in self.stock_sheets:
+            remaining_pieces = [piece for piece in sorted_pieces if remaining_qty[id(piece)] > 0]
             sheet_cuts = self._optimize_single_sheet(stock_sheet, remaining_pieces)
             
             if sheet_cuts:
-                sheet_util = sum(cut.length * cut.height for cut in sheet_cuts) / stock_sheet.total_area
+                sheet_util = sum(cut.length * cut.height * remaining_qty[id(cut)] for cut in sheet_cuts) / stock_sheet.total_area
                 sheet_utilization.append({
                     'sheet_size': f"{stock_sheet.length}x{stock_sheet.width}",
-                    'utilized_pieces': len(sheet_cuts),
+                    'utilized_pieces': sum(remaining_qty[id(cut)] for cut in sheet_cuts),
                     'utilization_percentage': sheet_util * 100
                 })
                 
                 # Remove used pieces
                 for cut in sheet_cuts:
-                    remaining_pieces.remove(cut)
+                    remaining_qty[id(cut)] = 0
         
         return {
             'sheet_utilization': sheet_utilization,
-            'remaining_pieces': len(remaining_pieces)
+            'remaining_pieces': sum(remaining_qty.values())
         }
     
     def _optimize_single_sheet(self, stock_sheet, pieces):
+        # Every copy of a piece has the same size, so fit is decided once per piece
         sheet_cuts = []
-        remaining_pieces = pieces.copy()
-        
-        while remaining_pieces:
-            best_piece = None
-            best_efficiency = 0
-            
-            for piece in remaining_pieces:
-                # Check if piece can fit in the stock sheet
-                if (piece.length <= stock_sheet.length and piece.height <= stock_sheet.width) or \
-                   (piece.height <= stock_sheet.length and piece.length <= stock_sheet.width):
-                    
-                    # Calculate potential efficiency
-                    piece_area = piece.length * piece.height
-                    sheet_area = stock_sheet.length * stock_sheet.width
-                    efficiency = piece_area / sheet_area
-                    
-                    if efficiency > best_efficiency:
-                        best_piece = piece
-                        best_efficiency = efficiency
-            
-            if best_piece:
-                sheet_cuts.append(best_piece)
-                remaining_pieces.remove(best_piece)
-            else:
-                break
+        for piece in sorted(pieces, key=lambda p: p.length * p.height, reverse=True):
+            # Check if piece can fit in the stock sheet
+            if (piece.length <= stock_sheet.length and piece.height <= stock_sheet.width) or \
+               (piece.height <= stock_sheet.length and piece.length <= stock_sheet.width):
+                sheet_cuts.append(piece)
         
         return sheet_cuts
 
 def main():
+    import pandas as pd
+
     # Read input data
     glass_data = pd.read_csv('glass_data.csv')
     stock_data = pd.read_csv('glass_sheet_size.csv')
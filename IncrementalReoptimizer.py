@@ -0,0 +1,205 @@
+import math
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Set, Tuple
+
+from Instrumentation import timed
+from PackingCore import expand_placements, group_parts, pack_groups, sheet_piece_area
+
+PartKey = Tuple[str, int, int]  # (location, length, height)
+
+
+@dataclass
+class ReoptimizationResult:
+    sheets: List[Dict]
+    kept: int             # physical sheets carried over unchanged
+    ripped: int           # physical sheets taken apart and repacked
+    repacked: int         # physical sheets the repack produced
+    surplus: List[Dict] = field(default_factory=list)  # cancelled pieces already cut on frozen sheets
+    elapsed: float = 0.0
+
+
+def _part_key(part: Dict) -> PartKey:
+    return part['location'], part['length'], part['height']
+
+
+def order_delta(old_parts: List[Dict], new_parts: List[Dict]) -> List[Dict]:
+    """Signed quantity changes between two versions of an order, keyed by (location, length, height).
+
+    A location may carry several panel sizes; a size that changed is a
+    removal of the old size plus an addition of the new one.
+    """
+    def by_key(parts):
+        rows: Dict[PartKey, Dict] = {}
+        for part in parts:
+            location, length, height = key = _part_key(part)
+            row = rows.setdefault(key, {'location': location, 'length': length, 'height': height, 'qty': 0})
+            row['qty'] += part['qty']
+        return rows
+
+    old, new = by_key(old_parts), by_key(new_parts)
+    delta = []
+    for key in list(old) + [k for k in new if k not in old]:
+        before = old[key]['qty'] if key in old else 0
+        after = new[key]['qty'] if key in new else 0
+        if after != before:
+            delta.append(dict(new.get(key) or old[key], qty=after - before))
+    return delta
+
+
+def _per_piece(sheets: List[Dict], gap: int) -> List[Dict]:
+    """Copy a plan into per-piece form so sheets can be edited piece by piece."""
+    if any('blocks' in sheet for sheet in sheets):
+        sheets = [next(expand_placements([sheet], gap)) if 'blocks' in sheet else sheet for sheet in sheets]
+    return [{'size': tuple(sheet['size']), 'placements': list(sheet['placements']), 'repeat': sheet.get('repeat', 1)}
+            for sheet in sheets]
+
+
+def _utilization(sheet: Dict) -> float:
+    return sheet_piece_area(sheet) / (sheet['size'][0] * sheet['size'][1])
+
+
+@timed('reoptimize')
+def reoptimize(sheets: List[Dict], delta: List[Dict], stock_sizes: List[Dict], gap: int = 0,
+               frozen: Iterable[int] = (), neighbours: int = 1) -> ReoptimizationResult:
+    """Apply an order delta to an existing plan, repacking as little as possible.
+
+    `sheets` is the previous plan (per-piece or grouped sheet dicts, repeat
+    aware) and `delta` a list of {'location', 'length', 'height', 'qty'} rows
+    whose qty is the signed change. Indices in `frozen` are sheets already cut:
+    they are never modified, and cancelled pieces that only exist on them are
+    reported as surplus.
+
+    Cancelled pieces are taken from the least utilized copies that hold them.
+    Those copies plus `neighbours` sheets either side in plan order are ripped
+    up, their remaining pieces join the added ones, and that pool alone is
+    repacked with pack_groups. Every other sheet is kept as it was.
+    """
+    start = time.perf_counter()
+    plan = _per_piece(sheets, gap)
+    frozen = set(frozen)
+    editable = [i for i in range(len(plan)) if i not in frozen]
+
+    counts = [Counter(_part_key(p['part']) for p in sheet['placements']) for sheet in plan]
+    removals: Dict[int, Counter] = {}
+    ripped: Dict[int, int] = {}  # sheet index -> copies taken apart
+    surplus = []
+
+    for row in delta:
+        if row['qty'] >= 0:
+            continue
+        key, remaining = _part_key(row), -row['qty']
+        holders = sorted((i for i in editable if counts[i][key]), key=lambda i: _utilization(plan[i]))
+        for i in holders:
+            if remaining <= 0:
+                break
+            available = plan[i]['repeat'] * counts[i][key] - removals.get(i, Counter())[key]
+            take = min(remaining, available)
+            if take <= 0:
+                continue
+            removals.setdefault(i, Counter())[key] += take
+            remaining -= take
+        if remaining > 0:
+            surplus.append(dict(row, qty=remaining))
+
+    for i, removed in removals.items():
+        ripped[i] = max(math.ceil(n / counts[i][key]) for key, n in removed.items())
+
+    additions = [row for row in delta if row['qty'] > 0]
+    if additions and not ripped:
+        # Nothing freed up: open the emptiest sheets to make room for the new pieces
+        for i in sorted(editable, key=lambda i: _utilization(plan[i]))[:max(1, neighbours)]:
+            ripped[i] = 1
+    for i in list(ripped):
+        for j in range(i - neighbours, i + neighbours + 1):
+            if 0 <= j < len(plan) and j not in frozen and j not in ripped:
+                ripped[j] = 1
+
+    # Pool: pieces of every ripped copy, minus the cancellations, plus the additions
+    pool: Counter = Counter()
+    for i, copies in ripped.items():
+        for placement in plan[i]['placements']:
+            pool[_part_key(placement['part'])] += copies
+        for key, n in removals.get(i, Counter()).items():
+            pool[key] -= n
+    for row in additions:
+        pool[_part_key(row)] += row['qty']
+
+    kept = []
+    for i, sheet in enumerate(plan):
+        repeat = sheet['repeat'] - ripped.get(i, 0)
+        if repeat > 0:
+            kept.append(dict(sheet, repeat=repeat))
+
+    # Only stock not already committed to kept sheets is available for the repack
+    used = Counter()
+    for sheet in kept:
+        used[tuple(sheet['size'])] += sheet['repeat']
+    stock_left = [dict(stock, qty=stock.get('qty', float('inf')) - used[(stock['length'], stock['width'])])
+                  for stock in stock_sizes]
+    glass_parts = [{'location': location, 'length': length, 'height': height, 'qty': qty}
+                   for (location, length, height), qty in pool.items() if qty > 0]
+    repacked = list(expand_placements(pack_groups(group_parts(glass_parts), stock_left, gap), gap)) if glass_parts else []
+
+    return ReoptimizationResult(
+        sheets=kept + repacked,
+        kept=sum(sheet['repeat'] for sheet in kept),
+        ripped=sum(ripped.values()),
+        repacked=sum(sheet['repeat'] for sheet in repacked),
+        surplus=surplus,
+        elapsed=time.perf_counter() - start,
+    )
+
+
+def changed_sheets(before: List[Dict], after: ReoptimizationResult, gap: int = 0) -> Set[int]:
+    """Indices of `before` sheets whose copies are not all still present, for floor checks."""
+    remaining = Counter(_layout_key(sheet) for sheet in after.sheets for _ in range(sheet.get('repeat', 1)))
+    changed = set()
+    for i, sheet in enumerate(_per_piece(before, gap)):
+        key = _layout_key(sheet)
+        for _ in range(sheet['repeat']):
+            if remaining[key] > 0:
+                remaining[key] -= 1
+            else:
+                changed.add(i)
+    return changed
+
+
+def _layout_key(sheet: Dict):
+    return (tuple(sheet['size']), tuple(sorted((p['part']['location'], tuple(p['position']), p['rotated'])
+                                               for p in sheet['placements'])))
+
+
+def main():
+    from PackingCore import plan_statistics
+    from CutListIngest import read_table
+
+    gap = 0
+    glass_parts = [{'location': r.label, 'length': int(r.length), 'height': int(r.height), 'qty': r.qty}
+                   for r in read_table('data/glass_data.csv')]
+    stock_sizes = [{'length': int(r.length), 'width': int(r.height), 'qty': r.qty}
+                   for r in read_table('data/glass_sheet_size.csv')]
+
+    start = time.perf_counter()
+    previous = pack_groups(group_parts(glass_parts), stock_sizes, gap)
+    full_time = time.perf_counter() - start
+
+    # A site cancels two panels of the first location and adds a new window type
+    changed = [dict(p) for p in glass_parts]
+    changed[0]['qty'] -= 2
+    changed.append({'location': 'CWG-NEW', 'length': 1200, 'height': 900, 'qty': 3})
+    delta = order_delta(glass_parts, changed)
+
+    result = reoptimize(previous, delta, stock_sizes, gap, frozen=range(3))
+    stats = plan_statistics(result.sheets)
+    print(f"Delta: {[(row['location'], row['qty']) for row in delta]}")
+    print(f"Full solve: {full_time * 1000:.1f} ms; incremental: {result.elapsed * 1000:.1f} ms")
+    print(f"Kept {result.kept} sheets, ripped {result.ripped}, repacked into {result.repacked}")
+    print(f"Total sheets used: {stats['total_sheets']}, wastage {stats['wastage_percentage']:.2f}%")
+    if result.surplus:
+        print(f"Surplus already cut: {[(row['location'], row['qty']) for row in result.surplus]}")
+
+
+if __name__ == "__main__":
+    main()
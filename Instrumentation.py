@@ -0,0 +1,254 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, List, Optional
+
+# Per-process registry. Everything below is a no-op while _enabled is False, so
+# call sites on hot paths cost one function call and a global lookup.
+_enabled = False
+_origin = time.perf_counter()
+_phases: Dict[str, List[float]] = defaultdict(list)
+_events: List[Dict] = []
+_counters: Counter = Counter()
+_peaks: Dict[str, float] = {}
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    global _origin
+    _origin = time.perf_counter()
+    _phases.clear()
+    _events.clear()
+    _counters.clear()
+    _peaks.clear()
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name: str, args: Dict):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        _phases[self.name].append(end - self.start)
+        _events.append({'name': self.name, 'ph': 'X', 'ts': (self.start - _origin) * 1e6,
+                        'dur': (end - self.start) * 1e6, 'pid': os.getpid(), 'tid': threading.get_ident(),
+                        'args': self.args})
+        return False
+
+
+def phase(name: str, **args):
+    """Context manager timing one named phase; extra keyword args land in the trace event."""
+    if not _enabled:
+        return _NULL_PHASE
+    return _Phase(name, args)
+
+
+def timed(name: Optional[str] = None) -> Callable:
+    """Decorator form of phase(); the phase defaults to the function's qualified name."""
+    def decorate(fn):
+        label = name or fn.__qualname__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Phase(label, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def tally(name: str, n: int = 1):
+    if _enabled:
+        _counters[name] += n
+
+
+def record_find(fit_tests: int):
+    """One free-space query that examined `fit_tests` candidate positions (one call on the hot path)."""
+    if _enabled:
+        _counters['finds'] += 1
+        _counters['fit_tests'] += fit_tests
+
+
+def high_water(name: str, value: float):
+    if _enabled and value > _peaks.get(name, float('-inf')):
+        _peaks[name] = value
+
+
+def report() -> Dict:
+    """Phase timings, counters and high-water marks collected so far."""
+    phases = {name: {'calls': len(times), 'total_s': sum(times), 'mean_s': sum(times) / len(times),
+                     'max_s': max(times)}
+              for name, times in sorted(_phases.items(), key=lambda item: -sum(item[1]))}
+    derived = {}
+    if _counters['placements']:
+        derived['fit_tests_per_placement'] = _counters['fit_tests'] / _counters['placements']
+        derived['finds_per_placement'] = _counters['finds'] / _counters['placements']
+    return {'phases': phases, 'counters': dict(_counters), 'high_water': dict(_peaks), 'derived': derived}
+
+
+def chrome_trace() -> Dict:
+    """Trace Event Format document for chrome://tracing or Perfetto."""
+    end = (time.perf_counter() - _origin) * 1e6
+    counters = [{'name': name, 'ph': 'C', 'ts': end, 'pid': os.getpid(), 'args': {name: value}}
+                for name, value in list(_counters.items()) + list(_peaks.items())]
+    return {'traceEvents': _events + counters, 'displayTimeUnit': 'ms'}
+
+
+def write_json(path: str, data: Optional[Dict] = None):
+    with open(path, 'w') as f:
+        json.dump(report() if data is None else data, f, indent=2)
+
+
+def write_chrome_trace(path: str):
+    with open(path, 'w') as f:
+        json.dump(chrome_trace(), f)
+
+
+def _profile_rows(profiler, limit: int) -> List[Dict]:
+    import pstats
+    stats = pstats.Stats(profiler)
+    rows = sorted(stats.stats.items(), key=lambda item: -item[1][3])[:limit]
+    return [{'function': f"{os.path.basename(filename)}:{line}({func})", 'calls': nc,
+             'tottime_s': tt, 'cumtime_s': ct}
+            for (filename, line, func), (_, nc, tt, ct, _) in rows]
+
+
+@contextmanager
+def capture(profile: bool = False, memory: bool = False, limit: int = 25):
+    """Enable instrumentation for a block and collect a report.
+
+    Yields a dict that is filled in on exit with report() plus, when asked for,
+    the top cProfile entries by cumulative time and the tracemalloc peak with
+    its largest allocation sites. The previous enabled state is restored.
+    """
+    import cProfile
+    import tracemalloc
+
+    was_enabled = _enabled
+    reset()
+    enable()
+    result: Dict = {}
+    profiler = cProfile.Profile() if profile else None
+    tracing = memory and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    if profiler:
+        profiler.enable()
+    try:
+        yield result
+    finally:
+        if profiler:
+            profiler.disable()
+        result.update(report())
+        if profiler:
+            result['profile'] = _profile_rows(profiler, limit)
+        if memory:
+            snapshot = tracemalloc.take_snapshot()
+            result['memory'] = {
+                'peak_bytes': tracemalloc.get_traced_memory()[1],
+                'top': [{'site': str(stat.traceback), 'bytes': stat.size}
+                        for stat in snapshot.statistics('lineno')[:limit]],
+            }
+            if tracing:
+                tracemalloc.stop()
+        if not was_enabled:
+            disable()
+
+
+def format_report(data: Dict) -> str:
+    lines = [f"{'phase':40} {'calls':>7} {'total ms':>10} {'mean ms':>10} {'max ms':>10}"]
+    for name, row in data['phases'].items():
+        lines.append(f"{name:40} {row['calls']:7d} {row['total_s'] * 1000:10.2f} "
+                     f"{row['mean_s'] * 1000:10.3f} {row['max_s'] * 1000:10.3f}")
+    for title, values in (('counters', data['counters']), ('high water', data['high_water']),
+                          ('derived', data['derived'])):
+        if values:
+            lines.append(f"{title}: " + ", ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}"
+                                                  for k, v in sorted(values.items())))
+    for row in data.get('profile', []):
+        lines.append(f"  {row['cumtime_s'] * 1000:9.2f} ms {row['calls']:8d}  {row['function']}")
+    if 'memory' in data:
+        lines.append(f"peak traced memory: {data['memory']['peak_bytes'] / 1e6:.2f} MB")
+    return "\n".join(lines)
+
+
+def _from_environment():
+    """CUTLIST_PROFILE=<file> writes report() and CUTLIST_TRACE=<file> a Chrome trace at exit."""
+    report_path, trace_path = os.environ.get('CUTLIST_PROFILE'), os.environ.get('CUTLIST_TRACE')
+    if not (report_path or trace_path):
+        return
+    enable()
+    if report_path:
+        atexit.register(write_json, report_path)
+    if trace_path:
+        atexit.register(write_chrome_trace, trace_path)
+
+
+_from_environment()
+
+
+def main():
+    import argparse
+    from Benchmark import PACKERS, repo_instance
+    # Run as a script this file is __main__; the packers record into the imported module
+    from Instrumentation import capture, format_report, write_chrome_trace, write_json
+
+    parser = argparse.ArgumentParser(description="Per-phase timing report for one packer on the repo order.")
+    parser.add_argument('packer', nargs='?', default='grouped_blocks', choices=sorted(PACKERS))
+    parser.add_argument('--profile', action='store_true', help="Include the top cProfile entries")
+    parser.add_argument('--memory', action='store_true', help="Include the tracemalloc peak and top sites")
+    parser.add_argument('--json', help="Write the report as JSON")
+    parser.add_argument('--trace', help="Write a Chrome trace (chrome://tracing, Perfetto)")
+    args = parser.parse_args()
+
+    instance = repo_instance()
+    with capture(profile=args.profile, memory=args.memory) as data:
+        PACKERS[args.packer](instance)
+    print(format_report(data))
+    if args.json:
+        write_json(args.json, data)
+    if args.trace:
+        write_chrome_trace(args.trace)
+
+
+if __name__ == "__main__":
+    main()
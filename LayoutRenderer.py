@@ -0,0 +1,311 @@
+import argparse
+import os
+import time
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from Instrumentation import phase, tally, timed
+from PackingCore import expand_placements
+from PlacementStore import PlacementTable
+
+# A4 landscape in PDF points
+PAGE_WIDTH, PAGE_HEIGHT = 842, 595
+MARGIN = 36
+TITLE_HEIGHT = 28
+# Pages are only fanned out to a process pool when there are enough of them to pay for it
+PARALLEL_MIN_PAGES = 256
+
+PALETTE = [(0.55, 0.83, 0.78), (1.0, 1.0, 0.70), (0.75, 0.73, 0.85), (0.98, 0.50, 0.45), (0.50, 0.69, 0.83),
+           (0.99, 0.71, 0.38), (0.70, 0.87, 0.41), (0.99, 0.80, 0.90), (0.85, 0.85, 0.85), (0.74, 0.50, 0.74),
+           (0.80, 0.92, 0.77), (1.0, 0.93, 0.44)]
+
+# (x, y, w, h, label, dimensions) in sheet millimetres
+PageRect = Tuple[float, float, float, float, str, str]
+# (title, sheet length, sheet width, rects)
+PageSpec = Tuple[str, float, float, List[PageRect]]
+
+
+def _colour(label: str) -> Tuple[float, float, float]:
+    """Stable colour per part label, so a part looks the same on every page."""
+    return PALETTE[zlib.crc32(label.encode()) % len(PALETTE)]
+
+
+def _number(value: float) -> str:
+    return f"{value:g}"
+
+
+def _sheet_dicts(sheets: Union[PlacementTable, Iterable[Dict]], gap: int = 0) -> Iterator[Dict]:
+    if isinstance(sheets, PlacementTable):
+        yield from sheets.to_sheets()
+        return
+    for sheet in sheets:
+        yield next(expand_placements([sheet], gap)) if 'blocks' in sheet else sheet
+
+
+def layout_key(sheet: Dict) -> Tuple:
+    """Identity of a per-piece layout: sheet size plus every piece's label, position and rotation."""
+    return (tuple(sheet['size']), tuple(sorted((str(p['part']['location']), tuple(p['position']), p['rotated'])
+                                               for p in sheet['placements'])))
+
+
+def distinct_layouts(sheets: Union[PlacementTable, Iterable[Dict]], gap: int = 0) -> List[Tuple[Dict, List[int]]]:
+    """Each distinct layout once, with the 1-based physical sheet numbers that use it."""
+    layouts: Dict[Tuple, Tuple[Dict, List[int]]] = {}
+    number = 0
+    for sheet in _sheet_dicts(sheets, gap):
+        repeat = sheet.get('repeat', 1)
+        numbers = list(range(number + 1, number + repeat + 1))
+        number += repeat
+        key = layout_key(sheet)
+        if key in layouts:
+            layouts[key][1].extend(numbers)
+        else:
+            layouts[key] = (sheet, numbers)
+    return list(layouts.values())
+
+
+def _sheet_label(numbers: Sequence[int]) -> str:
+    if len(numbers) == 1:
+        return f"Sheet {numbers[0]}"
+    if numbers[-1] - numbers[0] == len(numbers) - 1:
+        return f"Sheets {numbers[0]}-{numbers[-1]} (x{len(numbers)})"
+    return f"{len(numbers)} sheets: {', '.join(map(str, numbers[:6]))}{', ...' if len(numbers) > 6 else ''}"
+
+
+def page_spec(sheet: Dict, title: str) -> PageSpec:
+    """Flatten one per-piece sheet into the plain tuples shipped to render workers."""
+    rects = []
+    for p in sheet['placements']:
+        part = p['part']
+        w, h = (part['height'], part['length']) if p['rotated'] else (part['length'], part['height'])
+        rects.append((p['position'][0], p['position'][1], w, h, str(part['location']),
+                      f"{_number(part['length'])}x{_number(part['height'])}"))
+    length, width = sheet['size']
+    return f"{title} - {_number(length)} x {_number(width)} mm", length, width, rects
+
+
+def _pdf_text(text: str) -> str:
+    text = text.encode('latin-1', 'replace').decode('latin-1')
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _text_op(x: float, y: float, size: float, text: str, centred: bool = True) -> str:
+    # Helvetica averages about half an em per character, close enough to centre labels
+    if centred:
+        x -= 0.5 * size * len(text) / 2
+    return f"BT /F1 {size:.1f} Tf {x:.2f} {y:.2f} Td ({_pdf_text(text)}) Tj ET"
+
+
+def pdf_page_content(spec: PageSpec) -> bytes:
+    """Compressed PDF content stream drawing one sheet, scaled to fit the page."""
+    title, length, width, rects = spec
+    scale = min((PAGE_WIDTH - 2 * MARGIN) / length, (PAGE_HEIGHT - 2 * MARGIN - TITLE_HEIGHT) / width)
+    ox = (PAGE_WIDTH - length * scale) / 2
+    oy = MARGIN
+    ops = ["0 g", _text_op(MARGIN, PAGE_HEIGHT - MARGIN - 12, 14, title, centred=False),
+           "0.6 w", f"{ox:.2f} {oy:.2f} {length * scale:.2f} {width * scale:.2f} re S", "0.3 w"]
+    for x, y, w, h, label, dimensions in rects:
+        r, g, b = _colour(label)
+        px, py, pw, ph = ox + x * scale, oy + y * scale, w * scale, h * scale
+        ops.append(f"{r:.2f} {g:.2f} {b:.2f} rg {px:.2f} {py:.2f} {pw:.2f} {ph:.2f} re B")
+        size = min(9.0, pw / (0.55 * max(len(label), len(dimensions), 1)), ph / 2.6)
+        if size >= 3:
+            ops.append("0 g")
+            ops.append(_text_op(px + pw / 2, py + ph / 2 + 0.15 * size, size, label))
+            ops.append(_text_op(px + pw / 2, py + ph / 2 - 1.05 * size, size * 0.85, dimensions))
+    return zlib.compress("\n".join(ops).encode('latin-1'), 6)
+
+
+def text_page_content(lines: Sequence[str]) -> bytes:
+    ops = ["0 g"] + [_text_op(MARGIN, PAGE_HEIGHT - MARGIN - 14 - 16 * i, 16 if i == 0 else 11, line, centred=False)
+                     for i, line in enumerate(lines)]
+    return zlib.compress("\n".join(ops).encode('latin-1'), 6)
+
+
+class PdfWriter:
+    """Minimal streaming PDF writer: objects go to disk as they are added.
+
+    Only what the layout reports need: pages with Flate-compressed content
+    streams and the built-in Helvetica font. The page tree is written last, so
+    pages never have to be held in memory.
+    """
+    CATALOG, PAGES, FONT = 1, 2, 3
+
+    def __init__(self, path: str):
+        self._file = open(path, 'wb')
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._offsets: Dict[int, int] = {}
+        self._next_id = 4
+        self._pages: List[int] = []
+        self._write(self.FONT, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    def _write(self, obj_id: int, body: bytes):
+        self._offsets[obj_id] = self._file.tell()
+        self._file.write(b"%d 0 obj\n" % obj_id + body + b"\nendobj\n")
+
+    def _new_id(self) -> int:
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    def add_stream(self, compressed: bytes) -> int:
+        obj_id = self._new_id()
+        self._write(obj_id, b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(compressed)
+                    + compressed + b"\nendstream")
+        return obj_id
+
+    def add_page(self, *content_ids: int):
+        """A page drawing the given content streams in order; streams may be shared between pages."""
+        obj_id = self._new_id()
+        contents = " ".join(f"{c} 0 R" for c in content_ids)
+        self._write(obj_id, (f"<< /Type /Page /Parent {self.PAGES} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                             f"/Resources << /Font << /F1 {self.FONT} 0 R >> >> /Contents [{contents}] >>").encode())
+        self._pages.append(obj_id)
+
+    def close(self):
+        kids = " ".join(f"{p} 0 R" for p in self._pages)
+        self._write(self.PAGES, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._pages)} >>".encode())
+        self._write(self.CATALOG, f"<< /Type /Catalog /Pages {self.PAGES} 0 R >>".encode())
+        xref = self._file.tell()
+        size = self._next_id
+        self._file.write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+        for obj_id in range(1, size):
+            self._file.write(b"%010d 00000 n \n" % self._offsets[obj_id])
+        self._file.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, self.CATALOG, xref))
+        self._file.close()
+
+    def __enter__(self) -> 'PdfWriter':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _render(specs: List[PageSpec], renderer, workers: Optional[int]) -> Iterator:
+    """Render page specs in order, on a process pool when the batch is large enough."""
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    if workers > 1 and len(specs) >= PARALLEL_MIN_PAGES:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(min(workers, len(specs))) as executor:
+            yield from executor.map(renderer, specs, chunksize=max(1, len(specs) // (workers * 4)))
+    else:
+        yield from map(renderer, specs)
+
+
+@timed('render_pdf')
+def render_pdf(sheets: Union[PlacementTable, Iterable[Dict]], path: str, summary: Optional[Sequence[str]] = None,
+               gap: int = 0, workers: Optional[int] = None, repeat_pages: bool = False) -> str:
+    """Write a layout report, drawing every distinct layout once.
+
+    By default each distinct layout gets one page titled with the sheet
+    numbers it covers. With `repeat_pages`, every physical sheet gets its own
+    page, but repeats reference the one shared drawing and only add a small
+    caption stream. `summary` lines become a text cover page.
+    """
+    with phase('render_dedupe'):
+        layouts = distinct_layouts(sheets, gap)
+        specs = [page_spec(sheet, "Layout" if repeat_pages else _sheet_label(numbers))
+                 for sheet, numbers in layouts]
+    tally('layouts_drawn', len(specs))
+    with PdfWriter(path) as pdf:
+        if summary:
+            pdf.add_page(pdf.add_stream(text_page_content(summary)))
+        pages = []
+        for (_, numbers), content in zip(layouts, _render(specs, pdf_page_content, workers)):
+            drawing = pdf.add_stream(content)
+            if not repeat_pages:
+                pdf.add_page(drawing)
+                continue
+            for number in numbers:
+                pages.append((number, drawing))
+        # Physical order; each caption is a few bytes on top of the shared drawing
+        for number, drawing in sorted(pages):
+            caption = zlib.compress(("0 g " + _text_op(PAGE_WIDTH - MARGIN - 60, PAGE_HEIGHT - MARGIN - 12, 12,
+                                                       f"Sheet {number}", centred=False)).encode('latin-1'))
+            pdf.add_page(drawing, pdf.add_stream(caption))
+    return path
+
+
+def _xml(text: str) -> str:
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def svg_document(spec: PageSpec) -> str:
+    """Standalone SVG of one sheet in millimetres, y growing downwards like the cut list GUI."""
+    title, length, width, rects = spec
+    font = max(12.0, min(length, width) / 60)
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{_number(length)}mm" height="{_number(width)}mm" '
+             f'viewBox="0 0 {_number(length)} {_number(width)}" font-family="Arial">',
+             f'<title>{_xml(title)}</title>',
+             f'<rect x="0" y="0" width="{_number(length)}" height="{_number(width)}" fill="none" stroke="black" stroke-width="2"/>']
+    for x, y, w, h, label, dimensions in rects:
+        r, g, b = (int(c * 255) for c in _colour(label))
+        cx, cy = x + w / 2, y + h / 2
+        parts.append(f'<rect x="{_number(x)}" y="{_number(y)}" width="{_number(w)}" height="{_number(h)}" '
+                     f'fill="rgb({r},{g},{b})" stroke="black"/>')
+        parts.append(f'<text x="{cx:g}" y="{cy:g}" font-size="{font:g}" text-anchor="middle" '
+                     f'dominant-baseline="central">{_xml(label)}</text>')
+        parts.append(f'<text x="{cx:g}" y="{cy + font * 1.2:g}" font-size="{font * 0.85:g}" text-anchor="middle" '
+                     f'dominant-baseline="central">{_xml(dimensions)}</text>')
+    parts.append('</svg>')
+    return "\n".join(parts)
+
+
+@timed('render_svg')
+def render_svg(sheets: Union[PlacementTable, Iterable[Dict]], directory: str, prefix: str = 'sheet',
+               gap: int = 0, workers: Optional[int] = None, per_sheet: bool = False) -> List[str]:
+    """Write SVGs, rendering every distinct layout once.
+
+    One file per distinct layout ({prefix}_{i}.svg) by default; with
+    `per_sheet`, one file per physical sheet numbered in plan order, all
+    copies of a layout written from the same rendered document.
+    """
+    os.makedirs(directory, exist_ok=True)
+    layouts = distinct_layouts(sheets, gap)
+    specs = [page_spec(sheet, _sheet_label(numbers)) for sheet, numbers in layouts]
+    tally('layouts_drawn', len(specs))
+    paths = []
+    for i, ((_, numbers), document) in enumerate(zip(layouts, _render(specs, svg_document, workers)), start=1):
+        for n in (numbers if per_sheet else [i]):
+            path = os.path.join(directory, f"{prefix}_{n}.svg")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(document)
+            paths.append(path)
+    return sorted(paths, key=lambda p: int(p.rsplit('_', 1)[1][:-4]))
+
+
+def main():
+    from Benchmark import glass_instance, plywood_instance
+    from PackingCore import group_parts, pack_groups, plan_statistics
+    from GuillotineEngine import pack_guillotine
+
+    parser = argparse.ArgumentParser(description="Render a packed plan to PDF and SVG.")
+    parser.add_argument('--output', default='output', help="Directory for the report")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--repeat-pages', action='store_true', help="One page per physical sheet")
+    parser.add_argument('--svg', action='store_true', help="Also write one SVG per distinct layout")
+    args = parser.parse_args()
+
+    # A 120+ sheet plan mixing repeated grouped patterns with one-off guillotine sheets
+    instance = plywood_instance(0, 120)
+    sheets = pack_groups(group_parts(instance.glass_parts), instance.stock_sizes, instance.gap)
+    extra = glass_instance(1, 150)
+    sheets += pack_guillotine(extra.glass_parts, extra.stock_sizes, extra.gap)
+    stats = plan_statistics(sheets)
+    os.makedirs(args.output, exist_ok=True)
+
+    start = time.perf_counter()
+    path = render_pdf(sheets, os.path.join(args.output, 'layout_report.pdf'),
+                      summary=["Layout report", f"Sheets: {stats['total_sheets']}",
+                               f"Used area: {stats['used_area_percentage']:.2f}%"],
+                      gap=instance.gap, workers=args.workers, repeat_pages=args.repeat_pages)
+    print(f"{stats['total_sheets']} sheets, {len(distinct_layouts(sheets, instance.gap))} distinct layouts -> "
+          f"{path} ({os.path.getsize(path) / 1024:.0f} KB) in {time.perf_counter() - start:.2f}s")
+    if args.svg:
+        start = time.perf_counter()
+        paths = render_svg(sheets, os.path.join(args.output, 'svg'), gap=instance.gap, workers=args.workers)
+        print(f"{len(paths)} SVG files in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""Split a cut list by material and pack each material in its own process.
+
+Parts only share a sheet when they are cut from the same material, so a
+multi-material job is a set of independent packing problems. partition_parts
+groups the parts by material (and thickness and colour, when the rows carry
+them) and gives each group its stock; pack_partitions packs the groups on a
+process pool and merges the results into one plan, reporting each finished
+material through a progress callback.
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+from Instrumentation import timed
+from PackingCore import plan_piece_count, plan_statistics
+from PlacementStore import PlacementTable
+
+# Part fields that separate partitions, in label order
+PARTITION_KEYS = ('material', 'thickness', 'colour')
+DEFAULT_PARTITION = 'default'
+
+
+@dataclass
+class MaterialJob:
+    label: str
+    glass_parts: List[Dict]
+    stock_sizes: List[Dict]
+
+
+@dataclass
+class PartitionResult:
+    label: str
+    elapsed: float
+    placements: Optional[PlacementTable] = None
+    stats: Optional[Dict] = None
+    complete: bool = False
+    error: Optional[str] = None
+
+    @property
+    def sheets(self) -> List[Dict]:
+        return self.placements.to_sheets() if self.placements is not None else []
+
+
+@dataclass
+class PartitionProgress:
+    label: str
+    state: str  # 'done' or 'failed'
+    finished: int
+    total: int
+    message: str = ''
+
+
+@dataclass
+class PartitionPlan:
+    results: List[PartitionResult] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def complete(self) -> bool:
+        return all(r.complete for r in self.results)
+
+    @property
+    def errors(self) -> Dict[str, str]:
+        return {r.label: r.error for r in self.results if r.error}
+
+    def sheets(self) -> List[Dict]:
+        """Every material's sheets in partition order, each tagged with its 'material' label."""
+        return [dict(sheet, material=r.label) for r in self.results for sheet in r.sheets]
+
+    def statistics(self) -> Dict:
+        return plan_statistics(self.sheets())
+
+
+def partition_label(part: Dict, keys: Sequence[str] = PARTITION_KEYS) -> str:
+    values = (str(part.get(key) or '').strip() for key in keys)
+    return ' '.join(v for v in values if v) or DEFAULT_PARTITION
+
+
+def partition_parts(glass_parts: List[Dict], stock_sizes: Union[List[Dict], Dict[str, List[Dict]]],
+                    keys: Sequence[str] = PARTITION_KEYS) -> List[MaterialJob]:
+    """Group parts by partition label, in first-seen order, each with its stock.
+
+    `stock_sizes` is either one stock list shared by every material or a dict
+    from label to stock list, optionally with a DEFAULT_PARTITION entry for
+    materials it does not name. A material without stock raises ValueError.
+    """
+    groups: Dict[str, List[Dict]] = {}
+    for part in glass_parts:
+        groups.setdefault(partition_label(part, keys), []).append(part)
+    jobs = []
+    for label, parts in groups.items():
+        if isinstance(stock_sizes, dict):
+            stock = stock_sizes.get(label, stock_sizes.get(DEFAULT_PARTITION))
+            if stock is None:
+                raise ValueError(f"No stock sizes for material {label!r}")
+        else:
+            stock = stock_sizes
+        jobs.append(MaterialJob(label, parts, [dict(s) for s in stock]))
+    return jobs
+
+
+def pack_partition(job: MaterialJob, gap: int = 0, algorithm: str = 'grouped_blocks',
+                   time_limit: float = 10.0, allow_rotation: bool = True) -> PartitionResult:
+    """Pack one material with a pack.py algorithm; errors are reported instead of raised."""
+    from pack import pack
+
+    start = time.perf_counter()
+    glass_parts = [{'location': p['location'], 'length': p['length'], 'height': p['height'], 'qty': p.get('qty', 1)}
+                   for p in job.glass_parts]
+    try:
+        sheets = pack(glass_parts, job.stock_sizes, gap, algorithm, time_limit, allow_rotation)
+    except Exception as e:
+        return PartitionResult(job.label, time.perf_counter() - start, error=f"{type(e).__name__}: {e}")
+    demand = sum(p['qty'] for p in glass_parts)
+    return PartitionResult(job.label, time.perf_counter() - start, PlacementTable.from_sheets(sheets, gap),
+                           plan_statistics(sheets), complete=plan_piece_count(sheets) == demand)
+
+
+@timed('pack_partitions')
+def pack_partitions(jobs: List[MaterialJob], gap: int = 0, algorithm: str = 'grouped_blocks',
+                    time_limit: float = 10.0, max_workers: Optional[int] = None,
+                    progress: Optional[Callable[[PartitionProgress], None]] = None,
+                    allow_rotation: bool = True) -> PartitionPlan:
+    """Pack every partition in its own worker process and merge the results.
+
+    `progress` is called in the calling thread as each partition finishes. A
+    GUI should run this off its main thread and hand the events over through
+    a queue.Queue that the main loop polls. Workers are spawned rather than
+    forked, since forking a threaded GUI process is unsafe. A single partition
+    is packed in-process, since a pool would only add startup time.
+    """
+    start = time.perf_counter()
+    results: Dict[str, PartitionResult] = {}
+
+    def finished(result: PartitionResult):
+        results[result.label] = result
+        if progress:
+            state = 'done' if result.complete else 'failed'
+            message = result.error or ('' if result.complete else 'pieces left unplaced')
+            progress(PartitionProgress(result.label, state, len(results), len(jobs), message))
+
+    if len(jobs) <= 1 or max_workers == 1:
+        for job in jobs:
+            finished(pack_partition(job, gap, algorithm, time_limit, allow_rotation))
+    else:
+        with ProcessPoolExecutor(max_workers=min(len(jobs), max_workers or os.cpu_count()),
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            pending = {executor.submit(pack_partition, job, gap, algorithm, time_limit, allow_rotation)
+                       for job in jobs}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finished(future.result())
+    return PartitionPlan([results[job.label] for job in jobs], time.perf_counter() - start)
+
+
+def main():
+    from CutListIngest import read_table
+
+    parser = argparse.ArgumentParser(description="Pack a cut list one material at a time, in parallel.")
+    parser.add_argument('parts', help="Cut list with a material column (CSV/XLSX)")
+    parser.add_argument('stock', help="Stock sizes shared by every material (CSV/XLSX)")
+    parser.add_argument('--gap', type=int, default=0)
+    parser.add_argument('--algorithm', default='grouped_blocks')
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args()
+
+    glass_parts = [{'location': r.label, 'length': int(r.length), 'height': int(r.height), 'qty': r.qty,
+                    'material': r.material} for r in read_table(args.parts)]
+    stock_sizes = [{'length': int(r.length), 'width': int(r.height), 'qty': r.qty} for r in read_table(args.stock)]
+    jobs = partition_parts(glass_parts, stock_sizes)
+    plan = pack_partitions(jobs, args.gap, args.algorithm, max_workers=args.workers,
+                           progress=lambda event: print(f"[{event.finished}/{event.total}] {event.label}: "
+                                                        f"{event.state} {event.message}".rstrip()))
+    for result in plan.results:
+        if result.stats:
+            print(f"  {result.label:<20} {result.stats['total_sheets']:>4} sheets "
+                  f"{result.stats['wastage_percentage']:6.2f}% waste {result.elapsed:6.2f}s")
+    stats = plan.statistics()
+    print(f"{len(jobs)} materials, {stats['total_sheets']} sheets, {stats['wastage_percentage']:.2f}% waste "
+          f"in {plan.elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+from Instrumentation import high_water, record_find, tally
+
+Rect = Tuple[int, int, int, int]  # (x, y, width, height)
+
+
+class FreeRectIndex:
+    """MaxRects free-space set with an area-ordered index for best-fit queries.
+
+    Free rectangles are maximal and may overlap. Placing a part splits every
+    free rectangle it intersects into at most four maximal pieces and drops any
+    piece that is contained in another free rectangle.
+    """
+
+    def __init__(self, length: int, width: int):
+        self.length = length
+        self.width = width
+        self._rects: Dict[int, Rect] = {}
+        # Sorted (area, id) keys; the smallest fitting rect is found by bisecting to
+        # the part area and walking forward until the first rect that fits.
+        self._by_area: List[Tuple[int, int]] = []
+        self._next_id = 0
+        self._insert((0, 0, length, width))
+
+    def __len__(self) -> int:
+        return len(self._rects)
+
+    def __iter__(self):
+        return iter(self._rects.values())
+
+    def copy(self) -> 'FreeRectIndex':
+        """Independent copy, for trying placements that may be thrown away."""
+        clone = FreeRectIndex.__new__(FreeRectIndex)
+        clone.length, clone.width = self.length, self.width
+        clone._rects = dict(self._rects)
+        clone._by_area = list(self._by_area)
+        clone._next_id = self._next_id
+        return clone
+
+    def largest_area(self) -> int:
+        """Area of the biggest free rect; no part of larger area fits anywhere."""
+        return self._by_area[-1][0] if self._by_area else 0
+
+    def rects(self) -> List[Rect]:
+        """Return the free rectangles as (x, y, width, height) tuples."""
+        return list(self._rects.values())
+
+    def _insert(self, rect: Rect):
+        rid = self._next_id
+        self._next_id += 1
+        self._rects[rid] = rect
+        insort(self._by_area, (rect[2] * rect[3], rid))
+
+    def _remove(self, rid: int):
+        rect = self._rects.pop(rid)
+        key = (rect[2] * rect[3], rid)
+        del self._by_area[bisect_left(self._by_area, key)]
+
+    def find(self, length: int, height: int, allow_rotation: bool = True) -> Optional[Tuple[int, int, bool]]:
+        """Smallest free rect that fits length x height in either orientation.
+
+        Returns (x, y, rotated) for the bottom-left corner of that rect, or None.
+        """
+        fit = self.find_rect(length, height, allow_rotation)
+        if fit is None:
+            return None
+        rect, rotated = fit
+        return rect[0], rect[1], rotated
+
+    def find_rect(self, length: int, height: int, allow_rotation: bool = True) -> Optional[Tuple[Rect, bool]]:
+        """Like find, but returns the whole free rect and the orientation."""
+        rects, by_area = self._rects, self._by_area
+        start = bisect_left(by_area, (length * height, -1))
+        for i in range(start, len(by_area)):
+            rect = rects[by_area[i][1]]
+            if length <= rect[2] and height <= rect[3]:
+                record_find(i - start + 1)
+                return rect, False
+            if allow_rotation and height <= rect[2] and length <= rect[3]:
+                record_find(i - start + 1)
+                return rect, True
+        record_find(len(by_area) - start)
+        return None
+
+    def place(self, x: int, y: int, length: int, height: int):
+        """Mark the rectangle at (x, y) of size length x height as used."""
+        right, top = x + length, y + height
+        new_rects: List[Rect] = []
+
+        for rid, (sx, sy, sw, sh) in list(self._rects.items()):
+            if x >= sx + sw or right <= sx or y >= sy + sh or top <= sy:
+                continue
+            self._remove(rid)
+            if x > sx:
+                new_rects.append((sx, sy, x - sx, sh))
+            if right < sx + sw:
+                new_rects.append((right, sy, sx + sw - right, sh))
+            if y > sy:
+                new_rects.append((sx, sy, sw, y - sy))
+            if top < sy + sh:
+                new_rects.append((sx, top, sw, sy + sh - top))
+
+        # Untouched rects were already maximal against each other, so only the new
+        # pieces need a containment check.
+        existing = list(self._rects.values())
+        for i, rect in enumerate(new_rects):
+            if _contained_in_any(rect, existing):
+                continue
+            if any(j != i and _contains(other, rect) and (other != rect or j < i)
+                   for j, other in enumerate(new_rects)):
+                continue
+            self._insert(rect)
+        tally('placements')
+        high_water('free_rects', len(self._rects))
+
+    def used_area(self) -> int:
+        return self.length * self.width - self.free_area()
+
+    def free_area(self) -> int:
+        """Area not covered by placements (free rects overlap, so sweep the union)."""
+        return _union_area(self.rects())
+
+
+def _contains(outer: Rect, inner: Rect) -> bool:
+    return (inner[0] >= outer[0] and inner[1] >= outer[1]
+            and inner[0] + inner[2] <= outer[0] + outer[2]
+            and inner[1] + inner[3] <= outer[1] + outer[3])
+
+
+def _contained_in_any(rect: Rect, rects: List[Rect]) -> bool:
+    return any(_contains(other, rect) for other in rects)
+
+
+def _union_area(rects: List[Rect]) -> int:
+    xs = sorted({r[0] for r in rects} | {r[0] + r[2] for r in rects})
+    area = 0
+    for left, right in zip(xs, xs[1:]):
+        spans = sorted((r[1], r[1] + r[3]) for r in rects if r[0] <= left and r[0] + r[2] >= right)
+        covered, end = 0, None
+        for lo, hi in spans:
+            if end is None or lo > end:
+                covered += hi - lo
+                end = hi
+            elif hi > end:
+                covered += hi - end
+                end = hi
+        area += covered * (right - left)
+    return area
@@ -0,0 +1,234 @@
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from Instrumentation import tally, timed
+from MaxRectsEngine import FreeRectIndex
+
+
+@dataclass
+class PartGroup:
+    location: str
+    length: int
+    height: int
+    qty: int
+
+    @property
+    def area(self) -> int:
+        return self.length * self.height
+
+    def as_part(self) -> Dict:
+        return {'location': self.location, 'length': self.length, 'height': self.height}
+
+
+def group_parts(glass_parts: List[Dict]) -> List[PartGroup]:
+    """Merge rows with the same location and size into quantity groups."""
+    groups: Dict[Tuple[str, int, int], PartGroup] = {}
+    for part in glass_parts:
+        key = (part['location'], part['length'], part['height'])
+        if key in groups:
+            groups[key].qty += part.get('qty', 1)
+        else:
+            groups[key] = PartGroup(part['location'], part['length'], part['height'], part.get('qty', 1))
+    return list(groups.values())
+
+
+def _best_block(group: PartGroup, remaining: int, space: Tuple[int, int, int, int], gap: int,
+                allow_rotation: bool = True):
+    """Largest full-row block of one group that fits in a free rect."""
+    _, _, w, h = space
+    best = None
+    for rotated in ((False, True) if allow_rotation else (False,)):
+        pl, ph = (group.height, group.length) if rotated else (group.length, group.height)
+        columns = w // (pl + gap)
+        rows = h // (ph + gap)
+        if columns == 0 or rows == 0:
+            continue
+        if remaining < columns:
+            columns, rows = remaining, 1
+        else:
+            rows = min(rows, remaining // columns)
+        if best is None or columns * rows > best[0] * best[1]:
+            best = (columns, rows, rotated)
+    return best
+
+
+def _fill_sheet(groups: List[PartGroup], demand: List[int], length: int, width: int, gap: int,
+                allow_rotation: bool = True):
+    """Tile the remaining demand onto one sheet; returns the blocks and per-group counts used."""
+    free_space = FreeRectIndex(length, width)
+    blocks = []
+    used = [0] * len(groups)
+
+    for i, group in enumerate(groups):
+        while demand[i] - used[i] > 0:
+            fit = free_space.find_rect(group.length + gap, group.height + gap, allow_rotation)
+            if fit is None:
+                break
+            space = fit[0]
+            x, y = space[0], space[1]
+            columns, rows, rotated = _best_block(group, demand[i] - used[i], space, gap, allow_rotation)
+            pl, ph = (group.height, group.length) if rotated else (group.length, group.height)
+            free_space.place(x, y, columns * (pl + gap), rows * (ph + gap))
+            blocks.append({'group': i, 'position': (x, y), 'rotated': rotated,
+                           'columns': columns, 'rows': rows})
+            used[i] += columns * rows
+
+    return blocks, used
+
+
+class PatternCache:
+    """Sheet patterns keyed by stock size and the canonical remaining demand.
+
+    A pattern is the set of blocks _fill_sheet produced for that demand, with
+    groups referred to by their slot in the non-zero demand list so it can be
+    reused by any job that reaches the same (size, quantity) multiset.
+    """
+
+    def __init__(self):
+        self._patterns: Dict[Tuple, Tuple[List[Dict], List[int]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    @staticmethod
+    def key(groups: List[PartGroup], demand: List[int], length: int, width: int, gap: int,
+            allow_rotation: bool = True) -> Tuple:
+        remaining = tuple((g.length, g.height, qty) for g, qty in zip(groups, demand) if qty)
+        return (length, width, gap, allow_rotation, remaining)
+
+    def fill_sheet(self, groups: List[PartGroup], demand: List[int], length: int, width: int, gap: int,
+                   allow_rotation: bool = True):
+        """Cached _fill_sheet: returns (blocks, used) for the current demand."""
+        slots = [i for i, qty in enumerate(demand) if qty]
+        key = self.key(groups, demand, length, width, gap, allow_rotation)
+        cached = self._patterns.get(key)
+        if cached is None:
+            self.misses += 1
+            tally('pattern_cache_misses')
+            blocks, used = _fill_sheet(groups, demand, length, width, gap, allow_rotation)
+            slot_of = {group: slot for slot, group in enumerate(slots)}
+            self._patterns[key] = ([dict(b, group=slot_of[b['group']]) for b in blocks],
+                                   [used[i] for i in slots])
+            return blocks, used
+
+        self.hits += 1
+        tally('pattern_cache_hits')
+        pattern_blocks, pattern_used = cached
+        used = [0] * len(groups)
+        for slot, count in enumerate(pattern_used):
+            used[slots[slot]] = count
+        return [dict(b, group=slots[b['group']]) for b in pattern_blocks], used
+
+
+@timed('pack_groups')
+def pack_groups(groups: List[PartGroup], stock_sizes: List[Dict], gap: int = 0,
+                cache: Optional[PatternCache] = None, allow_rotation: bool = True) -> List[Dict]:
+    """Pack quantity groups onto stock sheets as tiled blocks.
+
+    Each sheet is tried against every stock size that still has quantity and the
+    one with the best utilization is kept. A chosen pattern is repeated as many
+    times as the remaining demand and stock allow, so sheets come back as
+    {'size': (length, width), 'blocks': [...], 'repeat': k} where each block is
+    a columns x rows tile of one part; use expand_placements for per-piece output.
+    With allow_rotation=False every part keeps its length along the sheet
+    length, e.g. to follow the grain of sheet goods.
+    """
+    cache = cache if cache is not None else PatternCache()
+    groups = sorted(groups, key=lambda g: (g.area, g.length, g.height), reverse=True)
+    demand = [g.qty for g in groups]
+    stock_left = [stock.get('qty', float('inf')) for stock in stock_sizes]
+    sheets = []
+
+    while any(demand):
+        best = None
+        for s, stock in enumerate(stock_sizes):
+            if stock_left[s] <= 0:
+                continue
+            blocks, used = cache.fill_sheet(groups, demand, stock['length'], stock['width'], gap, allow_rotation)
+            placed_area = sum(used[i] * groups[i].area for i in range(len(groups)))
+            utilization = placed_area / (stock['length'] * stock['width'])
+            if blocks and (best is None or utilization > best[0]):
+                best = (utilization, s, blocks, used)
+
+        if best is None:
+            unplaced = [groups[i].location for i, qty in enumerate(demand) if qty]
+            raise ValueError(f"Parts do not fit on any available stock sheet: {unplaced}")
+
+        _, s, blocks, used = best
+        # Cut the same pattern as often as every group in it still has demand
+        repeat = min(demand[i] // count for i, count in enumerate(used) if count)
+        repeat = int(min(repeat, stock_left[s]))
+        stock_left[s] -= repeat
+        for i, count in enumerate(used):
+            demand[i] -= count * repeat
+        sheets.append({
+            'size': (stock_sizes[s]['length'], stock_sizes[s]['width']),
+            'blocks': [dict(block, part=groups[block['group']].as_part()) for block in blocks],
+            'repeat': repeat,
+        })
+
+    return sheets
+
+
+def iter_block_placements(block: Dict, gap: int = 0) -> Iterator[Dict]:
+    """Yield the per-piece placements covered by one tiled block."""
+    part, rotated = block['part'], block['rotated']
+    pl, ph = (part['height'], part['length']) if rotated else (part['length'], part['height'])
+    x0, y0 = block['position']
+    for row in range(block['rows']):
+        for column in range(block['columns']):
+            yield {'part': part, 'position': (x0 + column * (pl + gap), y0 + row * (ph + gap)),
+                   'rotated': rotated}
+
+
+def expand_placements(sheets: List[Dict], gap: int = 0) -> Iterator[Dict]:
+    """Expand grouped sheets to the per-piece {'size', 'placements'} layout, one pattern at a time.
+
+    The repeat count is carried over, so a pattern cut k times is expanded once.
+    """
+    for sheet in sheets:
+        placements = []
+        for block in sheet['blocks']:
+            placements.extend(iter_block_placements(block, gap))
+        yield {'size': sheet['size'], 'placements': placements, 'repeat': sheet.get('repeat', 1)}
+
+
+def sheet_piece_area(sheet: Dict) -> int:
+    """Glass area placed on one copy of a sheet in either grouped or per-piece form."""
+    if 'blocks' in sheet:
+        return sum(b['part']['length'] * b['part']['height'] * b['columns'] * b['rows']
+                   for b in sheet['blocks'])
+    return sum(p['part']['length'] * p['part']['height'] for p in sheet['placements'])
+
+
+def sheet_piece_count(sheet: Dict) -> int:
+    """Pieces on one copy of a sheet in either grouped or per-piece form."""
+    if 'blocks' in sheet:
+        return sum(b['columns'] * b['rows'] for b in sheet['blocks'])
+    return len(sheet['placements'])
+
+
+def plan_piece_count(sheets: List[Dict]) -> int:
+    return sum(sheet_piece_count(sheet) * sheet.get('repeat', 1) for sheet in sheets)
+
+
+def plan_statistics(sheets: List[Dict], glass_area_mm2: Optional[int] = None) -> Dict:
+    """Area totals, utilization and sheet-size summary for a packed plan."""
+    if glass_area_mm2 is None:
+        glass_area_mm2 = sum(sheet_piece_area(sheet) * sheet.get('repeat', 1) for sheet in sheets)
+    sheet_area_mm2 = sum(sheet['size'][0] * sheet['size'][1] * sheet.get('repeat', 1) for sheet in sheets)
+    used_area_percentage = (glass_area_mm2 / sheet_area_mm2) * 100 if sheet_area_mm2 else 0
+    sheet_counter = Counter()
+    for sheet in sheets:
+        sheet_counter[(sheet['size'][0], sheet['size'][1])] += sheet.get('repeat', 1)
+    return {
+        'total_glass_area_m2': glass_area_mm2 / 1_000_000,
+        'total_sheet_area_m2': sheet_area_mm2 / 1_000_000,
+        'total_sheets': sum(sheet_counter.values()),
+        'used_area_percentage': used_area_percentage,
+        'wastage_percentage': 100 - used_area_percentage if sheet_area_mm2 else 0,
+        'sheet_counter': sheet_counter,
+    }
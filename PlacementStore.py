@@ -0,0 +1,227 @@
+from array import array
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+from PackingCore import iter_block_placements
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# array typecode -> NumPy dtype for zero-copy export (NumPy is only imported by to_numpy)
+_DTYPES = {'i': 'int32', 'l': 'int64', 'q': 'int64', 'd': 'float64', 'B': 'uint8'}
+
+PartKey = Tuple[str, float, float]  # (location, length, height)
+
+
+def _number(value: float):
+    """Coordinates are stored as doubles; give whole values back as ints."""
+    return int(value) if value.is_integer() else value
+
+
+class PlacementView:
+    """Read-only view of one row of a PlacementTable."""
+    __slots__ = ('_table', '_i')
+
+    def __init__(self, table: 'PlacementTable', i: int):
+        self._table = table
+        self._i = i
+
+    @property
+    def sheet(self) -> int:
+        return self._table.sheet_id[self._i]
+
+    @property
+    def part(self) -> Dict:
+        return self._table.part(self._table.part_type[self._i])
+
+    @property
+    def x(self) -> float:
+        return self._table.x[self._i]
+
+    @property
+    def y(self) -> float:
+        return self._table.y[self._i]
+
+    @property
+    def position(self) -> Tuple[float, float]:
+        return _number(self._table.x[self._i]), _number(self._table.y[self._i])
+
+    @property
+    def width(self) -> float:
+        return self._table.w[self._i]
+
+    @property
+    def height(self) -> float:
+        return self._table.h[self._i]
+
+    @property
+    def rotated(self) -> bool:
+        return bool(self._table.rotated[self._i])
+
+    def as_dict(self) -> Dict:
+        """The {'part', 'position', 'rotated'} placement dict used by the layout code."""
+        return {'part': self.part, 'position': self.position, 'rotated': self.rotated}
+
+    def __repr__(self) -> str:
+        return (f"PlacementView(sheet={self.sheet}, part={self.part['location']!r}, x={self.x}, y={self.y}, "
+                f"w={self.width}, h={self.height}, rotated={self.rotated})")
+
+
+class PlacementTable:
+    """Packed plan as parallel typed arrays, one row per placed piece.
+
+    Part types are interned once and referenced by id. Rows are stored sheet by
+    sheet, so a sheet is a contiguous slice recorded in `sheet_start`; only the
+    newest sheet accepts appends. Columns export to NumPy without copying.
+    """
+
+    def __init__(self):
+        self.sheet_id = array('i')
+        self.part_type = array('i')
+        self.x = array('d')
+        self.y = array('d')
+        self.w = array('d')
+        self.h = array('d')
+        self.rotated = array('B')
+        # Per-sheet columns
+        self.sheet_length = array('d')
+        self.sheet_width = array('d')
+        self.sheet_repeat = array('q')
+        self.sheet_start = array('q')
+        self._parts: List[PartKey] = []
+        self._part_index: Dict[PartKey, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.sheet_id)
+
+    def __iter__(self) -> Iterator[PlacementView]:
+        return (PlacementView(self, i) for i in range(len(self)))
+
+    def __getitem__(self, i: int) -> PlacementView:
+        if not -len(self) <= i < len(self):
+            raise IndexError(i)
+        return PlacementView(self, i % len(self))
+
+    @property
+    def sheet_count(self) -> int:
+        return len(self.sheet_length)
+
+    def intern_part(self, location: str, length: float, height: float) -> int:
+        key = (location, length, height)
+        part_id = self._part_index.get(key)
+        if part_id is None:
+            part_id = self._part_index[key] = len(self._parts)
+            self._parts.append(key)
+        return part_id
+
+    def part(self, part_id: int) -> Dict:
+        location, length, height = self._parts[part_id]
+        return {'location': location, 'length': length, 'height': height}
+
+    def add_sheet(self, length: float, width: float, repeat: int = 1) -> int:
+        self.sheet_length.append(length)
+        self.sheet_width.append(width)
+        self.sheet_repeat.append(repeat)
+        self.sheet_start.append(len(self))
+        return len(self.sheet_length) - 1
+
+    def append(self, sheet: int, part_id: int, x: float, y: float, w: float, h: float, rotated: bool):
+        if sheet != len(self.sheet_length) - 1:
+            raise ValueError(f"Placements must be appended to the newest sheet ({len(self.sheet_length) - 1}), got {sheet}")
+        self.sheet_id.append(sheet)
+        self.part_type.append(part_id)
+        self.x.append(x)
+        self.y.append(y)
+        self.w.append(w)
+        self.h.append(h)
+        self.rotated.append(rotated)
+
+    def add_piece(self, sheet: int, part: Dict, position: Tuple[float, float], rotated: bool):
+        """Append a layout-style placement: part dict, (x, y) and rotation flag."""
+        length, height = part['length'], part['height']
+        w, h = (height, length) if rotated else (length, height)
+        self.append(sheet, self.intern_part(part['location'], length, height), position[0], position[1], w, h, rotated)
+
+    def sheet_slice(self, sheet: int) -> slice:
+        start = self.sheet_start[sheet]
+        stop = self.sheet_start[sheet + 1] if sheet + 1 < len(self.sheet_start) else len(self)
+        return slice(start, stop)
+
+    def sheet_placements(self, sheet: int) -> List[PlacementView]:
+        return [PlacementView(self, i) for i in range(*self.sheet_slice(sheet).indices(len(self)))]
+
+    def to_numpy(self) -> Dict[str, 'np.ndarray']:
+        """Zero-copy NumPy views of every column.
+
+        The views pin the underlying arrays: append or add_sheet raises
+        BufferError while any of them is alive, so drop them (or copy them)
+        before adding more placements.
+        """
+        import numpy as np
+        columns = {name: getattr(self, name) for name in
+                   ('sheet_id', 'part_type', 'x', 'y', 'w', 'h', 'rotated',
+                    'sheet_length', 'sheet_width', 'sheet_repeat', 'sheet_start')}
+        return {name: np.frombuffer(column, dtype=_DTYPES[column.typecode]) if len(column)
+                else np.empty(0, dtype=_DTYPES[column.typecode]) for name, column in columns.items()}
+
+    def piece_area_by_sheet(self) -> 'np.ndarray':
+        """Placed area on one copy of each sheet."""
+        import numpy as np
+        cols = self.to_numpy()
+        return np.bincount(cols['sheet_id'], weights=cols['w'] * cols['h'], minlength=self.sheet_count)
+
+    def is_valid(self) -> bool:
+        """Every piece lies on its sheet and no two pieces on a sheet overlap."""
+        import numpy as np
+        cols = self.to_numpy()
+        for s in range(self.sheet_count):
+            rows = self.sheet_slice(s)
+            x, y, w, h = cols['x'][rows], cols['y'][rows], cols['w'][rows], cols['h'][rows]
+            if (x < 0).any() or (y < 0).any() or (x + w > cols['sheet_length'][s]).any() \
+                    or (y + h > cols['sheet_width'][s]).any():
+                return False
+            overlap = ((x[:, None] < x[None, :] + w[None, :]) & (x[None, :] < x[:, None] + w[:, None])
+                       & (y[:, None] < y[None, :] + h[None, :]) & (y[None, :] < y[:, None] + h[:, None]))
+            np.fill_diagonal(overlap, False)
+            if overlap.any():
+                return False
+        return True
+
+    def nbytes(self) -> int:
+        return sum(column.itemsize * len(column) for column in
+                   (self.sheet_id, self.part_type, self.x, self.y, self.w, self.h, self.rotated,
+                    self.sheet_length, self.sheet_width, self.sheet_repeat, self.sheet_start))
+
+    @classmethod
+    def from_sheets(cls, sheets: List[Dict], gap: int = 0) -> 'PlacementTable':
+        """Build from per-piece ({'placements'}) or grouped ({'blocks'}) sheet dicts."""
+        table = cls()
+        for sheet in sheets:
+            s = table.add_sheet(sheet['size'][0], sheet['size'][1], sheet.get('repeat', 1))
+            if 'blocks' in sheet:
+                placements = (p for block in sheet['blocks'] for p in iter_block_placements(block, gap))
+            else:
+                placements = sheet['placements']
+            for placement in placements:
+                table.add_piece(s, placement['part'], placement['position'], placement['rotated'])
+        return table
+
+    @classmethod
+    def from_flat_placements(cls, placements: List[Dict]) -> 'PlacementTable':
+        """Build from GlassCuttingOptimizer's flat list keyed by 'sheet_number'/'sheet_size'."""
+        table = cls()
+        current: Optional[int] = None
+        for placement in sorted(placements, key=lambda p: p['sheet_number']):
+            if placement['sheet_number'] != current:
+                current = placement['sheet_number']
+                length, width = (float(v) for v in placement['sheet_size'].split('x'))
+                s = table.add_sheet(length, width)
+            part_id = table.intern_part(placement['location'], placement['length'], placement['height'])
+            table.append(s, part_id, placement['x'], placement['y'], placement['length'], placement['height'], False)
+        return table
+
+    def to_sheets(self) -> List[Dict]:
+        """Per-piece {'size', 'placements', 'repeat'} sheet dicts."""
+        return [{'size': (_number(self.sheet_length[s]), _number(self.sheet_width[s])),
+                 'placements': [view.as_dict() for view in self.sheet_placements(s)],
+                 'repeat': self.sheet_repeat[s]}
+                for s in range(self.sheet_count)]
@@ -0,0 +1,180 @@
+"""Use a trained packing policy as a constructive packer.
+
+The policy drives VectorBinPackingEnv: at every step it picks the next part
+type and orientation, and the env drops the piece bottom-left onto the
+skyline. Whenever the chosen action is infeasible, the best-fit-decreasing
+choice for that step is used instead: the feasible piece with the longest
+side, in the orientation whose top ends lowest. Without a policy, that
+rule alone packs the order, which gives the heuristic baseline the policy
+has to beat.
+
+Each stock size is packed in its own batch of `rollouts` envs, so inference
+runs on the whole batch at once. The plan with the fewest sheets that the
+stock quantity covers is kept. Policies are Stable-Baselines3 zip files
+(MaskablePPO when sb3_contrib is installed, PPO otherwise) trained on a
+VectorBinPackingEnv of the same order and cell size.
+"""
+import argparse
+import importlib
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from Instrumentation import timed
+from PackingCore import plan_piece_count, plan_statistics
+from VectorBinPackingEnv import VectorBinPackingEnv
+
+# (observations, action masks, deterministic) -> one action per env
+Policy = Callable[[np.ndarray, np.ndarray, bool], np.ndarray]
+
+
+def load_policy(path: str) -> Policy:
+    """Load a saved Stable-Baselines3 policy for CPU inference."""
+    try:
+        from sb3_contrib import MaskablePPO
+        model = MaskablePPO.load(path, device='cpu')
+        masked = True
+    except ImportError:
+        from stable_baselines3 import PPO
+        model = PPO.load(path, device='cpu')
+        masked = False
+
+    def policy(observations: np.ndarray, masks: np.ndarray, deterministic: bool) -> np.ndarray:
+        if model.observation_space.shape != observations.shape[1:] or model.action_space.n != masks.shape[1]:
+            raise ValueError(f"Policy {path} was trained on observations {model.observation_space.shape} and "
+                             f"{model.action_space.n} actions, this order needs {observations.shape[1:]} and "
+                             f"{masks.shape[1]}")
+        if masked:
+            actions, _ = model.predict(observations, action_masks=masks, deterministic=deterministic)
+        else:
+            actions, _ = model.predict(observations, deterministic=deterministic)
+        return np.asarray(actions, dtype=np.int64)
+
+    return policy
+
+
+def best_fit_decreasing_actions(env: VectorBinPackingEnv) -> np.ndarray:
+    """Per env: the feasible piece with the longest side, in the orientation that tops out lowest."""
+    longest = np.repeat(np.maximum(*(np.array([(p['length'], p['height']) for p in env.parts]).T)), 2)
+    score = longest * (env.rows + 2) - (env.landing + env.action_height)
+    return np.argmax(np.where(env.mask, score, -np.inf), axis=1)
+
+
+@dataclass
+class PolicyRun:
+    sheets: List[Dict]
+    policy_steps: int
+    fallback_steps: int
+    elapsed: float
+
+
+class PolicyPacker:
+    def __init__(self, policy: Optional[Policy] = None, cell: int = 25, rollouts: int = 1):
+        self.policy = policy
+        self.cell = cell
+        self.rollouts = rollouts
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> 'PolicyPacker':
+        return cls(load_policy(path), **kwargs)
+
+    def rollout(self, glass_parts: List[Dict], sheet_size, gap: int = 0) -> List[PolicyRun]:
+        """Pack the order on one sheet size in `rollouts` lockstep envs.
+
+        Env 0 follows the policy deterministically and the others sample
+        from it, so extra rollouts only pay off with a policy.
+        """
+        start = time.perf_counter()
+        env = VectorBinPackingEnv(glass_parts, sheet_size, self.rollouts, gap, self.cell, record=True)
+        observations, info = env.reset()
+        runs: List[Optional[PolicyRun]] = [None] * self.rollouts
+        policy_steps = np.zeros(self.rollouts, dtype=np.int64)
+        while any(run is None for run in runs):
+            mask = info['action_mask']
+            fallback = best_fit_decreasing_actions(env)
+            if self.policy is None:
+                actions = fallback
+            else:
+                actions = self.policy(observations, mask, True)
+                if self.rollouts > 1:
+                    actions[1:] = self.policy(observations[1:], mask[1:], False)
+                chosen = mask[env._envs, actions]
+                policy_steps += chosen
+                actions = np.where(chosen, actions, fallback)
+            observations, _, terminated, truncated, info = env.step(actions)
+            for n in np.flatnonzero(terminated | truncated):
+                if runs[n] is None:
+                    sheets = env.to_sheets(n)
+                    placed = plan_piece_count(sheets)
+                    runs[n] = PolicyRun(sheets, int(policy_steps[n]), placed - int(policy_steps[n]),
+                                        time.perf_counter() - start)
+        return runs
+
+    @timed('PolicyPacker.pack')
+    def pack(self, glass_parts: List[Dict], stock_sizes: List[Dict], gap: int = 0) -> List[Dict]:
+        """Best rollout over the stock sizes that fit every part and have enough sheets."""
+        demand = sum(p['qty'] for p in glass_parts)
+        best, best_key = None, None
+        for stock in stock_sizes:
+            try:
+                runs = self.rollout(glass_parts, (stock['length'], stock['width']), gap)
+            except ValueError:
+                continue  # some part does not fit this size
+            for run in runs:
+                if plan_piece_count(run.sheets) != demand or len(run.sheets) > stock.get('qty', float('inf')):
+                    continue
+                key = (len(run.sheets), stock['length'] * stock['width'])
+                if best_key is None or key < best_key:
+                    best, best_key = run, key
+        if best is None:
+            raise ValueError("No single stock size can hold the order")
+        return best.sheets
+
+
+def best_fit_decreasing(glass_parts: List[Dict], stock_sizes: List[Dict], gap: int = 0, cell: int = 25) -> List[Dict]:
+    """The fallback rule on its own: PolicyPacker without a policy."""
+    return PolicyPacker(cell=cell).pack(glass_parts, stock_sizes, gap)
+
+
+def main():
+    bin_packing = importlib.import_module('2D_Bin_Packeging')
+    from PortfolioRunner import STRATEGY_KINDS, default_strategies
+
+    parser = argparse.ArgumentParser(description="Latency and waste of a trained policy against the heuristics.")
+    parser.add_argument('--policy', help="Saved Stable-Baselines3 policy (.zip); omit to run the fallback alone")
+    parser.add_argument('--glass', default='data/glass_data.csv')
+    parser.add_argument('--stock', default='data/glass_sheet_size.csv')
+    parser.add_argument('--gap', type=int, default=0)
+    parser.add_argument('--cell', type=int, default=25)
+    parser.add_argument('--rollouts', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per packer; the best time is reported")
+    args = parser.parse_args()
+
+    glass_parts = bin_packing.load_glass_data(args.glass)
+    stock_sizes = bin_packing.load_stock_sizes(args.stock)
+    packers = {'best_fit_decreasing': PolicyPacker(cell=args.cell)}
+    if args.policy:
+        packers['policy'] = PolicyPacker.from_file(args.policy, cell=args.cell, rollouts=args.rollouts)
+    heuristics = {name: (kind, options) for name, kind, options in default_strategies()}
+    for name in ('grouped_blocks', 'maxrects_best_short_side', 'guillotine_best_short_side_longer_axis', 'shelf'):
+        kind, options = heuristics[name]
+        packers[name] = lambda parts, stock, gap, kind=kind, options=options: \
+            STRATEGY_KINDS[kind](parts, stock, gap, options)
+
+    print(f"{'Packer':<40} {'Latency (ms)':>12} {'Sheets':>7} {'Waste %':>8}")
+    for name, packer in packers.items():
+        run = packer.pack if isinstance(packer, PolicyPacker) else packer
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            sheets = run(glass_parts, stock_sizes, args.gap)
+            timings.append(time.perf_counter() - start)
+        stats = plan_statistics(sheets)
+        print(f"{name:<40} {min(timings) * 1000:>12.1f} {stats['total_sheets']:>7} "
+              f"{stats['wastage_percentage']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
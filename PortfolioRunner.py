@@ -0,0 +1,283 @@
+import importlib
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from GuillotineEngine import FIT_RULES, pack_guillotine
+from SkylineEngine import SKYLINE_RULES, SKYLINE_SORTS, pack_skyline
+from Instrumentation import phase, timed
+from PackingCore import group_parts, pack_groups, plan_piece_count, plan_statistics
+from PlacementStore import PlacementTable
+
+# Sort keys for the per-piece heuristics
+SORT_ORDERS = {
+    'area': lambda p: p['length'] * p['height'],
+    'longest_side': lambda p: max(p['length'], p['height']),
+    'shortest_side': lambda p: min(p['length'], p['height']),
+    'perimeter': lambda p: p['length'] + p['height'],
+    'height': lambda p: (p['height'], p['length']),
+}
+
+RECTPACK_ALGOS = ['MaxRectsBssf', 'MaxRectsBaf', 'MaxRectsBl', 'GuillotineBssfSas', 'SkylineMwf']
+RECTPACK_BIN_ALGOS = ['BBF', 'BFF']
+
+
+@dataclass
+class StrategyResult:
+    name: str
+    elapsed: float
+    # Shipped back from the worker as typed arrays rather than nested dicts
+    placements: Optional[PlacementTable] = None
+    stats: Optional[Dict] = None
+    complete: bool = False
+    error: Optional[str] = None
+    tail_saved_m2: float = 0.0  # stock area the exact tail re-pack took off the greedy plan
+
+    @property
+    def sheets(self) -> Optional[List[Dict]]:
+        return self.placements.to_sheets() if self.placements is not None else None
+
+
+@dataclass
+class PortfolioResult:
+    best: Optional[StrategyResult]
+    results: List[StrategyResult] = field(default_factory=list)
+    elapsed: float = 0.0
+
+
+def default_strategies() -> List[Tuple[str, str, Dict]]:
+    """(name, kind, options) for every heuristic variant in the portfolio."""
+    from VectorPlacement import SCORING_RULES
+
+    strategies = [('grouped_blocks', 'grouped', {})]
+    # calculate_layout's first-fit path (no rule) can overlap pieces, so only the scored rules run here
+    for rule in SCORING_RULES:
+        strategies.append((f'maxrects_{rule}', 'free_space', {'sort': 'area', 'rule': rule}))
+    for rule in FIT_RULES:
+        for split in ('shorter_leftover', 'longer_leftover', 'min_area', 'longer_axis'):
+            strategies.append((f'guillotine_{rule}_{split}', 'guillotine', {'rule': rule, 'split': split}))
+    for rule in SKYLINE_RULES:
+        for sort in SKYLINE_SORTS:
+            strategies.append((f'skyline_{rule}_{sort}', 'skyline', {'rule': rule, 'sort': sort}))
+    for algo in RECTPACK_ALGOS:
+        for bin_algo in RECTPACK_BIN_ALGOS:
+            strategies.append((f'rectpack_{algo}_{bin_algo}', 'rectpack',
+                               {'pack_algo': algo, 'bin_algo': bin_algo}))
+    strategies.append(('shelf', 'shelf', {}))
+    strategies.append(('best_fit_decreasing', 'policy', {}))
+    return strategies
+
+
+def _expand(glass_parts: List[Dict], sort: str) -> List[Dict]:
+    expanded = [{'location': p['location'], 'length': p['length'], 'height': p['height']}
+                for p in glass_parts for _ in range(p['qty'])]
+    expanded.sort(key=SORT_ORDERS[sort], reverse=True)
+    return expanded
+
+
+def _run_grouped(glass_parts, stock_sizes, gap, options):
+    return pack_groups(group_parts(glass_parts), stock_sizes, gap)
+
+
+def _run_free_space(glass_parts, stock_sizes, gap, options):
+    from Glass_Cut_list_optimizer import calculate_layout
+    return calculate_layout(_expand(glass_parts, options.get('sort', 'area')), stock_sizes, gap,
+                            rule=options.get('rule'))
+
+
+def _run_guillotine(glass_parts, stock_sizes, gap, options):
+    return pack_guillotine(glass_parts, stock_sizes, gap, options.get('rule', 'best_short_side'),
+                           options.get('split', 'longer_axis'), deadline=options.get('deadline'))
+
+
+def _run_skyline(glass_parts, stock_sizes, gap, options):
+    return pack_skyline(glass_parts, stock_sizes, gap, options.get('rule', 'bottom_left'),
+                        options.get('waste_map', True), options.get('sort', 'area'),
+                        deadline=options.get('deadline'))
+
+
+def _run_rectpack(glass_parts, stock_sizes, gap, options):
+    import rectpack
+    bin_packing = importlib.import_module('2D_Bin_Packeging')
+    packer_options = {}
+    if 'pack_algo' in options:
+        packer_options['pack_algo'] = getattr(rectpack, options['pack_algo'])
+    if 'bin_algo' in options:
+        packer_options['bin_algo'] = getattr(rectpack.PackingBin, options['bin_algo'])
+    return bin_packing.calculate_layout_with_rectpack(_expand(glass_parts, options.get('sort', 'area')),
+                                                      stock_sizes, gap, **packer_options)
+
+
+def _run_shelf(glass_parts, stock_sizes, gap, options):
+    from GlassCuttingIO import GlassCuttingOptimizer, Panel, Stock
+    panels = [Panel(length=p['length'], height=p['height'], quantity=p['qty'], location=p['location'],
+                    area_sqm=p['length'] * p['height'] / 1_000_000) for p in glass_parts]
+    stocks = [Stock(length=s['length'], width=s['width'], quantity=s['qty']) for s in stock_sizes]
+    result = GlassCuttingOptimizer(stocks, cut_width=gap).optimize(panels)
+
+    # Regroup the flat placement list into per-sheet layouts
+    sheets: Dict[int, Dict] = {}
+    for placement in result.placements:
+        sheet = sheets.setdefault(placement['sheet_number'], {
+            'size': tuple(int(float(v)) for v in placement['sheet_size'].split('x')),
+            'placements': [],
+        })
+        sheet['placements'].append({
+            'part': {'location': placement['location'], 'length': placement['length'],
+                     'height': placement['height']},
+            'position': (placement['x'], placement['y']),
+            'rotated': False,
+        })
+    return [sheets[number] for number in sorted(sheets)]
+
+
+def _run_policy(glass_parts, stock_sizes, gap, options):
+    from PolicyPacker import PolicyPacker
+    if 'policy' in options:
+        packer = PolicyPacker.from_file(options['policy'], cell=options.get('cell', 25),
+                                        rollouts=options.get('rollouts', 1))
+    else:
+        packer = PolicyPacker(cell=options.get('cell', 25))
+    return packer.pack(glass_parts, stock_sizes, gap)
+
+
+STRATEGY_KINDS = {
+    'grouped': _run_grouped,
+    'free_space': _run_free_space,
+    'guillotine': _run_guillotine,
+    'skyline': _run_skyline,
+    'rectpack': _run_rectpack,
+    'shelf': _run_shelf,
+    'policy': _run_policy,
+}
+
+
+def run_strategy(name: str, kind: str, options: Dict, glass_parts: List[Dict],
+                 stock_sizes: List[Dict], gap: int, tail_time: float = 0.0,
+                 deadline: Optional[float] = None) -> StrategyResult:
+    """Run one portfolio member; errors are reported instead of raised.
+
+    With a tail_time, the worst-filled sheets of a complete plan are re-packed
+    by ExactPacker.improve_tail within that many seconds. A time.perf_counter()
+    `deadline` is passed to the skyline and guillotine packers and cuts the
+    tail re-pack short; a strategy that starts after it does not run at all.
+    """
+    start = time.perf_counter()
+    demand = sum(p['qty'] for p in glass_parts)
+    saved = 0.0
+    if deadline is not None:
+        if start >= deadline:
+            return StrategyResult(name, 0.0, error="time budget exceeded")
+        options = dict(options, deadline=deadline)
+        tail_time = min(tail_time, deadline - start)
+    try:
+        with phase(f"strategy:{name}"):
+            sheets = STRATEGY_KINDS[kind](glass_parts, stock_sizes, gap, options)
+        if deadline is not None:
+            tail_time = min(tail_time, deadline - time.perf_counter())
+        if tail_time > 0 and sheets and plan_piece_count(sheets) == demand:
+            from ExactPacker import improve_tail
+            tail = improve_tail(sheets, stock_sizes, gap, time_limit=tail_time)
+            sheets, saved = tail.sheets, (tail.area_before - tail.area_after) / 1_000_000
+    except Exception as e:
+        return StrategyResult(name, time.perf_counter() - start, error=f"{type(e).__name__}: {e}")
+    table = PlacementTable.from_sheets(sheets, gap)
+    # A plan only counts when every piece is placed and the geometry holds up
+    if not table.is_valid():
+        return StrategyResult(name, time.perf_counter() - start, table, plan_statistics(sheets),
+                              error="plan has overlapping or out-of-bounds pieces", tail_saved_m2=saved)
+    return StrategyResult(name, time.perf_counter() - start, table, plan_statistics(sheets),
+                          complete=plan_piece_count(sheets) == demand, tail_saved_m2=saved)
+
+
+def _shutdown(executor: ProcessPoolExecutor):
+    """Cancel queued strategies, terminate the workers still running one and wait for every worker to exit."""
+    # ProcessPoolExecutor has no public way to stop a running task before Python 3.14
+    processes = list((executor._processes or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join()
+
+
+def _rank(result: StrategyResult):
+    return (result.stats['wastage_percentage'], result.stats['total_sheets'], result.elapsed)
+
+
+@timed('run_portfolio')
+def run_portfolio(glass_parts: List[Dict], stock_sizes: List[Dict], gap: int = 0,
+                  time_budget: float = 30.0, strategies: Optional[List[Tuple[str, str, Dict]]] = None,
+                  max_workers: Optional[int] = None, tail_time: float = 1.0) -> PortfolioResult:
+    """Run the heuristic portfolio across all cores and keep the lowest-waste complete plan.
+
+    Each strategy's tail sheets get up to `tail_time` seconds of exact
+    re-packing (0 disables it).
+
+    Every strategy is given the budget's deadline. Workers still busy when it
+    expires are terminated and joined before returning, so no strategy
+    outlives the call.
+    """
+    start = time.perf_counter()
+    deadline = start + time_budget
+    strategies = strategies if strategies is not None else default_strategies()
+    results: List[StrategyResult] = []
+
+    executor = ProcessPoolExecutor(max_workers=min(len(strategies), max_workers or os.cpu_count()) or 1)
+    try:
+        pending = {executor.submit(run_strategy, name, kind, options, glass_parts, stock_sizes, gap,
+                                   tail_time, deadline): name
+                   for name, kind, options in strategies}
+        while pending:
+            remaining = time_budget - (time.perf_counter() - start)
+            if remaining <= 0:
+                break
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.pop(future)
+                results.append(future.result())
+        for name in pending.values():
+            results.append(StrategyResult(name, time.perf_counter() - start, error="time budget exceeded"))
+    finally:
+        _shutdown(executor)
+
+    complete = [r for r in results if r.complete]
+    best = min(complete, key=_rank) if complete else None
+    return PortfolioResult(best, results, time.perf_counter() - start)
+
+
+def main():
+    from Glass_Cut_list_optimizer import load_glass_data, load_stock_sizes
+
+    glass_data_file = 'data/glass_data.csv'
+    stock_sizes_file = 'data/glass_sheet_size.csv'
+    gap = 0
+
+    portfolio = run_portfolio(load_glass_data(glass_data_file), load_stock_sizes(stock_sizes_file), gap)
+
+    print(f"Portfolio finished in {portfolio.elapsed:.2f}s")
+    print(f"{'Strategy':<34} {'Time (s)':>9} {'Sheets':>7} {'Waste %':>8} {'Tail m2':>8}")
+    for result in sorted(portfolio.results, key=lambda r: r.elapsed):
+        if result.stats and result.complete:
+            print(f"{result.name:<34} {result.elapsed:>9.3f} {result.stats['total_sheets']:>7} "
+                  f"{result.stats['wastage_percentage']:>8.2f} {result.tail_saved_m2:>8.2f}")
+        else:
+            print(f"{result.name:<34} {result.elapsed:>9.3f}  {result.error or 'incomplete plan'}")
+
+    if portfolio.best is None:
+        print("\nNo strategy produced a complete plan.")
+        return
+    stats = portfolio.best.stats
+    print(f"\nBest strategy: {portfolio.best.name}")
+    print(f"Total sheets used: {stats['total_sheets']}")
+    print(f"Wastage percentage: {stats['wastage_percentage']:.2f}%")
+    print("\nSummary of sheet sizes used:")
+    for (length, width), qty in stats['sheet_counter'].items():
+        print(f"  {length}mm x {width}mm: {qty} pcs")
+
+
+if __name__ == "__main__":
+    main()
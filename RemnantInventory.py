@@ -0,0 +1,254 @@
+import argparse
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from Instrumentation import phase, timed
+from MaxRectsEngine import FreeRectIndex, Rect
+from PackingCore import PartGroup, PatternCache, expand_placements, group_parts, pack_groups, plan_statistics
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS remnants (
+    id INTEGER PRIMARY KEY,
+    length INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    short_side INTEGER NOT NULL,
+    long_side INTEGER NOT NULL,
+    area INTEGER NOT NULL,
+    material TEXT NOT NULL DEFAULT '',
+    source TEXT NOT NULL DEFAULT '',
+    created REAL NOT NULL,
+    used_by TEXT
+);
+CREATE INDEX IF NOT EXISTS remnants_fit ON remnants (material, short_side, long_side) WHERE used_by IS NULL;
+-- Remnants a plan in progress on this connection has claimed but not yet taken
+CREATE TEMP TABLE IF NOT EXISTS reserved (id INTEGER PRIMARY KEY);
+"""
+
+
+def usable_offcuts(length: int, width: int, rects: Iterable[Rect], min_side: int, min_area: int) -> List[Rect]:
+    """Disjoint leftover rectangles of a sheet that are worth keeping.
+
+    `rects` are the occupied areas (pieces including their kerf). The largest
+    free rectangle above the thresholds is taken, removed from the free space,
+    and the search repeats, so the result never double counts glass.
+    """
+    free_space = FreeRectIndex(length, width)
+    for x, y, w, h in rects:
+        free_space.place(x, y, w, h)
+    offcuts = []
+    while True:
+        usable = [r for r in free_space.rects() if min(r[2], r[3]) >= min_side and r[2] * r[3] >= min_area]
+        if not usable:
+            return offcuts
+        rect = max(usable, key=lambda r: (r[2] * r[3], -r[1], -r[0]))
+        offcuts.append(rect)
+        free_space.place(*rect)
+
+
+def _occupied(sheet: Dict, gap: int) -> List[Rect]:
+    """Piece rectangles of one sheet dict, each grown by the kerf and clipped to the sheet."""
+    if 'blocks' in sheet:
+        sheet = next(expand_placements([sheet], gap))
+    length, width = sheet['size']
+    rects = []
+    for placement in sheet['placements']:
+        part, (x, y) = placement['part'], placement['position']
+        w, h = (part['height'], part['length']) if placement['rotated'] else (part['length'], part['height'])
+        rects.append((x, y, min(w + gap, length - x), min(h + gap, width - y)))
+    return rects
+
+
+class RemnantInventory:
+    """Persistent store of reusable offcuts, kept in SQLite.
+
+    Open remnants are indexed by (material, short side, long side), so the
+    smallest remnant that takes a piece in either orientation is a range scan.
+    Remnants are never deleted: taking one records the job that used it. A
+    plan in progress reserves the remnants it has claimed in a temporary
+    table, which find skips, so they need not be passed back as parameters.
+    """
+
+    def __init__(self, path: str = ':memory:', min_side: int = 300, min_area: int = 150_000):
+        self.path = path
+        self.min_side = min_side
+        self.min_area = min_area
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self) -> 'RemnantInventory':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM remnants WHERE used_by IS NULL").fetchone()[0]
+
+    def add(self, length: int, width: int, material: str = '', source: str = '', copies: int = 1) -> List[int]:
+        """Record `copies` identical remnants and return their ids."""
+        row = (length, width, min(length, width), max(length, width), length * width, material, source, time.time())
+        with self._db:
+            return [self._db.execute(
+                "INSERT INTO remnants (length, width, short_side, long_side, area, material, source, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row).lastrowid for _ in range(copies)]
+
+    def find(self, length: int, width: int, material: str = '') -> Optional[Tuple[int, int, int]]:
+        """Smallest open, unreserved remnant that fits length x width in either orientation, as (id, length, width)."""
+        return self._db.execute(
+            "SELECT id, length, width FROM remnants WHERE used_by IS NULL AND material = ? "
+            "AND short_side >= ? AND long_side >= ? AND id NOT IN (SELECT id FROM temp.reserved) "
+            "ORDER BY area, id LIMIT 1",
+            (material, min(length, width), max(length, width))).fetchone()
+
+    def reserve(self, remnant_id: int):
+        """Hide a remnant from find until it is taken or released."""
+        with self._db:
+            self._db.execute("INSERT OR IGNORE INTO temp.reserved (id) VALUES (?)", (remnant_id,))
+
+    def release(self, remnant_ids: Iterable[int]):
+        with self._db:
+            self._db.executemany("DELETE FROM temp.reserved WHERE id = ?", ((i,) for i in remnant_ids))
+
+    def take(self, remnant_id: int, job: str = ''):
+        with self._db:
+            updated = self._db.execute("UPDATE remnants SET used_by = ? WHERE id = ? AND used_by IS NULL",
+                                       (job, remnant_id)).rowcount
+            self._db.execute("DELETE FROM temp.reserved WHERE id = ?", (remnant_id,))
+        if not updated:
+            raise KeyError(f"Remnant {remnant_id} is not available")
+
+    def available(self, material: str = '') -> List[Dict]:
+        """Open remnants summarised as stock rows: {'length', 'width', 'qty'}."""
+        rows = self._db.execute(
+            "SELECT length, width, COUNT(*) FROM remnants WHERE used_by IS NULL AND material = ? "
+            "GROUP BY length, width ORDER BY length * width DESC", (material,))
+        return [{'length': length, 'width': width, 'qty': qty} for length, width, qty in rows]
+
+    def record_sheet(self, length: int, width: int, rects: Iterable[Rect], material: str = '',
+                     source: str = '', copies: int = 1) -> List[Rect]:
+        """Store the usable offcuts of a finished sheet; returns them."""
+        offcuts = usable_offcuts(length, width, rects, self.min_side, self.min_area)
+        for _, _, w, h in offcuts:
+            self.add(w, h, material, source, copies)
+        return offcuts
+
+    def record_plan(self, sheets: List[Dict], gap: int = 0, material: str = '', source: str = '') -> int:
+        """Store the offcuts of every sheet of a grouped or per-piece plan; returns how many."""
+        recorded = 0
+        for sheet in sheets:
+            copies = sheet.get('repeat', 1)
+            offcuts = self.record_sheet(*sheet['size'], _occupied(sheet, gap), material, source, copies)
+            recorded += len(offcuts) * copies
+        return recorded
+
+
+def _fresh_area(sheets: List[Dict]) -> int:
+    return sum(sheet['size'][0] * sheet['size'][1] * sheet.get('repeat', 1)
+               for sheet in sheets if 'remnant' not in sheet)
+
+
+@timed('pack_with_remnants')
+def pack_with_remnants(groups: List[PartGroup], stock_sizes: List[Dict], inventory: RemnantInventory,
+                       gap: int = 0, job: str = '', material: str = '', record: bool = True,
+                       cache: Optional[PatternCache] = None) -> List[Dict]:
+    """pack_groups that fills remnants from the inventory before opening fresh stock.
+
+    The largest outstanding part picks the smallest remnant it fits on, and that
+    remnant is filled with whatever demand it can take. When no remnant fits any
+    remaining part, the rest goes to pack_groups. Remnant sheets carry their
+    inventory id under 'remnant'. If plain pack_groups needs no more fresh stock
+    area, its plan is used instead. Remnants are only taken once the plan is
+    final; with `record`, its offcuts then go back into the inventory.
+    """
+    cache = cache if cache is not None else PatternCache()
+    groups = sorted(groups, key=lambda g: (g.area, g.length, g.height), reverse=True)
+    demand = [g.qty for g in groups]
+    sheets = []
+    taken: List[int] = []
+
+    try:
+        i = 0
+        while i < len(groups):
+            if demand[i] == 0:
+                i += 1
+                continue
+            found = inventory.find(groups[i].length + gap, groups[i].height + gap, material)
+            if found is None:
+                i += 1
+                continue
+            remnant_id, length, width = found
+            blocks, used = cache.fill_sheet(groups, demand, length, width, gap)
+            inventory.reserve(remnant_id)
+            taken.append(remnant_id)
+            for g, count in enumerate(used):
+                demand[g] -= count
+            sheets.append({
+                'size': (length, width),
+                'blocks': [dict(block, part=groups[block['group']].as_part()) for block in blocks],
+                'repeat': 1,
+                'remnant': remnant_id,
+            })
+
+        rest = [PartGroup(g.location, g.length, g.height, qty) for g, qty in zip(groups, demand) if qty]
+        if rest:
+            sheets.extend(pack_groups(rest, stock_sizes, gap, cache))
+
+        # Greedy remnant filling can break up good repeated patterns; never use more fresh stock than without it
+        if taken:
+            fresh_only = pack_groups(groups, stock_sizes, gap, cache)
+            if _fresh_area(fresh_only) <= _fresh_area(sheets):
+                inventory.release(taken)
+                sheets, taken = fresh_only, []
+        for remnant_id in taken:
+            inventory.take(remnant_id, job)
+    finally:
+        # A failed plan gives back whatever it had claimed
+        inventory.release(taken)
+    if record:
+        with phase('record_offcuts'):
+            inventory.record_plan(sheets, gap, material, job)
+    return sheets
+
+
+def main():
+    from CutListIngest import read_table
+    from Benchmark import glass_instance
+
+    parser = argparse.ArgumentParser(description="Pack a rolling series of orders against a persistent offcut inventory.")
+    parser.add_argument('orders', nargs='*', default=['data/glass_data.csv'], help="Glass data files, packed in order")
+    parser.add_argument('--stock', default='data/glass_sheet_size.csv')
+    parser.add_argument('--db', default=':memory:', help="SQLite file holding the remnants")
+    parser.add_argument('--gap', type=int, default=0)
+    parser.add_argument('--synthetic', type=int, default=5, help="Seeded orders appended after the files")
+    parser.add_argument('--min-side', type=int, default=300)
+    args = parser.parse_args()
+
+    stock_sizes = [{'length': int(r.length), 'width': int(r.height), 'qty': r.qty}
+                   for r in read_table(args.stock)]
+    orders = [([{'location': r.label, 'length': int(r.length), 'height': int(r.height), 'qty': r.qty}
+                for r in read_table(path)], stock_sizes, args.gap) for path in args.orders]
+    orders += [(instance.glass_parts, instance.stock_sizes, instance.gap)
+               for instance in (glass_instance(seed) for seed in range(args.synthetic))]
+
+    fresh_total = baseline_total = 0.0
+    with RemnantInventory(args.db, min_side=args.min_side) as inventory:
+        for job, (glass_parts, stock_sizes, gap) in enumerate(orders, 1):
+            start = time.perf_counter()
+            sheets = pack_with_remnants(group_parts(glass_parts), stock_sizes, inventory, gap, job=f"job-{job}")
+            elapsed = time.perf_counter() - start
+            fresh = plan_statistics([sheet for sheet in sheets if 'remnant' not in sheet])
+            baseline = plan_statistics(pack_groups(group_parts(glass_parts), stock_sizes, gap))
+            fresh_total += fresh['total_sheet_area_m2']
+            baseline_total += baseline['total_sheet_area_m2']
+            print(f"Job {job}: {sum('remnant' in sheet for sheet in sheets)} remnants reused, "
+                  f"{fresh['total_sheets']} fresh sheets (without remnants {baseline['total_sheets']}), "
+                  f"{len(inventory)} remnants in stock, {elapsed * 1000:.1f} ms")
+    print(f"Fresh stock: {fresh_total:.2f} sq m against {baseline_total:.2f} sq m without the inventory")
+
+
+if __name__ == "__main__":
+    main()
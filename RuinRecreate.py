@@ -0,0 +1,313 @@
+"""Ruin-and-recreate local search over finished sheet plans.
+
+A move empties a few of the lowest-utilization sheets (ruin) and puts their
+pieces back into the free space of the other sheets, best fit first
+(recreate). Whatever does not fit goes on new sheets, chosen the way the
+greedy packers choose them. Each sheet keeps its MaxRects free space
+(MaxRectsEngine.FreeRectIndex) cached between moves.
+
+The plan keeps its sheets ordered by utilization and by their largest free
+rectangle, plus the running total cost. A piece is only tried on sheets
+whose largest free rectangle can hold it, a move copies only the sheets it
+writes to, and an accepted move updates the indexes and the cost for the
+ruined, changed and new sheets alone. A rejected move just drops its copies.
+
+Moves are accepted by late acceptance hill climbing, or by simulated
+annealing. Both compare the cost
+    sum over sheets of area * (1 - SPREAD_WEIGHT * utilization^2)
+which is mostly stock area but also rewards concentrating pieces on fewer,
+fuller sheets. Emptying a sheet therefore always pays, and moves that move
+the search toward emptying one are cheap to accept. The best plan by stock
+area is returned.
+"""
+import argparse
+import math
+import random
+import time
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from Instrumentation import tally, timed
+from MaxRectsEngine import FreeRectIndex
+from PackingCore import expand_placements, plan_piece_count, plan_statistics
+
+ACCEPTANCE = ('late', 'anneal')
+# Weight of the utilization-squared term in the move cost
+SPREAD_WEIGHT = 0.2
+
+
+class SheetState:
+    """One physical sheet: its placements and cached free space, in kerf-inflated footprints."""
+    __slots__ = ('size', 'placements', 'free', 'used_area')
+
+    def __init__(self, size: Tuple[int, int], placements: List[Dict], free: FreeRectIndex, used_area: int):
+        self.size = size
+        self.placements = placements
+        self.free = free
+        self.used_area = used_area
+
+    @classmethod
+    def from_sheet(cls, sheet: Dict, gap: int) -> 'SheetState':
+        length, width = sheet['size']
+        free = FreeRectIndex(length, width)
+        used = 0
+        for placement in sheet['placements']:
+            part = placement['part']
+            l, h = (part['height'], part['length']) if placement['rotated'] else (part['length'], part['height'])
+            free.place(*placement['position'], l + gap, h + gap)
+            used += l * h
+        return cls((length, width), list(sheet['placements']), free, used)
+
+    def copy(self) -> 'SheetState':
+        return SheetState(self.size, list(self.placements), self.free.copy(), self.used_area)
+
+    @property
+    def utilization(self) -> float:
+        return self.used_area / (self.size[0] * self.size[1])
+
+    def cost(self) -> float:
+        return self.size[0] * self.size[1] * (1 - SPREAD_WEIGHT * self.utilization ** 2)
+
+    def insert(self, part: Dict, gap: int) -> bool:
+        fit = self.free.find_rect(part['length'] + gap, part['height'] + gap)
+        if fit is None:
+            return False
+        self.place(part, fit[0][0], fit[0][1], fit[1], gap)
+        return True
+
+    def place(self, part: Dict, x: int, y: int, rotated: bool, gap: int):
+        l, h = (part['height'], part['length']) if rotated else (part['length'], part['height'])
+        self.free.place(x, y, l + gap, h + gap)
+        self.placements.append({'part': part, 'position': (x, y), 'rotated': rotated})
+        self.used_area += l * h
+
+    def to_sheet(self) -> Dict:
+        return {'size': self.size, 'placements': self.placements, 'repeat': 1}
+
+
+@dataclass
+class RuinRecreateResult:
+    sheets: List[Dict]
+    sheets_before: int
+    sheets_after: int
+    area_before: int        # stock area, mm^2
+    area_after: int
+    iterations: int
+    accepted: int
+    elapsed: float = 0.0
+
+
+class _Plan:
+    """Sheets by id, indexed by utilization and by largest free rect, with their total cost and stock area."""
+
+    def __init__(self, states: List[SheetState]):
+        self.sheets: Dict[int, SheetState] = {}
+        self.by_utilization: List[Tuple[float, int]] = []
+        self.by_room: List[Tuple[int, int]] = []  # (largest free rect area, id)
+        self._keys: Dict[int, Tuple[float, int]] = {}
+        self.cost = 0.0
+        self.area = 0
+        self._next_id = 0
+        for state in states:
+            self.add(state)
+
+    def add(self, state: SheetState, sid: Optional[int] = None) -> int:
+        if sid is None:
+            sid, self._next_id = self._next_id, self._next_id + 1
+        utilization, room = state.utilization, state.free.largest_area()
+        self.sheets[sid] = state
+        self._keys[sid] = (utilization, room)
+        insort(self.by_utilization, (utilization, sid))
+        insort(self.by_room, (room, sid))
+        self.cost += state.cost()
+        self.area += state.size[0] * state.size[1]
+        return sid
+
+    def remove(self, sid: int) -> SheetState:
+        state = self.sheets.pop(sid)
+        utilization, room = self._keys.pop(sid)
+        del self.by_utilization[bisect_left(self.by_utilization, (utilization, sid))]
+        del self.by_room[bisect_left(self.by_room, (room, sid))]
+        self.cost -= state.cost()
+        self.area -= state.size[0] * state.size[1]
+        return state
+
+    def replace(self, sid: int, state: SheetState):
+        self.remove(sid)
+        self.add(state, sid)
+
+    def roomy(self, area: int) -> List[int]:
+        """Ids of the sheets with a free rect of at least `area`."""
+        return [sid for _, sid in self.by_room[bisect_left(self.by_room, (area, -1)):]]
+
+    def states(self) -> List[SheetState]:
+        return list(self.sheets.values())
+
+
+def _open_sheets(pieces: List[Dict], stock_sizes: List[Dict], stock_left: Dict[Tuple[int, int], float],
+                 gap: int) -> Optional[List[SheetState]]:
+    """New sheets for leftover pieces: each filled on every size with stock left, the fullest kept."""
+    sheets = []
+    while pieces:
+        best = None
+        for stock in stock_sizes:
+            size = (stock['length'], stock['width'])
+            if stock_left[size] <= 0:
+                continue
+            state = SheetState(size, [], FreeRectIndex(*size), 0)
+            placed = [i for i, part in enumerate(pieces) if state.insert(part, gap)]
+            if placed and (best is None or state.utilization > best[0].utilization):
+                best = (state, placed)
+        if best is None:
+            return None
+        state, placed = best
+        stock_left[state.size] -= 1
+        placed_set = set(placed)
+        pieces = [part for i, part in enumerate(pieces) if i not in placed_set]
+        sheets.append(state)
+    return sheets
+
+
+def _recreate(plan: _Plan, ruined: List[int], stock_sizes: List[Dict], stock_left: Dict[Tuple[int, int], float],
+              gap: int, rng: random.Random) -> Optional[Tuple[Dict[int, SheetState], List[SheetState], float]]:
+    """Re-insert the ruined sheets' pieces.
+
+    Returns the changed sheets by id, the new sheets and the change in cost,
+    or None when the stock runs out. The plan itself is left untouched.
+    """
+    ruined_set = set(ruined)
+    pieces = [placement['part'] for i in ruined for placement in plan.sheets[i].placements]
+    pieces.sort(key=lambda p: p['length'] * p['height'] * rng.uniform(0.85, 1.15), reverse=True)
+    changed: Dict[int, SheetState] = {}
+    leftover = []
+    for part in pieces:
+        length, height = part['length'] + gap, part['height'] + gap
+        best = None
+        # Free rects only shrink within a move, so the committed index never misses a sheet
+        for sid in plan.roomy(length * height):
+            if sid in ruined_set:
+                continue
+            state = changed[sid] if sid in changed else plan.sheets[sid]
+            fit = state.free.find_rect(length, height)
+            if fit is not None:
+                # Smallest free rect, then the fuller sheet
+                key = (fit[0][2] * fit[0][3], -state.utilization, sid)
+                if best is None or key < best[0]:
+                    best = (key, sid, fit)
+        if best is None:
+            leftover.append(part)
+            continue
+        _, sid, (rect, rotated) = best
+        if sid not in changed:
+            changed[sid] = plan.sheets[sid].copy()
+        changed[sid].place(part, rect[0], rect[1], rotated, gap)
+
+    left = dict(stock_left)
+    for sid in ruined:
+        left[plan.sheets[sid].size] += 1
+    new = _open_sheets(leftover, stock_sizes, left, gap)
+    if new is None:
+        return None
+    tally('ruin_recreate_pieces_moved', len(pieces))
+    delta = (sum(state.cost() for state in changed.values()) + sum(state.cost() for state in new)
+             - sum(plan.sheets[sid].cost() for sid in changed) - sum(plan.sheets[sid].cost() for sid in ruined))
+    return changed, new, delta
+
+
+@timed('ruin_recreate')
+def ruin_recreate(sheets: List[Dict], stock_sizes: List[Dict], gap: int = 0, time_limit: float = 2.0,
+                  iterations: Optional[int] = None, max_ruin: int = 3, acceptance: str = 'late',
+                  history: int = 50, temperature: float = 0.02, seed: int = 0) -> RuinRecreateResult:
+    """Improve a finished plan by ruin and recreate until `time_limit` seconds or `iterations` moves.
+
+    `max_ruin` caps the sheets emptied per move. The ruined sheets are drawn
+    from the 2 * max_ruin least utilized. With acceptance='late', a move
+    is kept if its cost is at most the current cost or the cost `history`
+    moves ago. With 'anneal', a worse move is kept with probability
+    exp(-increase / T), where T starts at `temperature` times the mean sheet
+    area and cools linearly to zero.
+    """
+    if acceptance not in ACCEPTANCE:
+        raise ValueError(f"Unknown acceptance {acceptance!r}; expected one of {ACCEPTANCE}")
+    start = time.perf_counter()
+    rng = random.Random(seed)
+    per_piece = [next(expand_placements([sheet], gap)) if 'blocks' in sheet else sheet for sheet in sheets]
+    plan = _Plan([SheetState.from_sheet(sheet, gap) for sheet in per_piece for _ in range(sheet.get('repeat', 1))])
+    stock_left: Dict[Tuple[int, int], float] = {(s['length'], s['width']): s.get('qty', math.inf)
+                                                for s in stock_sizes}
+    for state in plan.sheets.values():
+        stock_left[state.size] = stock_left.get(state.size, 0) - 1
+
+    sheets_before, area_before = len(plan.sheets), plan.area
+    best, best_area = plan.states(), area_before
+    history = max(1, history)
+    recent = [plan.cost] * history
+    sheet_area = area_before / max(1, sheets_before)
+    moves = accepted = 0
+    while len(plan.sheets) > 1:
+        elapsed = time.perf_counter() - start
+        if elapsed >= time_limit or (iterations is not None and moves >= iterations):
+            break
+        moves += 1
+        worst = [sid for _, sid in plan.by_utilization[:2 * max_ruin]]
+        ruined = rng.sample(worst, rng.randint(1, min(max_ruin, len(worst))))
+        move = _recreate(plan, ruined, stock_sizes, stock_left, gap, rng)
+        if move is None:
+            continue
+        changed, new, delta = move
+        cost, new_cost = plan.cost, plan.cost + delta
+        if acceptance == 'late':
+            keep = new_cost <= cost or new_cost <= recent[moves % history]
+        else:
+            progress = elapsed / time_limit if iterations is None else moves / iterations
+            t = temperature * sheet_area * max(0.0, 1 - progress)
+            keep = new_cost <= cost or (t > 0 and rng.random() < math.exp((cost - new_cost) / t))
+        if keep:
+            for sid in ruined:
+                stock_left[plan.remove(sid).size] += 1
+            for sid, state in changed.items():
+                plan.replace(sid, state)
+            for state in new:
+                stock_left[state.size] -= 1
+                plan.add(state)
+            accepted += 1
+            # Accepted moves swap in copies and never edit a sheet in place, so the snapshot stays valid
+            if plan.area < best_area:
+                best, best_area = plan.states(), plan.area
+                tally('ruin_recreate_improvements')
+        recent[moves % history] = plan.cost
+
+    return RuinRecreateResult([state.to_sheet() for state in best], sheets_before, len(best), area_before, best_area,
+                              moves, accepted, time.perf_counter() - start)
+
+
+def main():
+    import importlib
+    from Benchmark import glass_instance, repo_instance
+
+    parser = argparse.ArgumentParser(description="Ruin and recreate on greedy plans.")
+    parser.add_argument('--time-limit', type=float, default=3.0)
+    parser.add_argument('--acceptance', choices=ACCEPTANCE, default='late')
+    parser.add_argument('--seeds', type=int, default=2)
+    args = parser.parse_args()
+
+    bin_packing = importlib.import_module('2D_Bin_Packeging')
+    for instance in [repo_instance()] + [glass_instance(seed) for seed in range(args.seeds)]:
+        parts = sorted(bin_packing.expand_parts(instance.glass_parts), key=lambda p: p['length'] * p['height'],
+                       reverse=True)
+        sheets = bin_packing.calculate_layout_with_rectpack(parts, instance.stock_sizes, instance.gap)
+        if plan_piece_count(sheets) != instance.demand:
+            print(f"{instance.name}: rectpack plan is incomplete, skipped")
+            continue
+        before = plan_statistics(sheets)
+        result = ruin_recreate(sheets, instance.stock_sizes, instance.gap, args.time_limit,
+                               acceptance=args.acceptance)
+        after = plan_statistics(result.sheets)
+        print(f"{instance.name}: rectpack {before['total_sheets']} sheets {before['wastage_percentage']:.2f}% waste"
+              f" -> {after['total_sheets']} sheets {after['wastage_percentage']:.2f}% waste "
+              f"({result.iterations} moves, {result.accepted} accepted, {result.elapsed:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
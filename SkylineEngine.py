@@ -0,0 +1,238 @@
+import time
+from array import array
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from Instrumentation import high_water, record_find, tally, timed
+
+# How a skyline position is chosen for a piece (lower score wins)
+SKYLINE_RULES = ('bottom_left', 'min_waste')
+# Piece orders for pack_skyline
+SKYLINE_SORTS = {
+    'height': lambda p: (min(p['length'], p['height']), max(p['length'], p['height'])),
+    'area': lambda p: (p['length'] * p['height'], max(p['length'], p['height'])),
+}
+
+
+class SkylineSheet:
+    """One stock sheet packed bottom-up against a skyline, with a waste map.
+
+    The skyline is a run of segments: segment i starts at xs[i] and has its top
+    at ys[i], and the next start (or the sheet length) ends it. Both are
+    arrays. A placement rewrites the covered segments as one slice and merges
+    equal neighbours, so it costs O(segments). Candidate positions are segment
+    starts. For each orientation, one sweep with a monotone deque yields the
+    landing height at every start, and prefix sums of segment area give the
+    space a piece would cover, in O(segments) per orientation.
+
+    Space shut under a piece is recorded in a waste map of free rectangles.
+    Later pieces go there first (best short side fit, guillotine split), so
+    gaps the skyline cannot reach are still used.
+    """
+
+    def __init__(self, length: int, width: int, gap: int = 0, rule: str = 'bottom_left', waste_map: bool = True):
+        if rule not in SKYLINE_RULES:
+            raise ValueError(f"Unknown skyline rule {rule!r}; expected one of {SKYLINE_RULES}")
+        self.length, self.width, self.gap = length, width, gap
+        self.rule, self.use_waste_map = rule, waste_map
+        self.xs = array('l', [0])
+        self.ys = array('l', [0])
+        self.waste: List[Tuple[int, int, int, int]] = []
+        self.placements: List[Dict] = []
+        self.used_area = 0
+        # Sizes that found no spot; the skyline only rises, so they stay unplaceable until the waste map grows
+        self._misses = set()
+
+    def _skyline_fit(self, pw: int, ph: int) -> Optional[Tuple[Tuple, int, int]]:
+        """(score, x, y) of the best segment start for a pw x ph footprint."""
+        xs, ys, n = self.xs, self.ys, len(self.xs)
+        if self.rule == 'min_waste':
+            ends = xs[1:] + array('l', [self.length])
+            # area[i]: skyline area over segments before i
+            area = [0]
+            for i in range(n):
+                area.append(area[-1] + ys[i] * (ends[i] - xs[i]))
+        best = None
+        window: deque = deque()  # segment indices in the current span, tops decreasing
+        j = 0
+        for i in range(n):
+            x = xs[i]
+            right = x + pw
+            if right > self.length:
+                break
+            while j < n and xs[j] < right:
+                while window and ys[window[-1]] <= ys[j]:
+                    window.pop()
+                window.append(j)
+                j += 1
+            while window[0] < i:
+                window.popleft()
+            y = ys[window[0]]
+            if y + ph > self.width:
+                continue
+            if self.rule == 'bottom_left':
+                score = (y + ph, x)
+            else:
+                covered = area[j] - area[i] - ys[j - 1] * (ends[j - 1] - right)
+                score = (y * pw - covered, y + ph, x)
+            if best is None or score < best[0]:
+                best = (score, x, y)
+        return best
+
+    def _waste_fit(self, pw: int, ph: int) -> Optional[Tuple[Tuple, int]]:
+        best = None
+        for k, (_, _, w, h) in enumerate(self.waste):
+            if pw <= w and ph <= h:
+                score = (min(w - pw, h - ph), max(w - pw, h - ph))
+                if best is None or score < best[0]:
+                    best = (score, k)
+        return best
+
+    def find(self, length: int, height: int, allow_rotation: bool = True):
+        """('waste', index, rotated) or ('skyline', (x, y), rotated) for the best spot, or None."""
+        record_find(len(self.xs) + len(self.waste))
+        orientations = (False, True) if allow_rotation and length != height else (False,)
+        footprints = [((height, length) if rotated else (length, height), rotated) for rotated in orientations]
+        if self.use_waste_map and self.waste:
+            fits = [(fit, rotated) for (pl, ph), rotated in footprints
+                    if (fit := self._waste_fit(pl + self.gap, ph + self.gap)) is not None]
+            if fits:
+                (_, k), rotated = min(fits, key=lambda item: item[0][0])
+                return 'waste', k, rotated
+        best = None
+        for (pl, ph), rotated in footprints:
+            fit = self._skyline_fit(pl + self.gap, ph + self.gap)
+            if fit is not None and (best is None or fit[0] < best[0][0]):
+                best = (fit, rotated)
+        if best is None:
+            return None
+        (_, x, y), rotated = best
+        return 'skyline', (x, y), rotated
+
+    def insert(self, part: Dict, allow_rotation: bool = True) -> Optional[Dict]:
+        """Place a {'location', 'length', 'height'} part; returns its placement or None."""
+        key = (part['length'], part['height'], allow_rotation)
+        if key in self._misses:
+            return None
+        fit = self.find(part['length'], part['height'], allow_rotation)
+        if fit is None:
+            self._misses.add(key)
+            return None
+        where, spot, rotated = fit
+        pl, ph = (part['height'], part['length']) if rotated else (part['length'], part['height'])
+        if where == 'waste':
+            x, y = self._split_waste(spot, pl + self.gap, ph + self.gap)
+            tally('skyline_waste_reused')
+        else:
+            x, y = spot
+            self._raise_skyline(x, y, pl + self.gap, ph + self.gap)
+        placement = {'part': part, 'position': (x, y), 'rotated': rotated}
+        self.placements.append(placement)
+        self.used_area += pl * ph
+        tally('placements')
+        high_water('skyline_segments', len(self.xs))
+        return placement
+
+    def _raise_skyline(self, x: int, y: int, pw: int, ph: int):
+        xs, ys = self.xs, self.ys
+        right = x + pw
+        i = xs.index(x)
+        j = i
+        while j < len(xs) and xs[j] < right:
+            if self.use_waste_map and ys[j] < y:
+                end = min(xs[j + 1] if j + 1 < len(xs) else self.length, right)
+                self.waste.append((xs[j], ys[j], end - xs[j], y - ys[j]))
+                self._misses.clear()
+            j += 1
+        # The last covered segment keeps its top beyond the piece
+        end = xs[j] if j < len(xs) else self.length
+        new = [(x, y + ph)] + ([(right, ys[j - 1])] if right < end else [])
+        # Merge with equal neighbours
+        if i > 0 and ys[i - 1] == y + ph:
+            new.pop(0)
+        if j < len(xs) and ys[j] == (new[-1][1] if new else ys[i - 1]):
+            j += 1
+        xs[i:j] = array('l', [start for start, _ in new])
+        ys[i:j] = array('l', [top for _, top in new])
+
+    def _split_waste(self, k: int, pw: int, ph: int) -> Tuple[int, int]:
+        """Put a pw x ph footprint in the corner of waste rect k and split the rest along the shorter leftover."""
+        x, y, w, h = self.waste.pop(k)
+        if w - pw < h - ph:
+            parts = [(x + pw, y, w - pw, ph), (x, y + ph, w, h - ph)]
+        else:
+            parts = [(x + pw, y, w - pw, h), (x, y + ph, pw, h - ph)]
+        self.waste.extend(r for r in parts if r[2] > 0 and r[3] > 0)
+        return x, y
+
+    def skyline(self) -> List[Tuple[int, int, int]]:
+        """(x, width, top) per segment."""
+        ends = list(self.xs[1:]) + [self.length]
+        return [(x, end - x, y) for x, end, y in zip(self.xs, ends, self.ys)]
+
+    def to_sheet(self) -> Dict:
+        return {'size': (self.length, self.width), 'placements': self.placements, 'repeat': 1}
+
+
+@timed('pack_skyline')
+def pack_skyline(glass_parts: List[Dict], stock_sizes: List[Dict], gap: int = 0, rule: str = 'bottom_left',
+                 waste_map: bool = True, sort: str = 'area', deadline: Optional[float] = None) -> List[Dict]:
+    """Skyline-pack every piece, in area-descending order by default (see SKYLINE_SORTS).
+
+    Each new sheet is filled on every stock size that still has quantity and
+    the fullest one is kept, as in pack_guillotine. Raises TimeoutError once
+    time.perf_counter() passes `deadline`.
+    """
+    parts = [{'location': p['location'], 'length': p['length'], 'height': p['height']}
+             for p in glass_parts for _ in range(p.get('qty', 1))]
+    parts.sort(key=SKYLINE_SORTS[sort], reverse=True)
+    stock_left = [stock.get('qty', float('inf')) for stock in stock_sizes]
+    sheets = []
+
+    while parts:
+        best = None
+        for s, stock in enumerate(stock_sizes):
+            if stock_left[s] <= 0:
+                continue
+            if deadline is not None and time.perf_counter() > deadline:
+                raise TimeoutError(f"{len(parts)} parts left unpacked at the deadline")
+            sheet = SkylineSheet(stock['length'], stock['width'], gap, rule, waste_map)
+            placed = [i for i, part in enumerate(parts) if sheet.insert(part) is not None]
+            utilization = sheet.used_area / (stock['length'] * stock['width'])
+            if placed and (best is None or utilization > best[0]):
+                best = (utilization, s, sheet, placed)
+        if best is None:
+            raise ValueError(f"Parts do not fit on any available stock sheet: {sorted({p['location'] for p in parts})}")
+        _, s, sheet, placed = best
+        stock_left[s] -= 1
+        placed_set = set(placed)
+        parts = [part for i, part in enumerate(parts) if i not in placed_set]
+        sheets.append(sheet.to_sheet())
+    return sheets
+
+
+def main():
+    from CutListIngest import read_table
+    from GuillotineEngine import pack_guillotine
+    from PackingCore import plan_statistics
+
+    glass_parts = [{'location': r.label, 'length': int(r.length), 'height': int(r.height), 'qty': r.qty}
+                   for r in read_table('data/glass_data.csv')]
+    stock_sizes = [{'length': int(r.length), 'width': int(r.height), 'qty': r.qty}
+                   for r in read_table('data/glass_sheet_size.csv')]
+    runs = [(f'skyline {rule} {sort}' + ('' if waste_map else ' no waste map'),
+             lambda rule=rule, sort=sort, waste_map=waste_map: pack_skyline(glass_parts, stock_sizes, 3, rule,
+                                                                            waste_map, sort))
+            for rule in SKYLINE_RULES for sort in SKYLINE_SORTS for waste_map in (True, False)]
+    runs.append(('guillotine best_short_side', lambda: pack_guillotine(glass_parts, stock_sizes, 3)))
+    for name, run in runs:
+        start = time.perf_counter()
+        sheets = run()
+        elapsed = time.perf_counter() - start
+        stats = plan_statistics(sheets)
+        print(f"{name:<40} {stats['total_sheets']:>4} sheets {stats['wastage_percentage']:6.2f}% waste "
+              f"{elapsed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
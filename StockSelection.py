@@ -0,0 +1,236 @@
+import argparse
+import math
+import time
+from dataclasses import dataclass, field
+from itertools import combinations
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from Instrumentation import tally, timed
+from PackingCore import group_parts, pack_groups, plan_statistics, sheet_piece_area
+
+Size = Tuple[float, float]
+
+
+def _fits(length: float, height: float, stock_length: float, stock_width: float) -> bool:
+    return (length <= stock_length and height <= stock_width) or (height <= stock_length and length <= stock_width)
+
+
+# --- Per-sheet pruning ---
+
+def reachable_extent(pieces: Dict[Tuple[int, int], int], capacity: int) -> int:
+    """Largest total of piece extents along one axis that is at most `capacity`.
+
+    Every line across a sheet crosses pieces whose extents along it sum to at
+    most the sheet side, and each piece contributes its length or its height.
+    So the covered part of any line, and with it the packed area, is bounded by
+    this subset sum times the other side. Computed as a bitset over 0..capacity.
+    """
+    mask = (1 << (capacity + 1)) - 1
+    reachable = 1
+    for (a, b), count in pieces.items():
+        for _ in range(min(count, capacity // min(a, b))):
+            grown = (reachable | reachable << a | reachable << b) & mask
+            if grown == reachable:
+                break
+            reachable = grown
+        if reachable >> capacity & 1:
+            return capacity
+    return reachable.bit_length() - 1
+
+
+def utilization_bounds(parts: Sequence[Dict], stock_sizes: Sequence[Dict], gap: int = 0,
+                       relax: bool = True) -> List[float]:
+    """Upper bound on the utilization one sheet of each stock size can reach with `parts`.
+
+    A size that no part fits scores 0. Otherwise the bound is the glass area of
+    the parts that fit, over the sheet area. With `relax`, which assumes the
+    kerf-inflated pieces do not overlap, it is tightened to a continuous
+    knapsack relaxation: parts are taken in order of glass per inflated area
+    until the room is used up, the last one fractionally. The room is the
+    sheet area cut down by reachable_extent on both axes. Parts of the same
+    size are counted together, so the cost grows with the number of sizes.
+    """
+    counts: Dict[Tuple[float, float], int] = {}
+    for part in parts:
+        counts[(part['length'], part['height'])] = counts.get((part['length'], part['height']), 0) + 1
+    sizes = list(counts)
+    if relax:
+        sizes.sort(key=lambda size: size[0] * size[1] / ((size[0] + gap) * (size[1] + gap)), reverse=True)
+    bounds = []
+    for stock in stock_sizes:
+        length, width = stock['length'], stock['width']
+        capacity = length * width
+        glass = 0.0
+        room = capacity
+        if relax:
+            pieces: Dict[Tuple[int, int], int] = {}
+            for size in sizes:
+                if _fits(size[0] + gap, size[1] + gap, length, width):
+                    key = (int(size[0] + gap), int(size[1] + gap))
+                    pieces[key] = pieces.get(key, 0) + counts[size]
+            if pieces:
+                room = min(reachable_extent(pieces, int(length)) * width, length * reachable_extent(pieces, int(width)))
+        for size in sizes:
+            area, n = size[0] * size[1], counts[size]
+            if relax:
+                if not _fits(size[0] + gap, size[1] + gap, length, width):
+                    continue
+                footprint = (size[0] + gap) * (size[1] + gap)
+                if footprint * n >= room:
+                    glass += area * room / footprint
+                    break
+                room -= footprint * n
+            elif not _fits(size[0], size[1], length, width):
+                continue
+            glass += area * n
+        # Guard the comparison with achieved utilizations against float rounding
+        bounds.append(glass / capacity * (1 + 1e-12))
+    return bounds
+
+
+def can_skip(bound: float, index: int, best_utilization: float, best_index: Optional[int]) -> bool:
+    """True when a size cannot beat the best sheet found so far under first-best-wins ties."""
+    if bound <= 0:
+        return True
+    if best_index is None:
+        return False
+    return bound < best_utilization or (bound == best_utilization and index > best_index)
+
+
+# --- Global stock mix ---
+
+@dataclass
+class StockMix:
+    counts: Dict[Size, int]                  # sheets of each size to cut, largest share first
+    area_mm2: float                          # stock area of the mix
+    bound_mm2: float                         # continuous relaxation: glass area / best utilization
+    utilization: Dict[Size, float] = field(default_factory=dict)
+    nodes: int = 0
+
+    def order(self) -> List[Tuple[Size, int]]:
+        """(size, count) with the bulk size first and remainder sheets last."""
+        return sorted(((size, n) for size, n in self.counts.items() if n), key=lambda item: -item[1])
+
+
+def pilot_utilization(glass_parts: List[Dict], length: float, width: float, gap: int = 0) -> float:
+    """Steady-state utilization of grouped packing on one size, ignoring the partly filled last sheet."""
+    parts = [p for p in glass_parts if _fits(p['length'] + gap, p['height'] + gap, length, width)]
+    if not parts:
+        return 0.0
+    sheets = pack_groups(group_parts(parts), [{'length': length, 'width': width, 'qty': math.inf}], gap)
+    copies = sorted((sheet_piece_area(sheet) for sheet in sheets for _ in range(sheet.get('repeat', 1))),
+                    reverse=True)
+    full = copies[:-1] or copies
+    return sum(full) / (len(full) * length * width)
+
+
+@timed('plan_stock_mix')
+def plan_stock_mix(glass_parts: List[Dict], stock_sizes: List[Dict], gap: int = 0,
+                   utilization: Optional[Callable[[float, float], float]] = None,
+                   node_limit: int = 200_000) -> StockMix:
+    """Choose how many sheets of each stock size to cut for the whole order.
+
+    Each size gets a utilization estimate u (by default a grouped pilot
+    packing of the parts that fit it), so n sheets of it hold about n * u * area
+    of glass. The mix minimizes stock area subject to stock quantities and,
+    for every set T of sizes, enough capacity on T for the parts that only fit
+    sizes in T. Depth-first search over the counts, sizes by decreasing u, with
+    the continuous bound (remaining glass / best remaining u) pruning
+    branches. Raises ValueError if the stock cannot hold the order.
+    """
+    sizes = [(s['length'], s['width']) for s in stock_sizes]
+    quantity = [s.get('qty', math.inf) for s in stock_sizes]
+    estimate = utilization or (lambda length, width: pilot_utilization(glass_parts, length, width, gap))
+    rate = [estimate(*size) for size in sizes]
+    capacity = [u * l * w for u, (l, w) in zip(rate, sizes)]
+
+    # Glass area per set of sizes that a part fits (a bitmask over stock_sizes)
+    by_mask: Dict[int, float] = {}
+    for part in glass_parts:
+        mask = sum(1 << i for i, (l, w) in enumerate(sizes)
+                   if _fits(part['length'] + gap, part['height'] + gap, l, w))
+        if not mask:
+            raise ValueError(f"Part {part['location']} fits no stock size")
+        by_mask[mask] = by_mask.get(mask, 0) + part['length'] * part['height'] * part['qty']
+    total = sum(by_mask.values())
+    # Hall conditions: glass confined to each set T needs capacity on T
+    needs = []
+    for r in range(1, len(sizes) + 1):
+        for subset in combinations(range(len(sizes)), r):
+            t = sum(1 << i for i in subset)
+            need = sum(area for mask, area in by_mask.items() if mask & ~t == 0)
+            if need:
+                needs.append((t, need))
+
+    order = sorted((i for i in range(len(sizes)) if rate[i] > 0), key=lambda i: (-rate[i], sizes[i][0] * sizes[i][1]))
+    best_rate_from = [max((rate[i] for i in order[k:]), default=0) for k in range(len(order) + 1)]
+    best = {'area': math.inf, 'counts': None}
+    counts = [0] * len(sizes)
+    nodes = 0
+
+    def feasible() -> bool:
+        return all(sum(counts[i] * capacity[i] for i in range(len(sizes)) if t >> i & 1) >= need - 1e-6
+                   for t, need in needs)
+
+    def search(k: int, area: float, held: float):
+        nonlocal nodes
+        nodes += 1
+        if nodes > node_limit:
+            return
+        if held >= total - 1e-6 and feasible():
+            if area < best['area']:
+                best['area'], best['counts'] = area, list(counts)
+            return
+        if k == len(order) or area + (total - held) / best_rate_from[k] >= best['area']:
+            return
+        i = order[k]
+        sheet_area = sizes[i][0] * sizes[i][1]
+        most = min(quantity[i], math.ceil((total - held) / capacity[i]))
+        for n in range(int(most), -1, -1):
+            counts[i] = n
+            search(k + 1, area + n * sheet_area, held + n * capacity[i])
+        counts[i] = 0
+
+    search(0, 0.0, 0.0)
+    tally('stock_mix_nodes', nodes)
+    if best['counts'] is None:
+        raise ValueError("Not enough stock sheets available for the order")
+    return StockMix({size: n for size, n in zip(sizes, best['counts'])}, best['area'],
+                    total / best_rate_from[0], dict(zip(sizes, rate)), nodes)
+
+
+def main():
+    from Benchmark import glass_instance, repo_instance
+    from Glass_Cut_list_optimizer import calculate_layout, expand_parts
+    from GlassCuttingIO import GlassCuttingOptimizer, Panel, Stock
+
+    parser = argparse.ArgumentParser(description="Stock pruning in calculate_layout and global stock mixes.")
+    parser.add_argument('--seeds', type=int, default=3)
+    args = parser.parse_args()
+
+    for instance in [repo_instance()] + [glass_instance(seed, n_stock=3) for seed in range(args.seeds)]:
+        parts = sorted(expand_parts(instance.glass_parts), key=lambda p: p['length'] * p['height'], reverse=True)
+        mix = plan_stock_mix(instance.glass_parts, instance.stock_sizes, instance.gap)
+        print(f"{instance.name}: mix {', '.join(f'{n} x {l:g}x{w:g}' for (l, w), n in mix.order())} "
+              f"({mix.area_mm2 / 1e6:.1f} sq m, bound {mix.bound_mm2 / 1e6:.1f}, {mix.nodes} nodes)")
+        for label, options in [('all sizes', {'prune': False}), ('pruned', {}), ('planned mix', {'mix': mix})]:
+            start = time.perf_counter()
+            sheets = calculate_layout(parts, instance.stock_sizes, instance.gap, rule='best_short_side', **options)
+            stats = plan_statistics(sheets)
+            print(f"  calculate_layout {label:<12} {time.perf_counter() - start:6.2f}s "
+                  f"{stats['total_sheets']:>4} sheets, {stats['wastage_percentage']:.2f}% waste")
+
+        panels = [Panel(p['length'], p['height'], p['qty'], p['location'], p['length'] * p['height'] / 1e6)
+                  for p in instance.glass_parts]
+        stocks = [Stock(s['length'], s['width'], s['qty']) for s in instance.stock_sizes]
+        for plan in (False, True):
+            try:
+                result = GlassCuttingOptimizer(stocks, cut_width=instance.gap, plan_mix=plan).optimize(panels)
+                outcome = f"{result.efficiency:.1f}% efficiency"
+            except ValueError as e:
+                outcome = str(e)
+            print(f"  shelf {'planned mix' if plan else 'file order':<22} {outcome}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""Batched, NumPy-backed bin packing environment for RL training.
+
+The notebook BinPackingEnv steps one piece at a time in Python. Here N
+sheets step in lockstep. Each env holds a skyline, the top edge of the packed
+region per column of `cell` mm, plus the remaining demand per part type. An
+action is (part type, orientation), and the piece drops bottom-left onto the
+skyline where it lands lowest. When no remaining piece fits, the sheet is
+closed and a fresh one opened.
+
+Observation per env: skyline / sheet height (C columns), remaining / demand
+(T) and the part sizes relative to the sheet (2T). Reward: placed area over
+sheet area per piece, minus one per sheet used, so an episode's return is
+higher the fewer sheets the order takes.
+
+Piece sizes are rounded up to whole cells, so every placement is valid at
+full resolution, just not as tight as an unrounded packer. The last column
+and row are partial when the sheet is not a whole number of cells, and a
+piece may only start where its footprint in mm stays on the sheet, so a
+panel as long as the sheet still fits. With gymnasium
+installed the class is a gymnasium.vector.VectorEnv with same-step
+autoreset. action_masks() gives the feasible actions, as MaskablePPO expects.
+"""
+import argparse
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import gymnasium.vector
+    from gymnasium import spaces
+    from gymnasium.vector import VectorEnv
+    from gymnasium.vector.utils import batch_space
+    SAME_STEP = getattr(getattr(gymnasium.vector, 'AutoresetMode', None), 'SAME_STEP', 'SameStep')
+except ImportError:
+    spaces = None
+    VectorEnv = object
+    SAME_STEP = 'SameStep'
+
+
+class VectorBinPackingEnv(VectorEnv):
+    metadata = {'autoreset_mode': SAME_STEP}
+
+    def __init__(self, glass_parts: List[Dict], sheet_size: Tuple[int, int], num_envs: int = 64, gap: int = 0,
+                 cell: int = 50, max_steps: Optional[int] = None, record: bool = False):
+        length, width = sheet_size
+        self.num_envs = num_envs
+        self.sheet_size = (length, width)
+        self.gap = gap
+        self.cell = cell
+        self.record = record
+        self.columns, self.rows = int(-(-length // cell)), int(-(-width // cell))
+        self.parts = [p for p in glass_parts if p['qty'] > 0]
+        self.demand = np.array([p['qty'] for p in self.parts], dtype=np.int64)
+        self.max_steps = max_steps or 4 * int(self.demand.sum())
+
+        # Action a = 2 * part type + orientation; sizes in cells, kerf included
+        sizes = np.array([(p['length'], p['height']) for p in self.parts], dtype=np.float64)
+        footprint = sizes + gap
+        cells = np.ceil(footprint / cell).astype(np.int64)
+        self.action_width = np.stack([cells[:, 0], cells[:, 1]], axis=1).ravel()
+        self.action_height = np.stack([cells[:, 1], cells[:, 0]], axis=1).ravel()
+        # Last start column / row that keeps the footprint on the sheet
+        self.action_last_x = ((length - np.stack([footprint[:, 0], footprint[:, 1]], axis=1).ravel()) // cell
+                              ).astype(np.int64)
+        self.action_last_y = ((width - np.stack([footprint[:, 1], footprint[:, 0]], axis=1).ravel()) // cell
+                              ).astype(np.int64)
+        self.action_area = np.repeat(sizes[:, 0] * sizes[:, 1], 2) / (length * width)
+        fits = (self.action_last_x >= 0) & (self.action_last_y >= 0)
+        for t, part in enumerate(self.parts):
+            if not fits[2 * t:2 * t + 2].any():
+                raise ValueError(f"Part {part['location']} does not fit a {length}x{width} sheet at cell {cell}")
+        # Distinct (width in cells, last start column) pairs; sorted, so the widest comes last
+        self.spans, self.span_index = np.unique(np.stack([self.action_width, self.action_last_x], axis=1), axis=0,
+                                                return_inverse=True)
+        self.span_index = self.span_index.reshape(-1)
+        self.part_features = (sizes / np.array([length, width])).ravel().astype(np.float32)
+
+        self.n_actions = 2 * len(self.parts)
+        obs_size = self.columns + 3 * len(self.parts)
+        if spaces is not None:
+            self.single_observation_space = spaces.Box(0.0, np.inf, (obs_size,), np.float32)
+            self.single_action_space = spaces.Discrete(self.n_actions)
+            self.observation_space = batch_space(self.single_observation_space, num_envs)
+            self.action_space = batch_space(self.single_action_space, num_envs)
+        self._columns = np.arange(self.columns)
+        self._envs = np.arange(num_envs)
+        self._reset_envs(np.ones(num_envs, dtype=bool))
+
+    # --- State ---
+
+    def _reset_envs(self, which: np.ndarray):
+        if not hasattr(self, 'skyline'):
+            self.skyline = np.zeros((self.num_envs, self.columns), dtype=np.int32)
+            self.remaining = np.zeros((self.num_envs, len(self.parts)), dtype=np.int64)
+            self.sheets_used = np.zeros(self.num_envs, dtype=np.int64)
+            self.steps = np.zeros(self.num_envs, dtype=np.int64)
+            self.placements: List[List[Tuple[int, int, int, int, bool]]] = [[] for _ in range(self.num_envs)]
+            self.finished_placements: List[Optional[List]] = [None] * self.num_envs
+        self.skyline[which] = 0
+        self.remaining[which] = self.demand
+        self.sheets_used[which] = 1
+        self.steps[which] = 0
+        if self.record:
+            for n in np.flatnonzero(which):
+                self.placements[n] = []
+        self._refresh()
+
+    def _refresh(self):
+        """Lowest landing height and its leftmost column for every distinct span, then the action mask.
+
+        Window maxima come from a sparse table: the max over a window of w
+        columns is the max of two overlapping power-of-two windows.
+        """
+        table = [self.skyline]
+        while 2 ** len(table) <= self.spans[-1, 0]:
+            half = 2 ** (len(table) - 1)
+            table.append(np.maximum(table[-1][:, :-half], table[-1][:, half:]))
+        landing = np.full((self.num_envs, len(self.spans)), self.rows + 1, dtype=self.skyline.dtype)
+        position = np.zeros_like(landing)
+        for d, (w, last) in enumerate(self.spans):
+            if last < 0:
+                continue
+            level = int(w).bit_length() - 1
+            span = table[level]
+            offset = w - 2 ** level
+            starts = np.maximum(span[:, :last + 1], span[:, offset:offset + last + 1])
+            position[:, d] = starts.argmin(axis=1)
+            landing[:, d] = starts[self._envs, position[:, d]]
+        self.landing = landing[:, self.span_index]
+        self.position = position[:, self.span_index]
+        self.mask = (np.repeat(self.remaining, 2, axis=1) > 0) & (self.landing <= self.action_last_y)
+
+    def observations(self) -> np.ndarray:
+        return np.concatenate([self.skyline / self.rows, self.remaining / self.demand,
+                               np.broadcast_to(self.part_features, (self.num_envs, self.part_features.size))],
+                              axis=1).astype(np.float32)
+
+    def action_masks(self) -> np.ndarray:
+        return self.mask.copy()
+
+    # --- Gymnasium API ---
+
+    def reset(self, *, seed: Optional[int] = None, options: Optional[Dict] = None):
+        # The dynamics are deterministic; seed is accepted for API compatibility
+        self._reset_envs(np.ones(self.num_envs, dtype=bool))
+        return self.observations(), {'action_mask': self.action_masks()}
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.int64)
+        valid = self.mask[self._envs, actions]
+        rewards = np.where(valid, self.action_area[actions], -0.01)
+        x, y = self.position[self._envs, actions], self.landing[self._envs, actions]
+        w, h = self.action_width[actions], self.action_height[actions]
+        covered = valid[:, None] & (self._columns >= x[:, None]) & (self._columns < (x + w)[:, None])
+        self.skyline = np.where(covered, (y + h)[:, None], self.skyline).astype(np.int32)
+        np.subtract.at(self.remaining, (self._envs[valid], actions[valid] // 2), 1)
+        if self.record:
+            for n in np.flatnonzero(valid):
+                self.placements[n].append((int(self.sheets_used[n]) - 1, int(x[n]), int(y[n]), int(actions[n] // 2),
+                                           bool(actions[n] % 2)))
+        self.steps += 1
+        self._refresh()
+
+        # Close sheets that nothing remaining fits on; a fresh sheet always has a feasible action
+        left = self.remaining.sum(axis=1)
+        stuck = (left > 0) & ~self.mask.any(axis=1)
+        if stuck.any():
+            self.skyline[stuck] = 0
+            self.sheets_used[stuck] += 1
+            rewards = rewards - stuck
+            self._refresh()
+        terminated = left == 0
+        rewards = rewards - terminated
+        truncated = ~terminated & (self.steps >= self.max_steps)
+
+        infos = {}
+        done = terminated | truncated
+        if done.any():
+            infos = {'final_obs': self.observations(), '_final_obs': done, 'sheets_used': self.sheets_used.copy(),
+                     '_sheets_used': done}
+            if self.record:
+                for n in np.flatnonzero(done):
+                    self.finished_placements[n] = self.placements[n]
+            self._reset_envs(done)
+        infos['action_mask'] = self.action_masks()
+        return self.observations(), rewards.astype(np.float32), terminated, truncated, infos
+
+    def close(self, **kwargs):
+        pass
+
+    # --- Plans ---
+
+    def to_sheets(self, n: int = 0, finished: bool = True) -> List[Dict]:
+        """Env n's placements as sheet dicts (per piece, positions in mm); needs record=True."""
+        rows = self.finished_placements[n] if finished else self.placements[n]
+        sheets: Dict[int, Dict] = {}
+        for sheet, x, y, t, rotated in rows or []:
+            part = self.parts[t]
+            sheets.setdefault(sheet, {'size': self.sheet_size, 'placements': []})['placements'].append({
+                'part': {'location': part['location'], 'length': part['length'], 'height': part['height']},
+                'position': (x * self.cell, y * self.cell), 'rotated': rotated})
+        return [sheets[i] for i in sorted(sheets)]
+
+
+def random_masked_actions(mask: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """One uniformly random feasible action per env (action 0 where none is feasible)."""
+    return np.argmax(np.where(mask, rng.random(mask.shape), -1.0), axis=1)
+
+
+def main():
+    from Benchmark import glass_instance, repo_instance
+
+    parser = argparse.ArgumentParser(description="Throughput of the vector env under random masked actions.")
+    parser.add_argument('--envs', type=int, nargs='+', default=[1, 64, 256, 1024])
+    parser.add_argument('--steps', type=int, default=2000, help="Batched steps per measurement")
+    parser.add_argument('--cell', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for instance in (repo_instance(), glass_instance(0)):
+        sheet = max(((s['length'], s['width']) for s in instance.stock_sizes), key=lambda s: s[0] * s[1])
+        for num_envs in args.envs:
+            try:
+                env = VectorBinPackingEnv(instance.glass_parts, sheet, num_envs, instance.gap, args.cell)
+            except ValueError as e:
+                print(f"{instance.name:<18} skipped: {e}")
+                break
+            _, info = env.reset(seed=0)
+            mask, episodes, sheets = info['action_mask'], 0, 0
+            start = time.perf_counter()
+            for _ in range(args.steps):
+                _, _, terminated, truncated, info = env.step(random_masked_actions(mask, rng))
+                mask = info['action_mask']
+                if terminated.any():
+                    episodes += int(terminated.sum())
+                    sheets += int(info['sheets_used'][terminated].sum())
+            elapsed = time.perf_counter() - start
+            mean_sheets = f"{sheets / episodes:.1f}" if episodes else "-"
+            print(f"{instance.name:<18} envs {num_envs:>5}: {num_envs * args.steps / elapsed:>10,.0f} steps/s, "
+                  f"{episodes} episodes, {mean_sheets} sheets per episode (random policy)")
+
+
+if __name__ == "__main__":
+    main()
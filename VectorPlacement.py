@@ -0,0 +1,153 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from Instrumentation import high_water, record_find, tally
+
+SCORING_RULES = ('best_area', 'best_short_side', 'best_long_side', 'bottom_left', 'contact_point')
+
+Rect = Tuple[int, int, int, int]  # (x, y, width, height)
+
+
+def _contained(inner: np.ndarray, outer: np.ndarray) -> np.ndarray:
+    """(len(inner), len(outer)) matrix: inner[i] lies inside outer[j]."""
+    ix, iy, iw, ih = (inner[:, k, None] for k in range(4))
+    ox, oy, ow, oh = (outer[None, :, k] for k in range(4))
+    return (ix >= ox) & (iy >= oy) & (ix + iw <= ox + ow) & (iy + ih <= oy + oh)
+
+
+def _overlap(lo1, hi1, lo2, hi2):
+    return np.maximum(0, np.minimum(hi1, hi2) - np.maximum(lo1, lo2))
+
+
+class FreeRectArray:
+    """MaxRects free space held as NumPy columns (x, y, w, h).
+
+    Every free rect is scored for both orientations in one vectorized pass, and
+    splitting/pruning after a placement is done with array masks instead of a
+    Python loop. Exposes the same find/find_rect/place interface as
+    MaxRectsEngine.FreeRectIndex, plus a selectable scoring rule.
+    """
+
+    def __init__(self, length: int, width: int, rule: str = 'best_area'):
+        if rule not in SCORING_RULES:
+            raise ValueError(f"Unknown scoring rule {rule!r}; expected one of {SCORING_RULES}")
+        self.length = length
+        self.width = width
+        self.rule = rule
+        self._free = np.array([[0, 0, length, width]], dtype=np.int64)
+        self._placed = np.empty((0, 4), dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._free)
+
+    def __iter__(self):
+        return iter(self.rects())
+
+    def rects(self) -> List[Rect]:
+        return [tuple(int(v) for v in row) for row in self._free]
+
+    def _contact(self, px: np.ndarray, py: np.ndarray, pw: np.ndarray, ph: np.ndarray) -> np.ndarray:
+        """Perimeter shared with the sheet border and already placed parts."""
+        contact = (((px == 0) | (px + pw == self.length)) * ph
+                   + ((py == 0) | (py + ph == self.width)) * pw)
+        if len(self._placed):
+            qx, qy, qw, qh = (self._placed[:, k] for k in range(4))
+            cx, cy, cw, chh = px[..., None], py[..., None], pw[..., None], ph[..., None]
+            vertical = (qx + qw == cx) | (qx == cx + cw)
+            horizontal = (qy + qh == cy) | (qy == cy + chh)
+            contact = contact + (vertical * _overlap(cy, cy + chh, qy, qy + qh)).sum(axis=-1)
+            contact = contact + (horizontal * _overlap(cx, cx + cw, qx, qx + qw)).sum(axis=-1)
+        return contact
+
+    def score(self, length: int, height: int, rule: Optional[str] = None,
+              allow_rotation: bool = True) -> Optional[Tuple[int, bool, float]]:
+        """Best free rect for a part under `rule` (lower score is better).
+
+        Both orientations are scored together as a (2, n_free) array.
+        Returns (rect index, rotated, score) or None if nothing fits.
+        """
+        rule = rule or self.rule
+        if not len(self._free):
+            record_find(0)
+            return None
+        if allow_rotation and length != height:
+            pw = np.array([[length], [height]])
+            ph = np.array([[height], [length]])
+        else:
+            pw, ph = np.array([[length]]), np.array([[height]])
+
+        x, y, w, h = self._free.T
+        record_find(pw.size * len(self._free))
+        leftover_w, leftover_h = w - pw, h - ph
+        fits = (leftover_w >= 0) & (leftover_h >= 0)
+        if rule == 'best_area':
+            primary, secondary = w * h - pw * ph, np.minimum(leftover_w, leftover_h)
+        elif rule == 'best_short_side':
+            primary, secondary = np.minimum(leftover_w, leftover_h), np.maximum(leftover_w, leftover_h)
+        elif rule == 'best_long_side':
+            primary, secondary = np.maximum(leftover_w, leftover_h), np.minimum(leftover_w, leftover_h)
+        elif rule == 'bottom_left':
+            primary, secondary = y + ph, x + 0 * pw
+        else:
+            shape = fits.shape
+            primary = -self._contact(np.broadcast_to(x, shape), np.broadcast_to(y, shape),
+                                     np.broadcast_to(pw, shape), np.broadcast_to(ph, shape))
+            secondary = y + ph
+
+        # Infeasible candidates are pushed past every feasible score
+        primary = np.where(fits, primary, np.iinfo(np.int64).max).ravel()
+        choice = int(np.argmin(primary))
+        if not fits.ravel()[choice]:
+            return None
+        candidates = np.flatnonzero(primary == primary[choice])
+        if len(candidates) > 1:
+            choice = int(candidates[np.argmin(secondary.ravel()[candidates])])
+        n_free = len(self._free)
+        return choice % n_free, choice >= n_free, float(primary[choice])
+
+    def find_rect(self, length: int, height: int, allow_rotation: bool = True,
+                  rule: Optional[str] = None) -> Optional[Tuple[Rect, bool]]:
+        fit = self.score(length, height, rule, allow_rotation)
+        if fit is None:
+            return None
+        index, rotated, _ = fit
+        return tuple(int(v) for v in self._free[index]), rotated
+
+    def find(self, length: int, height: int, allow_rotation: bool = True,
+             rule: Optional[str] = None) -> Optional[Tuple[int, int, bool]]:
+        """Position (x, y, rotated) chosen by the scoring rule, or None."""
+        fit = self.find_rect(length, height, allow_rotation, rule)
+        if fit is None:
+            return None
+        rect, rotated = fit
+        return rect[0], rect[1], rotated
+
+    def place(self, x: int, y: int, length: int, height: int):
+        """Mark the rectangle at (x, y) as used, splitting and pruning free space in bulk."""
+        free = self._free
+        fx, fy, fw, fh = free.T
+        right, top = x + length, y + height
+        hit = (x < fx + fw) & (right > fx) & (y < fy + fh) & (top > fy)
+        keep, cut = free[~hit], free[hit]
+        cx, cy, cw, ch = cut.T
+
+        pieces = [
+            np.column_stack((cx, cy, x - cx, ch))[x > cx],
+            np.column_stack((np.full_like(cx, right), cy, cx + cw - right, ch))[right < cx + cw],
+            np.column_stack((cx, cy, cw, y - cy))[y > cy],
+            np.column_stack((cx, np.full_like(cy, top), cw, cy + ch - top))[top < cy + ch],
+        ]
+        new = np.unique(np.concatenate(pieces), axis=0)
+        if len(new):
+            inside_new = _contained(new, new)
+            np.fill_diagonal(inside_new, False)
+            dominated = inside_new.any(axis=1)
+            if len(keep):
+                dominated |= _contained(new, keep).any(axis=1)
+            new = new[~dominated]
+
+        self._free = np.concatenate((keep, new))
+        self._placed = np.concatenate((self._placed, [[x, y, length, height]]))
+        tally('placements')
+        high_water('free_rects', len(self._free))
@@ -1,10 +1,11 @@
-import pandas as pd
-import matplotlib.pyplot as plt
 from datetime import datetime
 import os
 from dataclasses import dataclass
 from typing import List, Dict, Tuple
-from matplotlib.backends.backend_pdf import PdfPages
+from CutListIngest import read_table
+from Instrumentation import phase, tally, timed
+from LayoutRenderer import render_pdf
+from PlacementStore import PlacementTable
 
 @dataclass
 class Part:
@@ -28,6 +29,7 @@ class PackingResult:
     width: float
     height: float
     stock_name: str
+    sheet_number: int = 0
 
 class FileHandler:
     def __init__(self):
@@ -38,22 +40,10 @@ class FileHandler:
     def load_parts(self, file_path: str) -> List[Part]:
         """Load parts data from CSV file"""
         try:
-            df = pd.read_csv(file_path)
-            required_columns = ['id', 'width', 'height', 'quantity']
-            
-            if not all(col in df.columns for col in required_columns):
-                missing = [col for col in required_columns if col not in df.columns]
-                raise ValueError(f"Missing columns in parts file: {missing}")
-            
-            parts = []
-            for _, row in df.iterrows():
-                for i in range(int(row['quantity'])):
-                    parts.append(Part(
-                        id=f"{row['id']}_{i+1}",
-                        width=float(row['width']),
-                        height=float(row['height']),
-                        quantity=1
-                    ))
+            # Streams the rows and reports missing columns or bad values by row
+            table = read_table(file_path, schema='parts')
+            # One Part per row; BinPacker numbers the individual pieces as it places them
+            parts = [Part(id=row.label, width=row.length, height=row.height, quantity=row.qty) for row in table]
             self.parts_data = parts
             return parts
             
@@ -65,21 +55,9 @@ class FileHandler:
     def load_stock_sizes(self, file_path: str) -> List[StockSize]:
         """Load stock sizes from CSV file"""
         try:
-            df = pd.read_csv(file_path)
-            required_columns = ['name', 'width', 'height', 'quantity']
-            
-            if not all(col in df.columns for col in required_columns):
-                missing = [col for col in required_columns if col not in df.columns]
-                raise ValueError(f"Missing columns in stock size file: {missing}")
-            
-            stock_sizes = []
-            for _, row in df.iterrows():
-                stock_sizes.append(StockSize(
-                    name=row['name'],
-                    width=float(row['width']),
-                    height=float(row['height']),
-                    quantity=int(row['quantity'])
-                ))
+            table = read_table(file_path, schema='named_stock')
+            stock_sizes = [StockSize(name=row.label, width=row.length, height=row.height, quantity=row.qty)
+                           for row in table]
             self.stock_sizes = stock_sizes
             return stock_sizes
             
@@ -94,6 +72,7 @@ class BinPacker:
         self.stock_sizes = stock_sizes
         self.results: List[PackingResult] = []
         
+    @timed('BinPacker.pack')
     def pack(self) -> List[PackingResult]:
         """Simple bottom-left packing algorithm"""
         for stock in self.stock_sizes:
@@ -101,11 +80,12 @@ class BinPacker:
             current_y = 0
             max_height_in_row = 0
             
-            remaining_parts = self.parts.copy()
+            # [part, pieces already placed] pairs; pieces are only numbered on output
+            remaining_parts = [[part, 0] for part in self.parts if part.quantity > 0]
             stock_used = 0
             
             while remaining_parts and stock_used < stock.quantity:
-                part = remaining_parts[0]
+                part, placed = remaining_parts[0]
                 
                 # Check if we need to move to new row
                 if current_x + part.width > stock.width:
@@ -124,18 +104,22 @@ class BinPacker:
                 
                 # Place the part
                 self.results.append(PackingResult(
-                    part_id=part.id,
+                    part_id=f"{part.id}_{placed + 1}",
                     x=current_x,
                     y=current_y,
                     width=part.width,
                     height=part.height,
-                    stock_name=stock.name
+                    stock_name=stock.name,
+                    sheet_number=stock_used
                 ))
                 
                 current_x += part.width
                 max_height_in_row = max(max_height_in_row, part.height)
-                remaining_parts.pop(0)
+                remaining_parts[0][1] += 1
+                if remaining_parts[0][1] == part.quantity:
+                    remaining_parts.pop(0)
             
+        tally('placements', len(self.results))
         return self.results
 
 class ResultHandler:
@@ -151,69 +135,31 @@ class ResultHandler:
             f"packing_results_{timestamp}.pdf"
         )
         
-        # Group results by stock sheet
-        results_by_stock = {}
+        # One table sheet per physical stock sheet, in packing order
+        stocks = {stock.name: stock for stock in stock_sizes}
+        table = PlacementTable()
+        sheet_of = {}
+        parts_by_stock = {}
         for result in results:
-            if result.stock_name not in results_by_stock:
-                results_by_stock[result.stock_name] = []
-            results_by_stock[result.stock_name].append(result)
+            key = (result.stock_name, result.sheet_number)
+            if key not in sheet_of:
+                stock = stocks[result.stock_name]
+                sheet_of[key] = table.add_sheet(stock.width, stock.height)
+            part_id = table.intern_part(result.part_id.rsplit('_', 1)[0], result.width, result.height)
+            table.append(sheet_of[key], part_id, result.x, result.y, result.width, result.height, False)
+            parts_by_stock[result.stock_name] = parts_by_stock.get(result.stock_name, 0) + 1
         
-        with PdfPages(pdf_path) as pdf:
-            # Summary page
-            plt.figure(figsize=(11, 8))
-            plt.title("Packing Summary")
-            summary_text = [
-                "Bin Packing Results Summary",
-                f"Total parts packed: {len(results)}",
-                f"Stock sizes used: {len(results_by_stock)}",
-                "\nStock Sheets Usage:",
-            ]
-            for stock_name, stock_results in results_by_stock.items():
-                summary_text.append(
-                    f"- {stock_name}: {len(stock_results)} parts"
-                )
-            
-            plt.text(0.1, 0.9, "\n".join(summary_text), 
-                    transform=plt.gca().transAxes)
-            plt.axis('off')
-            pdf.savefig()
-            plt.close()
-            
-            # Visualization pages for each stock sheet
-            for stock_name, stock_results in results_by_stock.items():
-                stock_size = next(s for s in stock_sizes 
-                                if s.name == stock_name)
-                
-                plt.figure(figsize=(11, 8))
-                plt.title(f"Layout for {stock_name}")
-                
-                # Draw each part
-                for result in stock_results:
-                    rect = plt.Rectangle(
-                        (result.x, result.y),
-                        result.width,
-                        result.height,
-                        fill=True,
-                        facecolor='lightblue',
-                        edgecolor='black'
-                    )
-                    plt.gca().add_patch(rect)
-                    
-                    # Add part ID label
-                    plt.text(
-                        result.x + result.width/2,
-                        result.y + result.height/2,
-                        result.part_id,
-                        ha='center',
-                        va='center'
-                    )
-                
-                plt.xlim(0, stock_size.width)
-                plt.ylim(0, stock_size.height)
-                plt.grid(True)
-                pdf.savefig()
-                plt.close()
+        summary = [
+            "Bin Packing Results Summary",
+            f"Total parts packed: {len(results)}",
+            f"Stock sizes used: {len(parts_by_stock)}",
+            "Stock Sheets Usage:",
+        ]
+        for stock_name, count in parts_by_stock.items():
+            sheets = sum(1 for name, _ in sheet_of if name == stock_name)
+            summary.append(f"- {stock_name}: {count} parts on {sheets} sheets")
         
+        render_pdf(table, pdf_path, summary=summary)
         return pdf_path
 
 def main():
@@ -230,16 +176,18 @@ def main():
         file_handler = FileHandler()
         
         # Load input files
-        parts = file_handler.load_parts(PARTS_FILE)
-        stock_sizes = file_handler.load_stock_sizes(STOCK_FILE)
+        with phase('load'):
+            parts = file_handler.load_parts(PARTS_FILE)
+            stock_sizes = file_handler.load_stock_sizes(STOCK_FILE)
         
         # Run packing algorithm
         packer = BinPacker(parts, stock_sizes)
         results = packer.pack()
         
         # Save results
-        result_handler = ResultHandler(OUTPUT_DIR)
-        pdf_path = result_handler.save_results_pdf(results, stock_sizes)
+        with phase('render'):
+            result_handler = ResultHandler(OUTPUT_DIR)
+            pdf_path = result_handler.save_results_pdf(results, stock_sizes)
         
         print(f"Packing completed successfully!")
         print(f"Results saved to: {pdf_path}")
@@ -1,12 +1,7 @@
 import csv
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
 from typing import List, Dict
 from collections import Counter
+from Instrumentation import timed
 
 def load_glass_data(filepath: str) -> List[Dict]:
     with open(filepath, 'r') as file:
@@ -23,7 +18,12 @@ def load_stock_sizes(filepath: str) -> List[Dict]:
                  'width': int(row['width']), 
                  'qty': int(row['qty'])} for row in reader]
 
+@timed('optimize_glass_cutting_ml')
 def optimize_glass_cutting_ml(glass_data_file: str, stock_sizes_file: str, gap: int):
+    import numpy as np
+    from sklearn.cluster import KMeans
+    from sklearn.preprocessing import StandardScaler
+
     # Load data
     glass_parts = load_glass_data(glass_data_file)
     stock_sizes = load_stock_sizes(stock_sizes_file)
@@ -45,6 +45,10 @@ def optimize_glass_cutting_ml(glass_data_file: str, stock_sizes_file: str, gap:
         part['cluster'] = kmeans.labels_[i]
     
     # Visualization of Clustering
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    import seaborn as sns
+
     plt.figure(figsize=(12, 6))
     plt.subplot(121)
     plt.scatter(part_areas[:, 1], part_areas[:, 2], c=kmeans.labels_, cmap='viridis')
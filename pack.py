@@ -0,0 +1,123 @@
+"""Headless packing entry point.
+
+    python pack.py data/glass_data.csv data/glass_sheet_size.csv --gap 3 --output plan.json
+
+Only the packing core is imported up front. NumPy, SciPy, rectpack and the
+renderers are imported by the options that need them, so a default run stays
+well inside the startup budget checked by `python Benchmark.py --startup`.
+Keep it that way: new imports on the default path go inside functions.
+"""
+import argparse
+import json
+import math
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from CutListIngest import IngestError, read_table
+from PackingCore import expand_placements, group_parts, pack_groups, plan_statistics
+
+# Modules the default `pack` invocation must not import
+HEAVY_MODULES = ('numpy', 'scipy', 'pandas', 'matplotlib', 'PIL', 'openpyxl', 'pyarrow', 'rectpack', 'tkinter',
+                 'sklearn')
+
+
+def load_job(parts_file: str, stock_file: str) -> Tuple[List[Dict], List[Dict]]:
+    """Parts and stock as packer dicts in whole mm.
+
+    Fractional panel sizes round up and stock sizes round down, so a plan
+    never counts on material that is not there.
+    """
+    glass_parts = [{'location': r.label, 'length': math.ceil(r.length), 'height': math.ceil(r.height),
+                    'qty': r.qty} for r in read_table(parts_file)]
+    stock_sizes = [{'length': int(r.length), 'width': int(r.height), 'qty': r.qty}
+                   for r in read_table(stock_file)]
+    return glass_parts, stock_sizes
+
+
+def pack(glass_parts: List[Dict], stock_sizes: List[Dict], gap: int = 0,
+         algorithm: str = 'grouped_blocks', time_limit: float = 10.0, allow_rotation: bool = True) -> List[Dict]:
+    """Pack with one named algorithm; grouped_blocks needs nothing beyond the packing core.
+
+    Every other name in BatchService.algorithm_names() goes through the batch
+    service's own dispatch, with time_limit as the job's time budget. Only
+    grouped_blocks can keep parts unrotated (allow_rotation=False).
+    """
+    if algorithm == 'grouped_blocks':
+        return pack_groups(group_parts(glass_parts), stock_sizes, gap, allow_rotation=allow_rotation)
+    if not allow_rotation:
+        raise ValueError(f"{algorithm} always allows rotation; use grouped_blocks to keep parts unrotated")
+    from BatchService import JobSpec, algorithm_names, pack_spec
+    if algorithm not in algorithm_names():
+        raise ValueError(f"Unknown algorithm {algorithm!r}; expected one of {algorithm_names()}")
+    table, _, complete, used = pack_spec(JobSpec('pack', '', '', gap, algorithm, time_limit), glass_parts,
+                                         stock_sizes)
+    if not complete:
+        raise RuntimeError(f"{used} left pieces unplaced")
+    return table.to_sheets()
+
+
+def plan_json(sheets: List[Dict], stats: Dict, gap: int = 0) -> Dict:
+    """JSON-ready plan: statistics plus per-piece sheets with plain placement rows."""
+    rows = []
+    for sheet in sheets:
+        if 'blocks' in sheet:
+            sheet = next(expand_placements([sheet], gap))
+        placements = []
+        for placement in sheet['placements']:
+            part, (x, y) = placement['part'], placement['position']
+            placements.append({'location': part['location'], 'x': x, 'y': y, 'length': part['length'],
+                               'height': part['height'], 'rotated': placement['rotated']})
+        rows.append({'size': list(sheet['size']), 'repeat': sheet.get('repeat', 1), 'placements': placements})
+    return {'statistics': dict(stats, sheet_counter=[{'size': list(size), 'qty': qty}
+                                                     for size, qty in stats['sheet_counter'].items()]),
+            'sheets': rows}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Pack one cut list and write the plan.")
+    parser.add_argument('parts', help="Glass data CSV/XLSX")
+    parser.add_argument('stock', help="Stock sizes CSV/XLSX")
+    parser.add_argument('--gap', type=int, default=0, help="Kerf between parts in mm")
+    parser.add_argument('--algorithm', default='grouped_blocks',
+                        help="grouped_blocks, anytime, cutting_stock, portfolio or any PortfolioRunner "
+                             "strategy name (see `python BatchService.py algorithms`)")
+    parser.add_argument('--time-limit', type=float, default=10.0,
+                        help="Time budget for anytime and portfolio, solver time limit for cutting_stock")
+    parser.add_argument('--no-rotation', action='store_true',
+                        help="Keep every part's length along the sheet length (grouped_blocks only)")
+    parser.add_argument('--output', help="Write the plan as JSON ('-' for stdout)")
+    parser.add_argument('--pdf', help="Write a layout report PDF")
+    parser.add_argument('--svg', help="Write one SVG per distinct layout into this directory")
+    parser.add_argument('--quiet', action='store_true', help="Only report errors")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        glass_parts, stock_sizes = load_job(args.parts, args.stock)
+        sheets = pack(glass_parts, stock_sizes, args.gap, args.algorithm, args.time_limit, not args.no_rotation)
+    except (OSError, IngestError, ValueError, RuntimeError) as e:
+        print(f"pack: {type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+    stats = plan_statistics(sheets)
+
+    if args.output == '-':
+        json.dump(plan_json(sheets, stats, args.gap), sys.stdout)
+    elif args.output:
+        with open(args.output, 'w') as f:
+            json.dump(plan_json(sheets, stats, args.gap), f)
+    if args.pdf:
+        from LayoutRenderer import render_pdf
+        render_pdf(sheets, args.pdf, gap=args.gap)
+    if args.svg:
+        from LayoutRenderer import render_svg
+        render_svg(sheets, args.svg, gap=args.gap)
+
+    if not args.quiet and args.output != '-':
+        print(f"{stats['total_sheets']} sheets, {stats['used_area_percentage']:.2f}% used, "
+              f"{stats['wastage_percentage']:.2f}% waste ({(time.perf_counter() - start) * 1000:.1f} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())